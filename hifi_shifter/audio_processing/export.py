@@ -0,0 +1,303 @@
+"""Streaming audio export.
+
+Tracks are mixed in fixed-size blocks (reusing `PlaybackMixer`) and each
+block is written as soon as it is ready, so memory stays constant no matter
+how long the project is.
+
+WAV (16/24-bit PCM, 32-bit float) is written directly. FLAC goes through
+`soundfile`, which is only imported when FLAC is requested.
+"""
+
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from .mixer import PlaybackMixer
+
+# format id -> (file suffix, description)
+EXPORT_FORMATS = {
+    'wav32f': ('.wav', 'WAV 32-bit float'),
+    'wav24': ('.wav', 'WAV 24-bit'),
+    'wav16': ('.wav', 'WAV 16-bit'),
+    'flac': ('.flac', 'FLAC 24-bit'),
+}
+DEFAULT_EXPORT_FORMAT = 'wav32f'
+EXPORT_BLOCK_SIZE = 65536
+
+
+class WavStreamWriter:
+    """Write a mono WAV file block by block; sizes are patched in on close().
+
+    The header reserves a ``JUNK`` chunk right after ``WAVE``; files whose
+    RIFF size would not fit in 32 bits (about 6.7 h of float32 at 44.1 kHz)
+    are turned into RF64 on close by rewriting it as the ``ds64`` chunk
+    holding the 64-bit sizes (EBU Tech 3306).
+    """
+
+    _WAVE_FORMAT_PCM = 1
+    _WAVE_FORMAT_IEEE_FLOAT = 3
+    _HEADER_BYTES = 80  # RIFF/WAVE 12 + JUNK/ds64 36 + fmt 24 + data 8
+    _MAX_RIFF_BYTES = 0xFFFFFFFF
+
+    def __init__(self, path, sr: int, fmt: str = DEFAULT_EXPORT_FORMAT):
+        if fmt not in ('wav16', 'wav24', 'wav32f'):
+            raise ValueError(f"Unsupported WAV format: {fmt}")
+        self.path = path
+        self.sr = int(sr)
+        self.fmt = fmt
+        self.sample_width = {'wav16': 2, 'wav24': 3, 'wav32f': 4}[fmt]
+        self.frames_written = 0
+        self._f = open(path, 'wb')
+        self._write_header(0)
+
+    def _write_header(self, data_bytes: int):
+        fmt_tag = self._WAVE_FORMAT_IEEE_FLOAT if self.fmt == 'wav32f' else self._WAVE_FORMAT_PCM
+        block_align = self.sample_width
+        # The RIFF size covers the pad byte of an odd-length data chunk
+        riff_bytes = self._HEADER_BYTES - 8 + data_bytes + data_bytes % 2
+        if riff_bytes > self._MAX_RIFF_BYTES:
+            riff = b'RF64' + struct.pack('<I', 0xFFFFFFFF)
+            ds64 = b'ds64' + struct.pack('<IQQQI', 28, riff_bytes, data_bytes, self.frames_written, 0)
+            data_size = 0xFFFFFFFF
+        else:
+            riff = b'RIFF' + struct.pack('<I', riff_bytes)
+            ds64 = b'JUNK' + struct.pack('<I', 28) + bytes(28)  # room for ds64
+            data_size = data_bytes
+        header = b''.join([
+            riff, b'WAVE', ds64,
+            b'fmt ', struct.pack('<IHHIIHH', 16, fmt_tag, 1, self.sr, self.sr * block_align, block_align, 8 * self.sample_width),
+            b'data', struct.pack('<I', data_size),
+        ])
+        assert len(header) == self._HEADER_BYTES
+        self._f.write(header)
+
+    def write(self, block: np.ndarray):
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        if len(block) == 0:
+            return
+        if self.fmt == 'wav32f':
+            data = block.astype('<f4', copy=False).tobytes()
+        elif self.fmt == 'wav16':
+            data = np.round(np.clip(block, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+        else:
+            pcm = np.round(np.clip(block, -1.0, 1.0) * 8388607.0).astype('<i4')
+            data = pcm.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        self._f.write(data)
+        self.frames_written += len(block)
+
+    def write_silence(self, n: int, block_size: int = EXPORT_BLOCK_SIZE):
+        # 0.0 encodes to all-zero bytes in every supported format
+        n = int(n)
+        zeros = bytes(min(n, block_size) * self.sample_width)
+        while n > 0:
+            k = min(n, block_size)
+            self._f.write(zeros[:k * self.sample_width])
+            self.frames_written += k
+            n -= k
+
+    def close(self):
+        if self._f is None:
+            return
+        data_bytes = self.frames_written * self.sample_width
+        if data_bytes % 2:
+            self._f.write(b'\x00')  # RIFF chunks are word aligned
+        self._f.seek(0)
+        self._write_header(data_bytes)
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FlacStreamWriter:
+    """Block-wise FLAC writer backed by `soundfile`."""
+
+    def __init__(self, path, sr: int, fmt: str = 'flac'):
+        try:
+            import soundfile as sf
+        except ImportError as e:
+            raise RuntimeError("FLAC export requires the 'soundfile' package (pip install soundfile).") from e
+        self.path = path
+        self.sr = int(sr)
+        self.fmt = fmt
+        self.frames_written = 0
+        self._f = sf.SoundFile(path, mode='w', samplerate=self.sr, channels=1, format='FLAC', subtype='PCM_24')
+
+    def write(self, block: np.ndarray):
+        block = np.clip(np.asarray(block, dtype=np.float32).reshape(-1), -1.0, 1.0)
+        if len(block) == 0:
+            return
+        self._f.write(block)
+        self.frames_written += len(block)
+
+    def write_silence(self, n: int, block_size: int = EXPORT_BLOCK_SIZE):
+        n = int(n)
+        zeros = np.zeros(min(n, block_size), dtype=np.float32)
+        while n > 0:
+            k = min(n, len(zeros))
+            self.write(zeros[:k])
+            n -= k
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(path, sr: int, fmt: str = DEFAULT_EXPORT_FORMAT):
+    if fmt == 'flac':
+        return FlacStreamWriter(path, sr, fmt)
+    return WavStreamWriter(path, sr, fmt)
+
+
+def with_format_suffix(path, fmt: str) -> str:
+    suffix = EXPORT_FORMATS[fmt][0]
+    root, ext = os.path.splitext(str(path))
+    return str(path) if ext.lower() == suffix else root + suffix
+
+
+def export_mix(sources, starts, gains, path, sr: int, fmt: str = DEFAULT_EXPORT_FORMAT,
+               block_size: int = EXPORT_BLOCK_SIZE, progress=None) -> int:
+    """Mix `sources` (buffers or block processors) block by block into `path`.
+
+    `starts` are start offsets in samples and `gains` per-source linear gains
+    (0 for muted). `path` may also be a ``{format: path}`` dict to write
+    several formats from one mixing pass (`fmt` is then ignored).
+    `progress(done_blocks, total_blocks)` is called after each written block.
+    Returns the number of samples written (0 if nothing to mix).
+    """
+    paths_by_format = dict(path) if isinstance(path, dict) else {fmt: path}
+    mixer = PlaybackMixer(sr, max_block=block_size, clip=False)
+    mixer.set_sources(sources, starts, gains=gains)
+    total = mixer.total_samples
+    if total <= 0:
+        return 0
+
+    total_blocks = -(-total // block_size)
+    writers = []
+    try:
+        for f, p in paths_by_format.items():
+            writers.append(open_writer(p, sr, f))
+        for i in range(total_blocks):
+            block = mixer.render(block_size)
+            for w in writers:
+                w.write(block)
+            if progress is not None:
+                progress(i + 1, total_blocks)
+    finally:
+        for w in writers:
+            w.close()
+    return total
+
+
+def stem_paths(dir_path, name: str, formats) -> dict:
+    """Output path per format; formats sharing a suffix get the format id appended."""
+    suffixes = [EXPORT_FORMATS[f][0] for f in formats]
+    paths = {}
+    for fmt, suffix in zip(formats, suffixes):
+        stem = name if suffixes.count(suffix) == 1 else f"{name}_{fmt}"
+        paths[fmt] = os.path.join(str(dir_path), stem + suffix)
+    return paths
+
+
+def unique_stem_paths(dir_path, names, formats) -> list:
+    """`stem_paths` for each name, with ``_2``, ``_3``... appended to names whose files would collide.
+
+    Tracks often share a name (the same file added twice, VocalShifter
+    imports); concurrent writers must never share an output file.
+    Comparison ignores case, as the file system may.
+    """
+    used = set()
+    result = []
+    for name in names:
+        candidate, k = name, 1
+        while True:
+            paths = stem_paths(dir_path, candidate, formats)
+            keys = {os.path.normcase(p).casefold() for p in paths.values()}
+            if not keys & used:
+                break
+            k += 1
+            candidate = f"{name}_{k}"
+        used |= keys
+        result.append(paths)
+    assert len(used) == sum(len(paths) for paths in result), "stem output paths are not unique"
+    return result
+
+
+def write_stem(audio, start: int, paths_by_format: dict, sr: int, block_size: int = EXPORT_BLOCK_SIZE) -> int:
+    """Write one track placed at sample `start` to every path in `paths_by_format`.
+
+    The leading offset is streamed as silence and a negative offset trims the
+    head, so no padded copy is built. All formats are written in the same pass
+    over the audio. Returns the number of samples per file.
+    """
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    start = int(start)
+    if start < 0:
+        audio = audio[min(-start, len(audio)):]
+        start = 0
+
+    writers = []
+    try:
+        for fmt, path in paths_by_format.items():
+            writers.append(open_writer(path, sr, fmt))
+        for w in writers:
+            w.write_silence(start, block_size)
+        for b0 in range(0, len(audio), block_size):
+            block = audio[b0:b0 + block_size]
+            for w in writers:
+                w.write(block)
+    finally:
+        for w in writers:
+            w.close()
+    return start + len(audio)
+
+
+def export_stems(stems, dir_path, sr: int, formats=(DEFAULT_EXPORT_FORMAT,),
+                 block_size: int = EXPORT_BLOCK_SIZE, max_workers=None, progress=None) -> int:
+    """Export stems concurrently.
+
+    `stems` is a list of ``(name, audio, start)``; `audio` may also be a
+    zero-argument callable returning the buffer (or None to skip), so that
+    rendering happens inside the worker too. Returns the number of stems
+    written; `progress(done, total)` is called as each stem finishes.
+    """
+    formats = [f for f in formats if f in EXPORT_FORMATS] or [DEFAULT_EXPORT_FORMAT]
+    stems = list(stems)
+    if not stems:
+        return 0
+    if max_workers is None:
+        max_workers = min(len(stems), os.cpu_count() or 4)
+
+    def _job(audio, start, paths):
+        if callable(audio):
+            audio = audio()
+        if audio is None:
+            return False
+        write_stem(audio, start, paths, sr, block_size)
+        return True
+
+    paths = unique_stem_paths(dir_path, [name for name, _audio, _start in stems], formats)
+    count = 0
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        futures = [pool.submit(_job, audio, start, p) for (_name, audio, start), p in zip(stems, paths)]
+        for fut in as_completed(futures):
+            if fut.result():
+                count += 1
+            done += 1
+            if progress is not None:
+                progress(done, len(stems))
+    return count
@@ -0,0 +1,230 @@
+"""Block mixer used by the real-time playback callback.
+
+The audio thread only ever reads an immutable snapshot (`_MixState`) that the
+UI thread replaces wholesale; a single attribute assignment is atomic in
+CPython, so no lock is taken inside the callback.
+
+A source is either a float32 buffer or a block processor exposing
+``__len__`` and ``read(start, out)`` (e.g. `TensionTiltStream`), which
+renders post-FX on just the blocks being played.
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from sounddevice import CallbackStop as _CallbackStop
+except Exception:  # headless use (no PortAudio): nothing will catch it anyway
+    class _CallbackStop(Exception):
+        pass
+
+
+class _MixState:
+    """Immutable view of what to mix: buffers, their start samples and gains.
+
+    `audible` repeats the sources with a non-zero gain as plain Python
+    ``(start, end, gain, source, is_array)`` tuples, so the audio thread
+    neither converts numpy scalars nor builds index arrays per block.
+    """
+
+    __slots__ = ('buffers', 'starts', 'ends', 'gains', 'total', 'audible')
+
+    def __init__(self, buffers, starts, gains, total=None):
+        self.buffers = tuple(buffers)
+        self.starts = np.asarray(starts, dtype=np.int64).reshape(-1)
+        self.ends = self.starts + np.asarray([len(b) for b in self.buffers], dtype=np.int64)
+        self.gains = np.asarray(gains, dtype=np.float32).reshape(-1)
+        if total is None:
+            total = int(self.ends.max()) if len(self.ends) else 0
+        self.total = int(total)
+        self.audible = tuple(
+            (int(start), int(end), np.float32(gain), src, isinstance(src, np.ndarray))
+            for src, start, end, gain in zip(self.buffers, self.starts, self.ends, self.gains)
+            if gain != 0.0 and end > start
+        )
+
+
+def _as_source(src):
+    if hasattr(src, 'read'):
+        return src
+    return np.ascontiguousarray(src, dtype=np.float32)
+
+
+def track_gains(tracks) -> np.ndarray:
+    """Per-track linear gain with mute/solo folded in (0.0 = not audible).
+
+    If any track is soloed, only solo tracks are audible.
+    """
+    solo_any = any(getattr(t, 'solo', False) for t in tracks)
+    gains = np.zeros(len(tracks), dtype=np.float32)
+    for i, t in enumerate(tracks):
+        if getattr(t, 'muted', False):
+            continue
+        if solo_any and not getattr(t, 'solo', False):
+            continue
+        gains[i] = float(getattr(t, 'volume', 1.0))
+    return gains
+
+
+class PlaybackMixer:
+    """Mix per-track float32 buffers block by block without allocating.
+
+    - `set_sources()` / `set_gains()` are called from the UI thread and publish
+      a new `_MixState`; the audio thread picks it up on its next block.
+    - `callback()` has the `sounddevice` OutputStream callback signature.
+    - Callback CPU time is measured and exposed via `stats()`.
+    """
+
+    def __init__(self, sr: int, max_block: int = 4096, clip: bool = True):
+        self.sr = int(sr)
+        self.clip = bool(clip)  # offline export keeps the float headroom
+        self._mix = np.zeros(int(max_block), dtype=np.float32)
+        self._scratch = np.zeros(int(max_block), dtype=np.float32)
+        self._state = _MixState((), (), ())
+
+        # Playhead in samples. Written by the audio thread while streaming;
+        # the UI requests seeks through `seek()`.
+        self.position = 0
+        self._seek_to = None
+
+        # Callback timing
+        self.blocks = 0
+        self.underruns = 0
+        self.last_cpu_ms = 0.0
+        self.avg_cpu_ms = 0.0
+        self.max_cpu_ms = 0.0
+        self.avg_load = 0.0  # avg CPU time / block duration
+
+    # ---- UI thread ----
+    def set_sources(self, buffers, starts, gains=None, total=None):
+        buffers = [_as_source(b) for b in buffers]
+        if gains is None:
+            old = self._state.gains
+            gains = old if len(old) == len(buffers) else np.ones(len(buffers), dtype=np.float32)
+        self._state = _MixState(buffers, starts, gains, total)
+
+    def set_gains(self, gains):
+        st = self._state
+        gains = np.asarray(gains, dtype=np.float32).reshape(-1)
+        if len(gains) != len(st.buffers):
+            return
+        self._state = _MixState(st.buffers, st.starts, gains, st.total)
+
+    def replace_buffers(self, buffers_by_index: dict):
+        """Swap in new buffers for some sources (e.g. fresh synthesis results).
+
+        The audio thread keeps using the old buffers until it reads the new
+        snapshot at the start of its next block; nothing is modified in place.
+        """
+        st = self._state
+        buffers = list(st.buffers)
+        for i, buf in buffers_by_index.items():
+            if 0 <= int(i) < len(buffers):
+                buffers[int(i)] = _as_source(buf)
+        new_state = _MixState(buffers, st.starts, st.gains)
+        new_state.total = max(new_state.total, st.total)
+        self._state = new_state
+
+    def set_starts(self, starts):
+        st = self._state
+        self._state = _MixState(st.buffers, starts, st.gains)
+
+    @property
+    def total_samples(self) -> int:
+        return self._state.total
+
+    def seek(self, sample: int):
+        sample = int(max(0, sample))
+        self._seek_to = sample
+        self.position = sample  # reported immediately; the audio thread applies the seek
+
+    def stats(self) -> dict:
+        return {
+            'blocks': self.blocks,
+            'underruns': self.underruns,
+            'last_cpu_ms': self.last_cpu_ms,
+            'avg_cpu_ms': self.avg_cpu_ms,
+            'max_cpu_ms': self.max_cpu_ms,
+            'avg_load': self.avg_load,
+        }
+
+    # ---- Audio thread ----
+    def render(self, frames: int) -> np.ndarray:
+        """Mix the next `frames` samples (or fewer at the end) and advance the playhead.
+
+        Returns a view into the internal block buffer; it is only valid until
+        the next call.
+        """
+        seek = self._seek_to
+        if seek is not None:
+            self._seek_to = None
+            self.position = seek
+
+        st = self._state
+        pos = self.position
+        n = min(int(frames), st.total - pos)
+        if n <= 0:
+            return self._mix[:0]
+
+        if n > len(self._mix):
+            # Device asked for a larger block than preallocated: grow once.
+            self._mix = np.zeros(n, dtype=np.float32)
+            self._scratch = np.zeros(n, dtype=np.float32)
+
+        mix = self._mix[:n]
+        mix.fill(0.0)
+
+        # Buffers are separate arrays (swapped independently by `replace_buffers`),
+        # so each overlapping source is one scale + one accumulate into the block
+        end = pos + n
+        for start, stop, gain, src, is_array in st.audible:
+            if start >= end or stop <= pos:
+                continue
+            src0 = pos - start
+            out0 = 0
+            if src0 < 0:
+                out0 = -src0
+                src0 = 0
+            take = min(n - out0, stop - start - src0)
+            tmp = self._scratch[:take]
+            if is_array:
+                np.multiply(src[src0:src0 + take], gain, out=tmp)
+            else:
+                src.read(src0, tmp)
+                np.multiply(tmp, gain, out=tmp)
+            seg = mix[out0:out0 + take]
+            np.add(seg, tmp, out=seg)
+
+        if self.clip:
+            np.clip(mix, -1.0, 1.0, out=mix)
+        self.position = pos + n
+        return mix
+
+    def callback(self, outdata, frames, _time_info, status):
+        t0 = time.perf_counter()
+        if status and status.output_underflow:
+            self.underruns += 1
+
+        mix = self.render(frames)
+        n = len(mix)
+        outdata[:n, 0] = mix
+        if n < frames:
+            outdata[n:].fill(0)
+
+        self._record_timing(time.perf_counter() - t0, frames)
+
+        if n < frames:
+            raise _CallbackStop()
+
+    def _record_timing(self, seconds: float, frames: int):
+        ms = seconds * 1000.0
+        self.blocks += 1
+        self.last_cpu_ms = ms
+        if ms > self.max_cpu_ms:
+            self.max_cpu_ms = ms
+        # Exponential moving average (~50 blocks)
+        alpha = 0.02 if self.blocks > 1 else 1.0
+        self.avg_cpu_ms += alpha * (ms - self.avg_cpu_ms)
+        block_ms = 1000.0 * max(1, int(frames)) / float(self.sr)
+        self.avg_load += alpha * (ms / block_ms - self.avg_load)
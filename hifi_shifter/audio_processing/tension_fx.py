@@ -1,5 +1,4 @@
 import numpy as np
-import torch
 
 
 def apply_tension_tilt_pd(
@@ -13,6 +12,7 @@ def apply_tension_tilt_pd(
     hop_length: int = 1024,
     win_length: int = 2048,
     max_db: float = 17.0,
+    chunk_frames: int = 256,
 ) -> np.ndarray:
     """Apply a Pd-style "tension" spectral tilt driven by per-frame F0.
 
@@ -23,6 +23,8 @@ def apply_tension_tilt_pd(
     Notes:
     - f0_midi and tension are aligned to hop_size_f0 (usually model hop_size).
     - Processing hop_length is independent (defaults to 1024 to match the Pd patch).
+    - The track is processed `chunk_frames` STFT frames at a time with
+      overlap-add across chunk edges, so peak memory does not grow with length.
     """
     if audio_np is None or len(audio_np) == 0:
         return audio_np
@@ -37,97 +39,277 @@ def apply_tension_tilt_pd(
     except Exception:
         pass
 
-    audio_np = np.asarray(audio_np, dtype=np.float32)
-    f0_midi = np.asarray(f0_midi, dtype=np.float32)
-    tension = np.asarray(tension, dtype=np.float32)
-
-    # STFT
-    x = torch.from_numpy(audio_np).float().unsqueeze(0)  # [1, T]
-    window = torch.hann_window(win_length, periodic=True)
-    S = torch.stft(
-        x,
-        n_fft=n_fft,
-        hop_length=hop_length,
-        win_length=win_length,
-        window=window,
-        center=True,
-        pad_mode='reflect',
-        return_complex=True,
-    )  # [1, F, N]
-
-    S = S[0]  # [F, N]
-    n_frames = S.shape[1]
-
-    # Resample f0/tension to STFT frame rate.
-    # Use nearest-neighbor for voiced mask to avoid bleeding pitch into silence.
-    src_len = int(min(len(f0_midi), len(tension)))
-    if src_len <= 0 or n_frames <= 0:
-        return audio_np
+    core = TensionTiltFrames(
+        audio_np, sr, f0_midi, tension, hop_size_f0,
+        n_fft=n_fft, hop_length=hop_length, win_length=win_length, max_db=max_db,
+    )
+    if core.src_len <= 0 or core.n_frames <= 0:
+        return core.audio
+
+    out = np.empty(core.length, dtype=np.float32)
+    chunk = max(1, int(chunk_frames)) * core.hop
+    for start in range(0, core.length, chunk):
+        end = min(core.length, start + chunk)
+        core.render(start, end, out[start:end])
+    return out
+
+
+def update_tension_tilt_pd(
+    processed: np.ndarray,
+    audio_np: np.ndarray,
+    sr: int,
+    f0_midi: np.ndarray,
+    tension: np.ndarray,
+    hop_size_f0: int,
+    dirty_ranges,
+    **kwargs,
+) -> np.ndarray:
+    """Re-render, in place, the parts of `processed` affected by `dirty_ranges`.
+
+    `processed` must be the output of `apply_tension_tilt_pd` for an earlier
+    state of the same track. `dirty_ranges` are [start, end) ranges in
+    hop_size_f0 frames where tension, F0 or the dry audio changed since.
+    Only STFT frames whose input or control values overlap a range (plus the
+    window overlap around them) are recomputed.
+    """
+    core = TensionTiltFrames(audio_np, sr, f0_midi, tension, hop_size_f0, **kwargs)
+    if core.src_len <= 0 or core.n_frames <= 0 or len(processed) != core.length:
+        return processed
+
+    spans = sorted(core.affected_samples(s, e) for s, e in dirty_ranges)
+    merged = []
+    for a, b in spans:
+        if b <= a:
+            continue
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+
+    for a, b in merged:
+        core.render(a, b, processed[a:b])
+    return processed
+
+
+def _hann_window_padded(n_fft: int, win_length: int) -> np.ndarray:
+    """Periodic Hann window zero-padded (centred) to n_fft, as torch.stft does."""
+    n = np.arange(win_length, dtype=np.float64)
+    win = 0.5 - 0.5 * np.cos(2.0 * np.pi * n / float(win_length))
+    if win_length < n_fft:
+        left = (n_fft - win_length) // 2
+        win = np.pad(win, (left, n_fft - win_length - left))
+    return win.astype(np.float32)
+
+
+class TensionTiltFrames:
+    """Frame-level core of the tension tilt, shared by the streaming and chunked paths.
+
+    Frames follow `torch.stft(center=True, pad_mode='reflect')`: frame ``t``
+    covers samples ``[t*hop - n_fft//2, t*hop - n_fft//2 + n_fft)`` with
+    reflection at both ends. Output is windowed overlap-add divided by the
+    summed squared window, which is what `torch.istft` computes.
+    """
+
+    def __init__(
+        self,
+        audio_np: np.ndarray,
+        sr: int,
+        f0_midi: np.ndarray,
+        tension: np.ndarray,
+        hop_size_f0: int,
+        *,
+        n_fft: int = 2048,
+        hop_length: int = 1024,
+        win_length: int = 2048,
+        max_db: float = 17.0,
+    ):
+        self.audio = np.asarray(audio_np, dtype=np.float32).reshape(-1)
+        self.length = int(len(self.audio))
+        self.n_fft = int(n_fft)
+        self.hop = int(hop_length)
+        self.pad = self.n_fft // 2
+        self.max_db = float(max_db)
+        self.n_frames = 1 + self.length // self.hop if self.length > 0 else 0
+
+        self.window = _hann_window_padded(self.n_fft, int(win_length))
+        self.window_sq = self.window * self.window
+        self.freqs = np.fft.rfftfreq(self.n_fft, d=1.0 / float(sr)).astype(np.float32)
+
+        # Control curves are copied: the UI may keep editing the originals.
+        f0_midi = np.array(f0_midi, dtype=np.float32, copy=True).reshape(-1)
+        tension = np.array(tension, dtype=np.float32, copy=True).reshape(-1)
+        src_len = int(min(len(f0_midi), len(tension)))
+        self.src_len = src_len
+        self.hop_f0 = int(hop_size_f0)
+        self.ratio = self.hop / float(hop_size_f0)
+        self.tension = tension[:src_len]
+        self.voiced_src = ~np.isnan(f0_midi[:src_len])
+        self.valid = np.where(self.voiced_src)[0].astype(np.float32)
+        self.midi_valid = f0_midi[:src_len][self.voiced_src]
+
+    def frame_params(self, t: np.ndarray):
+        """Per-frame (gain_db, pivot_hz) for STFT frame indices ``t``; gain is 0 when unvoiced."""
+        k = len(t)
+        if self.src_len <= 0:
+            return np.zeros(k, dtype=np.float32), np.zeros(k, dtype=np.float32)
+
+        idx_float = np.clip(t.astype(np.float32) * np.float32(self.ratio), 0.0, float(self.src_len - 1))
+        idx_nn = np.clip(np.rint(idx_float).astype(np.int64), 0, self.src_len - 1)
+        voiced = self.voiced_src[idx_nn]
+
+        if len(self.valid) >= 2:
+            midi_rs = np.interp(idx_float, self.valid, self.midi_valid).astype(np.float32)
+        else:
+            midi_rs = np.zeros(k, dtype=np.float32)
+            voiced = np.zeros(k, dtype=bool)
+
+        tension_rs = np.interp(idx_float, np.arange(self.src_len, dtype=np.float32), self.tension).astype(np.float32)
+        gain_db = (tension_rs / 100.0) * self.max_db
+        gain_db[~voiced] = 0.0
+
+        # MIDI -> Hz; Pd patch: clip then *2
+        f0_hz = 440.0 * (2.0 ** ((midi_rs - 69.0) / 12.0))
+        pivot = (np.clip(f0_hz, 100.0, 1000.0) * 2.0).astype(np.float32)
+        return gain_db.astype(np.float32), pivot
+
+    def _gather(self, t: np.ndarray) -> np.ndarray:
+        """Input frames [len(t), n_fft] with reflect padding at the signal edges."""
+        idx = (t[:, None] * self.hop - self.pad) + np.arange(self.n_fft)[None, :]
+        last = self.length - 1
+        idx = np.abs(idx)  # reflect at the start
+        idx = np.where(idx > last, 2 * last - idx, idx)  # reflect at the end
+        idx = np.clip(idx, 0, last)  # only hit by signals shorter than n_fft//2
+        return self.audio[idx]
+
+    def process(self, t: np.ndarray) -> np.ndarray:
+        """Windowed output frames [len(t), n_fft], ready for overlap-add."""
+        t = np.asarray(t, dtype=np.int64).reshape(-1)
+        frames = self._gather(t) * self.window
+        gain_db, pivot = self.frame_params(t)
+
+        # Frames without tilt pass through; only the rest need FFTs.
+        active = np.flatnonzero(np.abs(gain_db) > 1e-6)
+        if len(active) > 0:
+            g = gain_db[active, None]
+            db = g * (self.freqs[None, :] / pivot[active, None] - 1.0)
+            db = np.clip(db, -np.abs(g), np.abs(g))
+            spec = np.fft.rfft(frames[active], axis=1)
+            spec *= np.power(10.0, db / 20.0)
+            frames[active] = np.fft.irfft(spec, n=self.n_fft, axis=1)
+        frames *= self.window
+        return frames.astype(np.float32, copy=False)
+
+    def frame_range(self, start: int, end: int):
+        """Inclusive range of frames overlapping samples [start, end), clipped to the signal."""
+        t_lo = max(0, -(-(start + self.pad - self.n_fft + 1) // self.hop))
+        t_hi = min(self.n_frames - 1, (end - 1 + self.pad) // self.hop)
+        return t_lo, t_hi
+
+    def affected_samples(self, f0_start: int, f0_end: int):
+        """Output samples [a, b) that change when controls/audio in f0 frames [f0_start, f0_end) change."""
+        # Frames whose interpolated controls read those f0 frames (one frame of
+        # slack for the floor/ceil/nearest lookups) ...
+        t_lo = int(np.floor((f0_start - 2) / self.ratio))
+        t_hi = int(np.ceil((f0_end + 1) / self.ratio))
+        # ... and frames whose input window overlaps the corresponding audio
+        a_lo, a_hi = self.frame_range(f0_start * self.hop_f0, f0_end * self.hop_f0)
+        if a_lo <= a_hi:
+            t_lo = min(t_lo, a_lo)
+            t_hi = max(t_hi, a_hi)
+        t_lo = max(0, t_lo)
+        t_hi = min(self.n_frames - 1, t_hi)
+        if t_hi < t_lo:
+            return 0, 0
+        return max(0, t_lo * self.hop - self.pad), min(self.length, t_hi * self.hop - self.pad + self.n_fft)
+
+    def render(self, start: int, end: int, out: np.ndarray) -> np.ndarray:
+        """Write processed samples [start, end) into `out`.
+
+        Every frame overlapping the range is recomputed (at most
+        n_fft/hop - 1 extra frames per edge), so ranges can be rendered
+        independently and still match a whole-signal pass.
+        """
+        start = int(max(0, start))
+        end = int(min(self.length, end))
+        if end <= start:
+            return out
+
+        t_lo, t_hi = self.frame_range(start, end)
+        frames = self.process(np.arange(t_lo, t_hi + 1))
+        k = len(frames)
+        hop = self.hop
+        base = t_lo * hop - self.pad
+
+        if self.n_fft % hop == 0:
+            # Vectorised overlap-add: n_fft/hop strided adds of [k, hop] blocks
+            r_max = self.n_fft // hop
+            acc = np.zeros((k - 1 + r_max, hop), dtype=np.float32)
+            env = np.zeros((k - 1 + r_max, hop), dtype=np.float32)
+            for r in range(r_max):
+                acc[r:r + k] += frames[:, r * hop:(r + 1) * hop]
+                env[r:r + k] += self.window_sq[r * hop:(r + 1) * hop]
+            acc = acc.reshape(-1)
+            env = env.reshape(-1)
+        else:
+            acc = np.zeros((k - 1) * hop + self.n_fft, dtype=np.float32)
+            env = np.zeros_like(acc)
+            for i in range(k):
+                acc[i * hop:i * hop + self.n_fft] += frames[i]
+                env[i * hop:i * hop + self.n_fft] += self.window_sq
+
+        y = acc[start - base:end - base]
+        e = env[start - base:end - base]
+        out[:end - start] = np.divide(y, e, out=np.zeros_like(y), where=e > 1e-11)
+        return out
+
+
+class TensionTiltStream:
+    """Block-wise tension tilt for the playback mixer.
+
+    `read(start, out)` renders processed samples on demand from the dry
+    buffer. Frames computed for one block are kept for the next, so
+    sequential playback does each STFT frame once and no full-length
+    processed copy is ever made.
+    """
+
+    def __init__(self, audio_np, sr, f0_midi, tension, hop_size_f0, **kwargs):
+        self.core = TensionTiltFrames(audio_np, sr, f0_midi, tension, hop_size_f0, **kwargs)
+        self._cache = {}  # frame index -> windowed output frame
+        self._env = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return self.core.length
+
+    def read(self, start: int, out: np.ndarray):
+        core = self.core
+        n = len(out)
+        out.fill(0.0)
+        end = min(start + n, core.length)
+        if n <= 0 or end <= start:
+            return out
+
+        t_lo, t_hi = core.frame_range(start, end)
+        cache = self._cache
+        for t in [t for t in cache if t < t_lo or t > t_hi]:
+            del cache[t]
+        missing = [t for t in range(t_lo, t_hi + 1) if t not in cache]
+        if missing:
+            for t, frame in zip(missing, core.process(np.asarray(missing))):
+                cache[t] = frame
+
+        if len(self._env) < n:
+            self._env = np.zeros(n, dtype=np.float32)
+        env = self._env[:n]
+        env.fill(0.0)
+
+        for t in range(t_lo, t_hi + 1):
+            f0 = t * core.hop - core.pad
+            a = max(start, f0)
+            b = min(end, f0 + core.n_fft)
+            if b <= a:
+                continue
+            out[a - start:b - start] += cache[t][a - f0:b - f0]
+            env[a - start:b - start] += core.window_sq[a - f0:b - f0]
 
-    f0_midi = f0_midi[:src_len]
-    tension = tension[:src_len]
-
-    idx_float = (np.arange(n_frames, dtype=np.float32) * (hop_length / float(hop_size_f0)))
-    idx_float = np.clip(idx_float, 0.0, float(src_len - 1))
-    idx_nn = np.clip(np.rint(idx_float).astype(np.int64), 0, src_len - 1)
-
-    voiced_src = ~np.isnan(f0_midi)
-    voiced = voiced_src[idx_nn]
-
-    valid = np.where(voiced_src)[0]
-    if len(valid) >= 2:
-        midi_valid = f0_midi[valid]
-        midi_rs = np.interp(idx_float, valid.astype(np.float32), midi_valid.astype(np.float32)).astype(np.float32)
-    else:
-        midi_rs = np.zeros(n_frames, dtype=np.float32)
-        voiced[:] = False
-
-    tension_rs = np.interp(
-        idx_float,
-        np.arange(src_len, dtype=np.float32),
-        tension.astype(np.float32),
-    ).astype(np.float32)
-
-    gain_db = (tension_rs / 100.0) * float(max_db)
-    gain_db[~voiced] = 0.0
-
-    # MIDI -> Hz
-    f0_hz = 440.0 * (2.0 ** ((midi_rs - 69.0) / 12.0))
-    f0_hz[~voiced] = 0.0
-
-    # Pd patch: clip then *2
-    f0_hz = np.clip(f0_hz, 100.0, 1000.0) * 2.0
-    f0_hz[~voiced] = 0.0
-
-    # Build per-bin gain matrix
-    freqs = torch.fft.rfftfreq(n_fft, d=1.0 / float(sr)).float()  # [F]
-    freqs = freqs.unsqueeze(0)  # [1, F]
-
-    gain_db_t = torch.from_numpy(gain_db).float().unsqueeze(1)  # [N, 1]
-    pivot = torch.from_numpy(f0_hz).float().unsqueeze(1)  # [N, 1]
-    voiced_t = torch.from_numpy(voiced.astype(np.bool_)).unsqueeze(1)
-
-    pivot_safe = torch.where(pivot > 1e-6, pivot, torch.ones_like(pivot))
-    ratio = (freqs / pivot_safe) - 1.0  # [N, F] via broadcast
-    db = gain_db_t * ratio
-
-    abs_db = gain_db_t.abs()
-    db = torch.maximum(torch.minimum(db, abs_db), -abs_db)
-    db = torch.where(voiced_t, db, torch.zeros_like(db))
-
-    gain_lin = torch.pow(10.0, db / 20.0)  # [N, F]
-
-    # Apply (transpose to [F, N])
-    S_out = S * gain_lin.transpose(0, 1)
-
-    y = torch.istft(
-        S_out.unsqueeze(0),
-        n_fft=n_fft,
-        hop_length=hop_length,
-        win_length=win_length,
-        window=window,
-        center=True,
-        length=audio_np.shape[0],
-    )[0]
-
-    return y.detach().cpu().numpy().astype(np.float32)
+        np.divide(out, env, out=out, where=env > 1e-11)
+        return out
@@ -2,6 +2,8 @@ import ctypes
 import os
 import pathlib
 import platform
+import weakref
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Optional
 
@@ -72,65 +74,73 @@ class VSCPINFOEX(ctypes.Structure):
     ]
 
 
-class VslibEngine:
-    """Thin ctypes wrapper around vslib.dll / vslib_x64.dll."""
+class VslibBackend(ABC):
+    """The subset of the VSLIB API used by the engine.
 
-    def __init__(self):
-        self._lib: ctypes.WinDLL | None = None
-        self._dll_path: pathlib.Path | None = None
-        self._load_error: Optional[str] = None
-        self._status: Optional[VslibStatus] = None
+    `DllVslibBackend` calls the real DLL through ctypes; `vslib_fake.FakeVslib`
+    is a pure-Python stand-in so sessions can be exercised and benchmarked on
+    any platform. Failed calls raise `VslibError`.
+    """
 
-    @property
-    def status(self) -> VslibStatus:
-        if self._status is None:
-            try:
-                self._ensure_loaded()
-                self._status = VslibStatus(True, self._dll_path, None)
-            except VslibUnavailableError as exc:
-                self._status = VslibStatus(False, self._dll_path, exc.reason)
-        return self._status
+    @abstractmethod
+    def create_project(self):
+        ...
 
-    def _ensure_loaded(self):
-        if self._lib is not None:
-            return
+    @abstractmethod
+    def delete_project(self, prj):
+        ...
 
-        if os.name != "nt":
-            raise VslibUnavailableError("VSLIB is only available on Windows")
+    @abstractmethod
+    def add_item(self, prj, path: bytes) -> int:
+        ...
 
-        repo_root = pathlib.Path(__file__).resolve().parents[2]
-        vslib_dir = repo_root / "vslib"
+    @abstractmethod
+    def get_item_info(self, prj, item: int) -> VSITEMINFO:
+        ...
 
-        arch_bits, _ = platform.architecture()
-        is_64 = arch_bits == "64bit"
-        candidates = [
-            vslib_dir / ("vslib_x64.dll" if is_64 else "vslib.dll"),
-            vslib_dir / "vslib.dll",
-            vslib_dir / "vslib_x64.dll",
-        ]
+    @abstractmethod
+    def get_project_info(self, prj) -> VSPRJINFO:
+        ...
 
-        last_error: Optional[str] = None
-        for cand in candidates:
-            if not cand.exists():
-                continue
-            try:
-                self._lib = ctypes.WinDLL(str(cand))
-                self._dll_path = cand
-                break
-            except OSError as exc:  # pragma: no cover - platform-specific
-                last_error = str(exc)
-                self._lib = None
-                continue
+    @abstractmethod
+    def set_project_info(self, prj, info: VSPRJINFO):
+        ...
 
-        if self._lib is None:
-            reason = last_error or "vslib.dll not found"
-            raise VslibUnavailableError(reason)
+    @abstractmethod
+    def get_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        """Fill `cp` with control point `idx` of `item`."""
 
+    @abstractmethod
+    def set_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        ...
+
+    @abstractmethod
+    def get_mix_sample(self, prj) -> int:
+        ...
+
+    @abstractmethod
+    def get_mix_data(self, prj, buf, bits: int, channels: int, offset: int, length: int):
+        """Render `length` mixed samples starting at sample `offset` into `buf`."""
+
+    @abstractmethod
+    def freq2cent(self, hz: float) -> int:
+        ...
+
+
+def _check(rc: int, step: str):
+    if rc != 0:
+        raise VslibError(step, rc)
+
+
+class DllVslibBackend(VslibBackend):
+    """ctypes binding of vslib.dll / vslib_x64.dll."""
+
+    def __init__(self, lib):
+        self._lib = lib
         self._bind_signatures()
 
     # Keep signatures in one place to avoid repetitive setup
     def _bind_signatures(self):
-        assert self._lib is not None
         lib = self._lib
 
         lib.VslibCreateProject.argtypes = [ctypes.POINTER(ctypes.c_void_p)]
@@ -183,24 +193,293 @@ class VslibEngine:
         lib.VslibFreq2Cent.argtypes = [ctypes.c_double]
         lib.VslibFreq2Cent.restype = ctypes.c_int
 
-    @staticmethod
-    def _encode_path(path: pathlib.Path) -> bytes:
-        # Use Windows MBCS encoding so JP paths work; fallback to UTF-8.
+    def create_project(self):
+        prj = ctypes.c_void_p()
+        _check(self._lib.VslibCreateProject(ctypes.byref(prj)), "VslibCreateProject")
+        return prj
+
+    def delete_project(self, prj):
+        self._lib.VslibDeleteProject(prj)
+
+    def add_item(self, prj, path: bytes) -> int:
+        item_num = ctypes.c_int()
+        _check(self._lib.VslibAddItem(prj, path, ctypes.byref(item_num)), "VslibAddItem")
+        return int(item_num.value)
+
+    def get_item_info(self, prj, item: int) -> VSITEMINFO:
+        info = VSITEMINFO()
+        _check(self._lib.VslibGetItemInfo(prj, item, ctypes.byref(info)), "VslibGetItemInfo")
+        return info
+
+    def get_project_info(self, prj) -> VSPRJINFO:
+        info = VSPRJINFO()
+        _check(self._lib.VslibGetProjectInfo(prj, ctypes.byref(info)), "VslibGetProjectInfo")
+        return info
+
+    def set_project_info(self, prj, info: VSPRJINFO):
+        _check(self._lib.VslibSetProjectInfo(prj, ctypes.byref(info)), "VslibSetProjectInfo")
+
+    def get_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        _check(self._lib.VslibGetCtrlPntInfoEx(prj, item, idx, ctypes.byref(cp)), "VslibGetCtrlPntInfoEx")
+
+    def set_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        _check(self._lib.VslibSetCtrlPntInfoEx(prj, item, idx, ctypes.byref(cp)), "VslibSetCtrlPntInfoEx")
+
+    def get_mix_sample(self, prj) -> int:
+        total = ctypes.c_int()
+        _check(self._lib.VslibGetMixSample(prj, ctypes.byref(total)), "VslibGetMixSample")
+        return int(total.value)
+
+    def get_mix_data(self, prj, buf, bits: int, channels: int, offset: int, length: int):
+        _check(self._lib.VslibGetMixData(prj, buf, bits, channels, offset, length), "VslibGetMixData")
+
+    def freq2cent(self, hz: float) -> int:
+        return int(self._lib.VslibFreq2Cent(ctypes.c_double(hz)))
+
+
+# numpy view of VSCPINFOEX (built from the ctypes layout, padding included)
+VSCPINFOEX_DTYPE = np.dtype({
+    'names': [name for name, _ in VSCPINFOEX._fields_],
+    'formats': [np.dtype(ctype) for _, ctype in VSCPINFOEX._fields_],
+    'offsets': [getattr(VSCPINFOEX, name).offset for name, _ in VSCPINFOEX._fields_],
+    'itemsize': ctypes.sizeof(VSCPINFOEX),
+})
+
+
+def _midi_to_hz(f0_midi: np.ndarray) -> np.ndarray:
+    hz = np.zeros_like(f0_midi, dtype=np.float64)
+    mask = ~np.isnan(f0_midi)
+    hz[mask] = 440.0 * np.power(2.0, (f0_midi[mask] - 69.0) / 12.0)
+    return hz
+
+
+def _encode_path(path: pathlib.Path) -> bytes:
+    # Use Windows MBCS encoding so JP paths work; fallback to UTF-8.
+    try:
+        return os.fsencode(str(path))
+    except Exception:
+        return str(path).encode("utf-8", errors="ignore")
+
+
+def _release_session(backend: VslibBackend, prj, wav_path: Optional[pathlib.Path]):
+    try:
+        backend.delete_project(prj)
+    except Exception:
+        pass
+    if wav_path is not None:
         try:
-            return os.fsencode(str(path))
+            wav_path.unlink()
         except Exception:
-            return str(path).encode("utf-8", errors="ignore")
+            pass
+
+
+class VslibSession:
+    """A VSLIB project with one item, kept alive across syntheses of a track.
+
+    All control points are read once when the session opens. Afterwards
+    `push_pitch` remembers the target pitch it last pushed per control point
+    and only sets points whose target changed (and whose resulting
+    ``pitEdit``/``pitFlgEdit`` actually differ), so a one-note edit costs a
+    handful of VSLIB calls instead of two per control point.
+
+    With `delete_file` the session owns `wav_path` and removes it on close.
+    Sessions not closed explicitly are released when garbage collected.
+    """
+
+    def __init__(self, backend: VslibBackend, wav_path: pathlib.Path, *, sample_rate: int,
+                 delete_file: bool = False):
+        self.backend = backend
+        self.wav_path = pathlib.Path(wav_path)
+        self.sample_rate = int(sample_rate)
+        self._prj = backend.create_project()
+        self._finalizer = weakref.finalize(
+            self, _release_session, backend, self._prj, self.wav_path if delete_file else None
+        )
+        try:
+            self._item = backend.add_item(self._prj, _encode_path(self.wav_path))
 
-    @staticmethod
-    def _midi_to_hz(f0_midi: np.ndarray) -> np.ndarray:
-        hz = np.zeros_like(f0_midi, dtype=np.float64)
-        mask = ~np.isnan(f0_midi)
-        hz[mask] = 440.0 * np.power(2.0, (f0_midi[mask] - 69.0) / 12.0)
-        return hz
+            # Force project sample rate to match the working buffer to avoid resample mismatches
+            try:
+                prj_info = backend.get_project_info(self._prj)
+                if prj_info.sampFreq != self.sample_rate:
+                    prj_info.sampFreq = self.sample_rate
+                    backend.set_project_info(self._prj, prj_info)
+            except VslibError:
+                pass
 
-    def _check(self, rc: int, step: str):
-        if rc != 0:
-            raise VslibError(step, rc)
+            info = backend.get_item_info(self._prj, self._item)
+            self.ctrl_rate = max(1, int(info.ctrlPntPs))
+            self.ctrl_num = int(info.ctrlPntNum)
+            if self.ctrl_num <= 0:
+                raise VslibError("CtrlPointCount", -1)
+
+            # Control point structs, also viewed as a numpy record array
+            self._points = (VSCPINFOEX * self.ctrl_num)()
+            for idx in range(self.ctrl_num):
+                backend.get_ctrl_pnt(self._prj, self._item, idx, self._points[idx])
+            self._cp = np.frombuffer(self._points, dtype=VSCPINFOEX_DTYPE)
+        except Exception:
+            self.close()
+            raise
+
+        self._last_target: Optional[np.ndarray] = None
+        self._last_no_change: Optional[np.ndarray] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._prj is None
+
+    def _targets(self, f0_midi_original, f0_midi_edited, hop_size: int):
+        frame_dt = float(hop_size) / float(self.sample_rate)
+        frame_times = np.arange(len(f0_midi_edited), dtype=np.float64) * frame_dt
+        ctrl_times = np.arange(self.ctrl_num, dtype=np.float64) / float(self.ctrl_rate)
+
+        f0_hz_orig = np.nan_to_num(_midi_to_hz(f0_midi_original), nan=0.0, posinf=0.0, neginf=0.0)
+        target_orig = np.interp(ctrl_times, frame_times, f0_hz_orig, left=0.0, right=0.0)
+
+        f0_hz_edit = np.nan_to_num(_midi_to_hz(f0_midi_edited), nan=0.0, posinf=0.0, neginf=0.0)
+        target_edit = np.interp(ctrl_times, frame_times, f0_hz_edit, left=0.0, right=0.0)
+        return target_orig, target_edit
+
+    def push_pitch(self, f0_midi_original: np.ndarray, f0_midi_edited: np.ndarray, *, hop_size: int) -> int:
+        """Map a per-frame MIDI F0 contour onto the control points; returns how many were set.
+
+        Points with no pitch change (original == edited) keep the original
+        pitch/flag so consonants stay unprocessed.
+        """
+        target_orig, target_edit = self._targets(f0_midi_original, f0_midi_edited, hop_size)
+        no_change = np.isclose(target_orig, target_edit, rtol=0, atol=1e-3)
+
+        if self._last_target is None:
+            candidates = np.arange(self.ctrl_num)
+        else:
+            changed = (target_edit != self._last_target) | (no_change != self._last_no_change)
+            candidates = np.flatnonzero(changed)
+        self._last_target = target_edit
+        self._last_no_change = no_change
+        if len(candidates) == 0:
+            return 0
+
+        cp = self._cp
+        pit = cp['pitEdit'][candidates].copy()
+        flg = cp['pitFlgEdit'][candidates].copy()
+
+        keep = no_change[candidates]
+        pit[keep] = cp['pitOrg'][candidates[keep]]
+        flg[keep] = cp['pitFlgOrg'][candidates[keep]]
+
+        voiced = ~keep & (target_edit[candidates] > 1e-3)
+        for j in np.flatnonzero(voiced):
+            pit[j] = int(round(self.backend.freq2cent(float(target_edit[candidates[j]]))))
+        flg[voiced] = 1
+
+        # Unvoiced: pitch correction off (pitEdit as a fresh project has it)
+        unvoiced = ~keep & ~voiced
+        pit[unvoiced] = cp['pitOrg'][candidates[unvoiced]]
+        flg[unvoiced] = 0
+
+        differs = (pit != cp['pitEdit'][candidates]) | (flg != cp['pitFlgEdit'][candidates])
+        to_set = candidates[differs]
+        cp['pitEdit'][to_set] = pit[differs]
+        cp['pitFlgEdit'][to_set] = flg[differs]
+        for idx in to_set:
+            self.backend.set_ctrl_pnt(self._prj, self._item, int(idx), self._points[idx])
+        return len(to_set)
+
+    def render(self) -> np.ndarray:
+        """Render the whole mix as float32 mono."""
+        n = self.backend.get_mix_sample(self._prj)
+        if n <= 0:
+            raise VslibError("MixSampleZero", -1)
+        return self._mix_data(0, n)
+
+    def render_range(self, offset: int, length: int) -> np.ndarray:
+        """Render mix samples [offset, offset + length) only (shorter at the end of the mix)."""
+        n = self.backend.get_mix_sample(self._prj)
+        length = min(int(length), n - int(offset))
+        if length <= 0:
+            return np.zeros(0, dtype=np.float32)
+        return self._mix_data(int(offset), length)
+
+    def _mix_data(self, offset: int, length: int) -> np.ndarray:
+        buf = (ctypes.c_short * length)()
+        self.backend.get_mix_data(self._prj, buf, 16, 1, offset, length)
+        return np.frombuffer(buf, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def synthesize(self, f0_midi_original, f0_midi_edited, *, hop_size: int) -> np.ndarray:
+        self.push_pitch(f0_midi_original, f0_midi_edited, hop_size=hop_size)
+        return self.render()
+
+    def close(self):
+        self._finalizer()
+        self._prj = None
+
+
+class VslibEngine:
+    """Loads VSLIB (or uses the given backend) and opens synthesis sessions."""
+
+    def __init__(self, backend: Optional[VslibBackend] = None):
+        self._backend: Optional[VslibBackend] = backend
+        self._dll_path: Optional[pathlib.Path] = None
+        self._load_error: Optional[str] = None
+        self._status: Optional[VslibStatus] = None
+
+    @property
+    def status(self) -> VslibStatus:
+        if self._status is None:
+            try:
+                self._ensure_loaded()
+                self._status = VslibStatus(True, self._dll_path, None)
+            except VslibUnavailableError as exc:
+                self._status = VslibStatus(False, self._dll_path, exc.reason)
+        return self._status
+
+    @property
+    def backend(self) -> VslibBackend:
+        self._ensure_loaded()
+        assert self._backend is not None
+        return self._backend
+
+    def _ensure_loaded(self):
+        if self._backend is not None:
+            return
+
+        if os.name != "nt":
+            raise VslibUnavailableError("VSLIB is only available on Windows")
+
+        repo_root = pathlib.Path(__file__).resolve().parents[2]
+        vslib_dir = repo_root / "vslib"
+
+        arch_bits, _ = platform.architecture()
+        is_64 = arch_bits == "64bit"
+        candidates = [
+            vslib_dir / ("vslib_x64.dll" if is_64 else "vslib.dll"),
+            vslib_dir / "vslib.dll",
+            vslib_dir / "vslib_x64.dll",
+        ]
+
+        lib = None
+        last_error: Optional[str] = None
+        for cand in candidates:
+            if not cand.exists():
+                continue
+            try:
+                lib = ctypes.WinDLL(str(cand))
+                self._dll_path = cand
+                break
+            except OSError as exc:  # pragma: no cover - platform-specific
+                last_error = str(exc)
+                lib = None
+                continue
+
+        if lib is None:
+            reason = last_error or "vslib.dll not found"
+            raise VslibUnavailableError(reason)
+
+        self._backend = DllVslibBackend(lib)
+
+    def open_session(self, wav_path: pathlib.Path, *, sample_rate: int, delete_file: bool = False) -> VslibSession:
+        return VslibSession(self.backend, wav_path, sample_rate=sample_rate, delete_file=delete_file)
 
     def synthesize_from_pitch(
         self,
@@ -211,93 +490,9 @@ class VslibEngine:
         sample_rate: int,
         hop_size: int,
     ) -> np.ndarray:
-        """Synthesize audio using VSLIB with a per-frame MIDI F0 contour.
-
-        If a control point has no pitch change (original == edited), we keep
-        the original pitch/flag so consonants stay unprocessed.
-        """
-        self._ensure_loaded()
-        lib = self._lib
-        assert lib is not None
-
-        prj = ctypes.c_void_p()
-        self._check(lib.VslibCreateProject(ctypes.byref(prj)), "VslibCreateProject")
-
+        """One-off synthesis: open a session, render, close it."""
+        session = self.open_session(wav_path, sample_rate=sample_rate)
         try:
-            item_num = ctypes.c_int()
-            self._check(
-                lib.VslibAddItem(prj, self._encode_path(wav_path), ctypes.byref(item_num)),
-                "VslibAddItem",
-            )
-
-            # Force project sample rate to match the working buffer to avoid resample mismatches
-            prj_info = VSPRJINFO()
-            if lib.VslibGetProjectInfo(prj, ctypes.byref(prj_info)) == 0:
-                if prj_info.sampFreq != int(sample_rate):
-                    prj_info.sampFreq = int(sample_rate)
-                    lib.VslibSetProjectInfo(prj, ctypes.byref(prj_info))
-
-            info = VSITEMINFO()
-            self._check(lib.VslibGetItemInfo(prj, item_num.value, ctypes.byref(info)), "VslibGetItemInfo")
-
-            ctrl_rate = max(1, int(info.ctrlPntPs))
-            ctrl_num = int(info.ctrlPntNum)
-            if ctrl_num <= 0:
-                raise VslibError("CtrlPointCount", -1)
-
-            frame_dt = float(hop_size) / float(sample_rate)
-            frame_times = np.arange(len(f0_midi_edited), dtype=np.float64) * frame_dt
-            ctrl_times = np.arange(ctrl_num, dtype=np.float64) / float(ctrl_rate)
-
-            f0_hz_orig = self._midi_to_hz(f0_midi_original)
-            f0_hz_orig = np.nan_to_num(f0_hz_orig, nan=0.0, posinf=0.0, neginf=0.0)
-            target_orig = np.interp(ctrl_times, frame_times, f0_hz_orig, left=0.0, right=0.0)
-
-            f0_hz_edit = self._midi_to_hz(f0_midi_edited)
-            f0_hz_edit = np.nan_to_num(f0_hz_edit, nan=0.0, posinf=0.0, neginf=0.0)
-            target_edit = np.interp(ctrl_times, frame_times, f0_hz_edit, left=0.0, right=0.0)
-
-            voiced = target_edit > 1e-3
-            no_change = np.isclose(target_orig, target_edit, rtol=0, atol=1e-3)
-
-            # Update every control point
-            for idx in range(ctrl_num):
-                cp = VSCPINFOEX()
-                self._check(
-                    lib.VslibGetCtrlPntInfoEx(prj, item_num.value, idx, ctypes.byref(cp)),
-                    "VslibGetCtrlPntInfoEx",
-                )
-
-                if no_change[idx]:
-                    cp.pitEdit = cp.pitOrg
-                    cp.pitFlgEdit = cp.pitFlgOrg
-                elif voiced[idx]:
-                    cent = int(round(lib.VslibFreq2Cent(ctypes.c_double(target_edit[idx]))))
-                    cp.pitEdit = cent
-                    cp.pitFlgEdit = 1
-                else:
-                    cp.pitFlgEdit = 0
-                self._check(
-                    lib.VslibSetCtrlPntInfoEx(prj, item_num.value, idx, ctypes.byref(cp)),
-                    "VslibSetCtrlPntInfoEx",
-                )
-
-            total_samples = ctypes.c_int()
-            self._check(lib.VslibGetMixSample(prj, ctypes.byref(total_samples)), "VslibGetMixSample")
-            n = int(total_samples.value)
-            if n <= 0:
-                raise VslibError("MixSampleZero", -1)
-
-            buf = (ctypes.c_short * n)()
-            self._check(
-                lib.VslibGetMixData(prj, buf, 16, 1, 0, n),
-                "VslibGetMixData",
-            )
-
-            audio = np.frombuffer(buf, dtype=np.int16).astype(np.float32) / 32768.0
-            return audio
+            return session.synthesize(f0_midi_original, f0_midi_edited, hop_size=hop_size)
         finally:
-            try:
-                lib.VslibDeleteProject(prj)
-            except Exception:
-                pass
+            session.close()
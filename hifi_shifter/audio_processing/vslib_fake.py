@@ -0,0 +1,211 @@
+"""Pure-Python stand-in for the VSLIB DLL.
+
+Implements `VslibBackend` on top of the stdlib `wave` module so VSLIB
+sessions run on any platform: items are 16-bit mono WAV files, every control
+point starts at C4 with its pitch flag set, and the "mix" is the source
+audio, halved wherever a control point's pitch is edited (no actual pitch
+shifting, but renders depend on the pushed points). Every call is counted in
+`calls`, which makes the number of FFI round trips of a synthesis measurable.
+
+    python -m hifi_shifter.audio_processing.vslib_fake
+"""
+
+import collections
+import math
+import wave
+
+import numpy as np
+
+from .vslib_engine import VSCPINFOEX, VSCPINFOEX_DTYPE, VSITEMINFO, VSPRJINFO, VslibBackend, VslibError
+
+FAKE_CTRL_PNT_PS = 200  # control points per second (one every 5 ms)
+FAKE_PIT_ORG = 6000  # C4 in VSLIB cents (0 = C-1)
+
+_C_MINUS_1_HZ = 440.0 * 2.0 ** (-69.0 / 12.0)
+
+
+class _FakeItem:
+    def __init__(self, path: bytes):
+        with wave.open(path.decode('utf-8', errors='surrogateescape'), 'rb') as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                raise VslibError("VslibAddItem", 6)
+            self.samp_freq = wf.getframerate()
+            self.samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype='<i2').copy()
+        n = max(1, int(math.ceil(len(self.samples) * FAKE_CTRL_PNT_PS / self.samp_freq)))
+        self.points = (VSCPINFOEX * n)()
+        for cp in self.points:
+            cp.pitOrg = cp.pitEdit = FAKE_PIT_ORG
+            cp.pitFlgOrg = cp.pitFlgEdit = 1
+
+
+class _FakeProject:
+    def __init__(self):
+        self.info = VSPRJINFO(1.0, 44100)
+        self.items = []
+
+
+class FakeVslib(VslibBackend):
+    def __init__(self):
+        self.calls = collections.Counter()
+        self._projects = {}
+        self._next_handle = 1
+
+    def _project(self, prj) -> _FakeProject:
+        try:
+            return self._projects[prj]
+        except KeyError:
+            raise VslibError("InvalidProject", 1)
+
+    def _item(self, prj, item: int) -> _FakeItem:
+        items = self._project(prj).items
+        if not 0 <= item < len(items):
+            raise VslibError("InvalidItem", 2)
+        return items[item]
+
+    def create_project(self):
+        self.calls['VslibCreateProject'] += 1
+        prj = self._next_handle
+        self._next_handle += 1
+        self._projects[prj] = _FakeProject()
+        return prj
+
+    def delete_project(self, prj):
+        self.calls['VslibDeleteProject'] += 1
+        self._projects.pop(prj, None)
+
+    def add_item(self, prj, path: bytes) -> int:
+        self.calls['VslibAddItem'] += 1
+        project = self._project(prj)
+        project.items.append(_FakeItem(path))
+        return len(project.items) - 1
+
+    def get_item_info(self, prj, item: int) -> VSITEMINFO:
+        self.calls['VslibGetItemInfo'] += 1
+        it = self._item(prj, item)
+        info = VSITEMINFO()
+        info.sampFreq = it.samp_freq
+        info.channel = 1
+        info.sampleOrg = info.sampleEdit = len(it.samples)
+        info.ctrlPntPs = FAKE_CTRL_PNT_PS
+        info.ctrlPntNum = len(it.points)
+        return info
+
+    def get_project_info(self, prj) -> VSPRJINFO:
+        self.calls['VslibGetProjectInfo'] += 1
+        info = self._project(prj).info
+        return VSPRJINFO(info.masterVolume, info.sampFreq)
+
+    def set_project_info(self, prj, info: VSPRJINFO):
+        self.calls['VslibSetProjectInfo'] += 1
+        self._project(prj).info = VSPRJINFO(info.masterVolume, info.sampFreq)
+
+    def get_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        self.calls['VslibGetCtrlPntInfoEx'] += 1
+        points = self._item(prj, item).points
+        if not 0 <= idx < len(points):
+            raise VslibError("VslibGetCtrlPntInfoEx", 3)
+        src = points[idx]
+        for name, _ in VSCPINFOEX._fields_:
+            setattr(cp, name, getattr(src, name))
+
+    def set_ctrl_pnt(self, prj, item: int, idx: int, cp: VSCPINFOEX):
+        self.calls['VslibSetCtrlPntInfoEx'] += 1
+        points = self._item(prj, item).points
+        if not 0 <= idx < len(points):
+            raise VslibError("VslibSetCtrlPntInfoEx", 3)
+        dst = points[idx]
+        dst.pitEdit = cp.pitEdit
+        dst.pitFlgEdit = cp.pitFlgEdit
+
+    def get_mix_sample(self, prj) -> int:
+        self.calls['VslibGetMixSample'] += 1
+        return max((len(it.samples) for it in self._project(prj).items), default=0)
+
+    def get_mix_data(self, prj, buf, bits: int, channels: int, offset: int, length: int):
+        self.calls['VslibGetMixData'] += 1
+        if bits != 16 or channels != 1:
+            raise VslibError("VslibGetMixData", 4)
+        out = np.frombuffer(buf, dtype=np.int16, count=length)
+        out[:] = 0
+        for it in self._project(prj).items:
+            chunk = it.samples[offset:offset + length].astype(np.int32)
+            cp = np.frombuffer(it.points, dtype=VSCPINFOEX_DTYPE)
+            edited = (cp['pitFlgEdit'] != cp['pitFlgOrg']) | (cp['pitEdit'] != cp['pitOrg'])
+            idx = (np.arange(offset, offset + len(chunk)) * FAKE_CTRL_PNT_PS) // it.samp_freq
+            chunk[edited[np.minimum(idx, len(edited) - 1)]] //= 2
+            out[:len(chunk)] = np.clip(out[:len(chunk)] + chunk, -32768, 32767)
+
+    def freq2cent(self, hz: float) -> int:
+        self.calls['VslibFreq2Cent'] += 1
+        return int(round(1200.0 * math.log2(hz / _C_MINUS_1_HZ))) if hz > 0 else 0
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import time
+
+    from .vslib_engine import VslibEngine
+
+    sr, hop = 44100, 512
+    seconds = 180
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(sr * seconds) * 3000).astype(np.int16)
+    n_frames = len(audio) // hop + 1
+    f0_orig = 60.0 + rng.standard_normal(n_frames).cumsum() * 0.01
+    f0_orig[rng.random(n_frames) < 0.2] = np.nan
+
+    fd, wav_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    with wave.open(wav_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(audio.tobytes())
+
+    try:
+        lib = FakeVslib()
+        engine = VslibEngine(backend=lib)
+
+        # One 0.5 s note moved up a semitone
+        f0_edit = f0_orig.copy()
+        note = slice(n_frames // 2, n_frames // 2 + int(0.5 * sr / hop))
+        f0_edit[note] += 1.0
+
+        t0 = time.perf_counter()
+        engine.synthesize_from_pitch(wav_path, f0_orig, f0_edit, sample_rate=sr, hop_size=hop)
+        t_once = time.perf_counter() - t0
+        once_calls = sum(lib.calls.values())
+
+        session = engine.open_session(wav_path, sample_rate=sr)
+        session.synthesize(f0_orig, f0_orig, hop_size=hop)
+        lib.calls.clear()
+        t0 = time.perf_counter()
+        session.synthesize(f0_orig, f0_edit, hop_size=hop)
+        t_diff = time.perf_counter() - t0
+        diff_calls = sum(lib.calls.values())
+        diff_breakdown = dict(lib.calls)
+
+
+        # Range-limited mixdown of the edited note vs the whole take
+        ranges = [(note.start * hop, (note.stop - note.start) * hop)]
+        lib.calls.clear()
+        t0 = time.perf_counter()
+        parts = [session.render_range(offset, length) for offset, length in ranges]
+        t_range = time.perf_counter() - t0
+        range_calls = sum(lib.calls.values())
+        t0 = time.perf_counter()
+        full = session.render()
+        t_full = time.perf_counter() - t0
+        for (offset, length), part in zip(ranges, parts):
+            assert np.array_equal(part, full[offset:offset + length])
+
+        print(f"| {seconds}s take, {session.ctrl_num} control points, one 0.5 s note edited")
+        print(f"| get + set of every point (previous engine): >= {2 * session.ctrl_num} calls")
+        print(f"| one-off synthesis: {once_calls} calls in {t_once * 1000:.1f} ms")
+        print(f"| persistent session: {diff_calls} calls in {t_diff * 1000:.1f} ms {diff_breakdown}")
+        print(f"| mixdown: note range {t_range * 1000:.1f} ms ({range_calls} calls, "
+              f"{sum(len(p) for p in parts)} samples), whole take {t_full * 1000:.1f} ms ({len(full)} samples)")
+        session.close()
+    finally:
+        os.remove(wav_path)
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import pathlib
@@ -23,9 +24,11 @@ from .audio_processing.tension_fx import apply_tension_tilt_pd
 from .audio_processing.vslib_engine import (
     VslibEngine,
     VslibError,
+    VslibSession,
     VslibStatus,
     VslibUnavailableError,
 )
+from .project_container import file_sha1
 
 
 
@@ -39,6 +42,8 @@ class AudioProcessor:
     def __init__(self):
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model = None
+        self.model_path: str | None = None  # absolute folder of the loaded model
+        self.model_hash: str | None = None  # content hash of config + checkpoint (bundle cache key)
         self.config: dict = {}
         self.mel_transform = None
         self.synthesis_engine = 'hifigan'
@@ -80,6 +85,10 @@ class AudioProcessor:
             ckpt_path,
             self.device,
         )
+        self.model_path = os.path.abspath(str(folder_path))
+        digest = hashlib.sha1()
+        file_sha1(config_path, digest)
+        self.model_hash = file_sha1(ckpt_path, digest)
 
         return self.config
 
@@ -183,48 +192,73 @@ class AudioProcessor:
         except VslibUnavailableError as exc:
             return VslibStatus(False, None, exc.reason)
 
+    def open_vslib_session(self, audio: np.ndarray, sample_rate: int) -> VslibSession:
+        """Write `audio` to a temporary 16-bit WAV and open a persistent VSLIB session on it.
+
+        The session owns the file; keep it per track and pass it to
+        `synthesize_full_vslib` so only changed control points are updated.
+        """
+        engine = self._get_vslib_engine()
+        audio_f = np.asarray(audio, dtype=np.float32)
+        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.wav', prefix='hifishifter_vslib_')
+        os.close(tmp_fd)
+        tmp_file = pathlib.Path(tmp_path)
+        try:
+            wav_int16 = (np.clip(audio_f, -1.0, 1.0) * 32767.0).astype(np.int16)
+            wavfile.write(tmp_file, int(sample_rate), wav_int16)
+            return engine.open_session(tmp_file, sample_rate=int(sample_rate), delete_file=True)
+        except Exception as exc:
+            try:
+                tmp_file.unlink()
+            except Exception:
+                pass
+            if isinstance(exc, VslibError) and exc.code == 6:
+                # VSERR_FREQ: guide users to resample when VSLIB rejects current spec
+                raise RuntimeError("VSLIB 不支持当前采样率或格式，请先转换为 44100Hz 16-bit WAV 再试。") from exc
+            raise
+
     def synthesize_full_vslib(
         self,
         audio: np.ndarray,
         sample_rate: int,
         f0_midi_original: np.ndarray,
         f0_midi_edited: np.ndarray,
+        session: VslibSession | None = None,
     ) -> np.ndarray:
         """Synthesize audio with VSLIB using edited MIDI F0 while preserving consonants.
 
         We map user edits onto VSLIB control points. If a control point has no
         pitch change (original == edited within tolerance), we keep VSLIB's
         original pitch flags to avoid over-processing consonants.
+        With a `session` (see `open_vslib_session`) only control points whose
+        target changed since its last synthesis are pushed; without one a
+        throwaway session is used.
         """
         if audio is None or f0_midi_edited is None:
             raise RuntimeError("缺少音频或音高数据，无法使用 VSLIB 合成")
 
-        engine = self._get_vslib_engine()
         hop_size = int(self.config.get('hop_size', 512)) if self.config else 512
-
-        audio_f = np.asarray(audio, dtype=np.float32)
-        tmp_fd, tmp_path = tempfile.mkstemp(suffix='.wav', prefix='hifishifter_vslib_')
-        os.close(tmp_fd)
-        tmp_file = pathlib.Path(tmp_path)
-
+        own_session = session is None
+        if own_session:
+            session = self.open_vslib_session(audio, sample_rate)
         try:
-            wav_int16 = (np.clip(audio_f, -1.0, 1.0) * 32767.0).astype(np.int16)
-            wavfile.write(tmp_file, int(sample_rate), wav_int16)
-
-            return engine.synthesize_from_pitch(
-                tmp_file,
-                f0_midi_original,
-                f0_midi_edited,
-                sample_rate=int(sample_rate),
-                hop_size=hop_size,
-            )
-        except VslibError as exc:
-            if exc.code == 6:
-                # VSERR_FREQ: guide users to resample when VSLIB rejects current spec
-                raise RuntimeError("VSLIB 不支持当前采样率或格式，请先转换为 44100Hz 16-bit WAV 再试。") from exc
-            raise
+            return session.synthesize(f0_midi_original, f0_midi_edited, hop_size=hop_size)
         finally:
-            try:
-                tmp_file.unlink()
-            except Exception:
-                pass
+            if own_session:
+                session.close()
+
+    def synthesize_vslib_ranges(
+        self,
+        session: VslibSession,
+        f0_midi_original: np.ndarray,
+        f0_midi_edited: np.ndarray,
+        ranges,
+    ) -> list:
+        """Push the pitch to a track's VSLIB session and render only the given sample ranges.
+
+        `ranges` is a list of ``(offset, length)`` in samples; returns one
+        float32 array per range (shorter if it runs past the end of the mix).
+        """
+        hop_size = int(self.config.get('hop_size', 512)) if self.config else 512
+        session.push_pitch(f0_midi_original, f0_midi_edited, hop_size=hop_size)
+        return [session.render_range(offset, length) for offset, length in ranges]
@@ -4,6 +4,8 @@ import os
 
 # Define config file path (in user's home directory)
 CONFIG_FILE = pathlib.Path.home() / '.vocal_shifter_config.json'
+# Derived data that can always be recomputed (waveform peaks, ...)
+CACHE_DIR = pathlib.Path.home() / '.vocal_shifter_cache'
 
 def load_config():
     """Load configuration from JSON file."""
@@ -24,6 +26,16 @@ def save_config(config):
     except Exception as e:
         print(f"Failed to save config: {e}")
 
+def get_cache_dir(name=None):
+    """Get (and create) the cache directory, or a named sub-directory of it."""
+    path = CACHE_DIR / name if name else CACHE_DIR
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        print(f"Failed to create cache dir: {e}")
+        return None
+    return path
+
 def get_default_model_path():
     """Get the default model path from config."""
     config = load_config()
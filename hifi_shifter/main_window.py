@@ -5,14 +5,13 @@ import json
 import pathlib
 import numpy as np
 import sounddevice as sd
-import scipy.io.wavfile as wavfile
 import traceback
-import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, 
                              QMessageBox, QComboBox, QDoubleSpinBox, QSpinBox,
                              QButtonGroup, QSplitter, QScrollBar, QGraphicsRectItem,
-                             QProgressBar, QAbstractSpinBox)
+                             QProgressBar, QAbstractSpinBox, QDialog, QDialogButtonBox,
+                             QCheckBox)
 from PyQt6.QtGui import QAction, QKeySequence, QPen, QColor, QBrush, QShortcut, QActionGroup, QIcon
 from PyQt6.QtCore import Qt, QTimer, QRectF, QObject, QThread, pyqtSignal
 import pyqtgraph as pg
@@ -22,8 +21,16 @@ import pyqtgraph as pg
 from .widgets import CustomViewBox, PianoRollAxis, BPMAxis, MusicGridItem, PlaybackCursorItem
 from .timeline import TimelinePanel, CONTROL_PANEL_WIDTH
 from .track import Track
+from .waveform_peaks import decimate_curve
 # Import AudioProcessor
-from .audio_processor import AudioProcessor, apply_tension_tilt_pd
+from .audio_processor import AudioProcessor
+from .audio_processing.mixer import PlaybackMixer, track_gains
+from .audio_processing.tension_fx import TensionTiltStream
+from . import project_io
+from .project_journal import EditJournal
+from . import vocalshifter_project
+from .audio_processing.export import (EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT, export_mix, export_stems,
+                                      with_format_suffix)
 
 # Import Config Manager
 from . import config_manager
@@ -100,10 +107,19 @@ class HifiShifterGUI(QMainWindow):
         # Data for UI
         self.project_path = None
         self.model_path = None
+        # Save features/renders inside the project (set by "Save as bundle" or opening a bundle)
+        self.save_as_bundle = False
         
         # Project dirty flag (unsaved changes)
         self.is_dirty = False
 
+        # Append-only edit journal next to the saved project (crash-safe autosave)
+        self._journal: EditJournal | None = None
+        self.journal_timer = QTimer()
+        self.journal_timer.setInterval(1000)
+        self.journal_timer.timeout.connect(self._on_journal_timer)
+        self.journal_timer.start()
+
         # Track Management
         self.tracks = []
 
@@ -123,10 +139,9 @@ class HifiShifterGUI(QMainWindow):
 
         # Real-time playback stream state (so volume/mute/solo changes apply during playback)
         self._playback_stream = None
-        self._playback_lock = threading.RLock()
-        self._playback_items = []  # list[(Track, np.ndarray(float32), start_sample)]
-        self._playback_sample_pos = 0
-        self._playback_total_samples = 0
+        self._playback_mixer: PlaybackMixer | None = None  # read by the audio callback
+        self._playback_tracks = []  # tracks in mixer source order
+        self._playback_source_keys = []  # (synth_version, tension_version) per published source
         self._playback_sr = 44100
         self._playback_hop_size = 512
 
@@ -158,8 +173,66 @@ class HifiShifterGUI(QMainWindow):
         self._apply_engine_selection(config_manager.get_synthesis_engine(), persist=False, quiet=True)
         self.load_default_model()
         
-    def _set_dirty(self, dirty: bool = True):
+    def _set_dirty(self, dirty: bool = True, spans=None):
+        """Mark the project (un)saved; `spans` are the edited curve ranges (see `EditJournal.record_changes`)."""
         self.is_dirty = dirty
+        if dirty:
+            self._journal_edits(spans)
+
+    # ---- Edit journal ----
+    JOURNAL_COMPACT_BYTES = 8 * 1024 * 1024
+
+    def _open_journal(self):
+        """Start journaling edits against the project file at `project_path`."""
+        self._close_journal()
+        if not self.project_path:
+            return
+        try:
+            self._journal = EditJournal(self.project_path, self.tracks)
+        except Exception as e:
+            print(f"Failed to open edit journal: {e}")
+            self._journal = None
+
+    def _close_journal(self, discard: bool = False):
+        journal = self._journal
+        self._journal = None
+        if journal is None:
+            return
+        try:
+            if discard:
+                journal.discard()
+            else:
+                journal.close()
+        except Exception:
+            pass
+
+    def _journal_edits(self, spans=None):
+        """Append the edited ranges (`spans`, or a diff of every curve if None) to the journal."""
+        journal = self._journal
+        if journal is None:
+            return
+        try:
+            if not journal.record_changes(self.tracks, spans):
+                # Tracks were added/removed/converted: the journal can't express
+                # that. Keep it as is (still valid for the file on disk) until
+                # the next explicit save starts a new one.
+                self._close_journal()
+        except Exception as e:
+            print(f"Edit journal write failed: {e}")
+            self._close_journal()
+
+    def _on_journal_timer(self):
+        journal = self._journal
+        if journal is None:
+            return
+        try:
+            journal.flush()
+        except Exception:
+            pass
+        # Compaction: fold a large journal into the project file
+        if journal.size > self.JOURNAL_COMPACT_BYTES and not self.is_drawing and not self._is_bg_busy():
+            if not self._save_project_file(self.project_path):
+                self._close_journal()  # don't retry (and re-report the error) every tick
 
     @property
     def current_track(self):
@@ -191,6 +264,10 @@ class HifiShifterGUI(QMainWindow):
         save_as_action.setShortcut(QKeySequence.StandardKey.SaveAs)
         save_as_action.triggered.connect(self.save_project_as)
         file_menu.addAction(save_as_action)
+
+        save_bundle_action = QAction(i18n.get("menu.file.save_bundle"), self)
+        save_bundle_action.triggered.connect(self.save_project_bundle)
+        file_menu.addAction(save_bundle_action)
         
         file_menu.addSeparator()
 
@@ -523,6 +600,8 @@ class HifiShifterGUI(QMainWindow):
         self.plot_widget.scene().addItem(self.waveform_view)
         
         self.plot_widget.plotItem.vb.sigResized.connect(self.update_views)
+        # Curves carry only the visible span, so refresh them whenever the X range changes
+        self.plot_widget.plotItem.vb.sigXRangeChanged.connect(self._on_plot_x_range_changed)
 
         # Custom Mouse Interaction
         self.plot_widget.scene().sigMouseMoved.connect(self.on_scene_mouse_move)
@@ -820,14 +899,15 @@ class HifiShifterGUI(QMainWindow):
                 self.status_label.setText(i18n.get("status.no_undo"))
                 return
 
+            before = track.tension_edited
             track.tension_redo_stack.append(track.tension_edited.copy())
             track.tension_edited = track.tension_undo_stack.pop()
-            track.tension_version += 1
-            track._tension_processed_audio = None
-            track._tension_processed_key = None
+            self._mark_tension_changed(track, before)
 
             self.update_plot()
             self.status_label.setText(i18n.get("status.undo"))
+            self._set_dirty(True, [(track, 'tension', None, None)])
+            self._apply_edits_to_playback()
             return
 
         # Pitch undo
@@ -845,6 +925,8 @@ class HifiShifterGUI(QMainWindow):
 
         self.update_plot()
         self.status_label.setText(i18n.get("status.undo"))
+        self._set_dirty(True, [(track, 'f0', None, None)])
+        self._apply_edits_to_playback()
 
 
     def redo(self):
@@ -859,14 +941,15 @@ class HifiShifterGUI(QMainWindow):
                 self.status_label.setText(i18n.get("status.no_redo"))
                 return
 
+            before = track.tension_edited
             track.tension_undo_stack.append(track.tension_edited.copy())
             track.tension_edited = track.tension_redo_stack.pop()
-            track.tension_version += 1
-            track._tension_processed_audio = None
-            track._tension_processed_key = None
+            self._mark_tension_changed(track, before)
 
             self.update_plot()
             self.status_label.setText(i18n.get("status.redo"))
+            self._set_dirty(True, [(track, 'tension', None, None)])
+            self._apply_edits_to_playback()
             return
 
         # Pitch redo
@@ -884,6 +967,8 @@ class HifiShifterGUI(QMainWindow):
 
         self.update_plot()
         self.status_label.setText(i18n.get("status.redo"))
+        self._set_dirty(True, [(track, 'f0', None, None)])
+        self._apply_edits_to_playback()
 
 
     def toggle_playback(self):
@@ -997,14 +1082,7 @@ class HifiShifterGUI(QMainWindow):
         return True
 
     def _count_dirty_segments(self) -> int:
-        total = 0
-        for track in self.tracks:
-            if getattr(track, 'track_type', None) != 'vocal':
-                continue
-            for state in getattr(track, 'segment_states', []) or []:
-                if state.get('dirty'):
-                    total += 1
-        return total
+        return project_io.count_dirty_segments(self.tracks)
 
     def _has_dirty_segments(self) -> bool:
         return self._count_dirty_segments() > 0
@@ -1025,28 +1103,15 @@ class HifiShifterGUI(QMainWindow):
             self._pending_synthesis = True
             return
 
-        # Stop playback while mutating track audio buffers
-        try:
-            if self.is_playing:
-                self.stop_playback(reset=False)
-        except Exception:
-            pass
+        # Playback keeps running: Track.update_full_audio publishes a new
+        # buffer instead of writing in place, and the new buffers are
+        # swapped into the mixer on the UI thread once synthesis is done.
 
         def _work(progress):
-            hop_size = self.processor.config['hop_size'] if self.processor.config else 512
-            processed = 0
-            for track in self.tracks:
-                if track.track_type != 'vocal':
-                    continue
-                for i, state in enumerate(track.segment_states):
-                    if state.get('dirty'):
-                        track.synthesize_segment(self.processor, i)
-                        processed += 1
-                        progress(processed, total_segments)
-                track.update_full_audio(hop_size)
-            return processed
+            return project_io.synthesize_tracks(self.tracks, self.processor, progress)
 
         def _ok(_processed_count):
+            self._refresh_playback_sources()
             self.status_label.setText(i18n.get("status.synthesis_complete"))
 
             if self._pending_synthesis:
@@ -1105,59 +1170,68 @@ class HifiShifterGUI(QMainWindow):
             self.playback_timer.stop()
             self.status_label.setText(i18n.get("status.stopped"))
 
-    def _prepare_stream_playback_async(self):
-        """Prepare per-track float32 buffers for callback mixing in a background thread."""
-        if self._is_bg_busy():
-            return
+    def _playback_source_for(self, track: Track):
+        """Mixer source for a track: its buffer, or a block-wise tension processor over it.
 
-        def _work(_progress):
-            sr = int(self.processor.config['audio_sample_rate']) if self.processor.config else 44100
-            hop_size = int(self.processor.config['hop_size']) if self.processor.config else 512
-
-            items = []
-            max_len = 0
-
-            for track in self.tracks:
-                audio = self._get_track_audio_for_mix(track)
-                if audio is None:
-                    continue
-                if len(audio) <= 0:
-                    continue
-                if audio.dtype != np.float32:
-                    audio = audio.astype(np.float32)
-                audio = np.ascontiguousarray(audio)
-
-                start_sample = int(track.start_frame) * hop_size
-                end_sample = start_sample + int(len(audio))
-                if end_sample > max_len:
-                    max_len = end_sample
-
-                items.append((track, audio, start_sample))
-
-            if max_len <= 0 or not items:
-                return None
+        Cheap to build (no audio is processed here), so playback can start
+        immediately regardless of track length.
+        """
+        if track is None or track.synthesized_audio is None or len(track.synthesized_audio) <= 0:
+            return None
 
-            return {
-                'sr': sr,
-                'hop_size': hop_size,
-                'total_samples': int(max_len),
-                'items': items,
-            }
+        audio = track.synthesized_audio
+        if track.track_type != 'vocal':
+            return audio
 
-        def _ok(prep):
-            self._start_stream_playback(prep)
+        tension = getattr(track, 'tension_edited', None)
+        f0 = getattr(track, 'f0_edited', None)
+        if tension is None or f0 is None:
+            return audio
 
-        def _fail(_err_text: str):
-            self.status_label.setText(i18n.get("status.load_failed"))
+        # Skip if neutral
+        try:
+            if np.nanmax(np.abs(tension)) < 1e-6:
+                return audio
+        except Exception:
+            return audio
 
-        self._start_bg_task(
-            kind='prepare_playback',
-            status_text=i18n.get("status.mixing"),
-            fn=_work,
-            total=None,
-            on_success=_ok,
-            on_failed=_fail,
-        )
+        sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
+        hop_size = self.processor.config['hop_size'] if self.processor.config else 512
+        return TensionTiltStream(audio, sr, f0, tension, hop_size)
+
+    @staticmethod
+    def _playback_source_key(track: Track):
+        return (getattr(track, 'synth_version', 0), getattr(track, 'tension_version', 0), id(track.synthesized_audio))
+
+    def _prepare_stream_playback(self):
+        """Collect per-track mixer sources (buffers / streaming FX) for callback mixing."""
+        sr = int(self.processor.config['audio_sample_rate']) if self.processor.config else 44100
+        hop_size = int(self.processor.config['hop_size']) if self.processor.config else 512
+
+        items = []
+        max_len = 0
+
+        for track in self.tracks:
+            source = self._playback_source_for(track)
+            if source is None:
+                continue
+
+            start_sample = int(track.start_frame) * hop_size
+            end_sample = start_sample + int(len(source))
+            if end_sample > max_len:
+                max_len = end_sample
+
+            items.append((track, source, start_sample))
+
+        if max_len <= 0 or not items:
+            return None
+
+        return {
+            'sr': sr,
+            'hop_size': hop_size,
+            'total_samples': int(max_len),
+            'items': items,
+        }
 
     def _start_stream_playback(self, prep):
         if prep is None:
@@ -1195,10 +1269,19 @@ class HifiShifterGUI(QMainWindow):
 
         self._playback_sr = sr
         self._playback_hop_size = hop_size
-        self._playback_total_samples = total_samples
-        self._playback_items = items
-        with self._playback_lock:
-            self._playback_sample_pos = int(start_sample)
+
+        tracks = [t for t, _buf, _start in items]
+        mixer = PlaybackMixer(sr)
+        mixer.set_sources(
+            [buf for _t, buf, _start in items],
+            [start for _t, _buf, start in items],
+            gains=track_gains(tracks),
+            total=total_samples,
+        )
+        mixer.seek(start_sample)
+        self._playback_tracks = tracks
+        self._playback_source_keys = [self._playback_source_key(t) for t in tracks]
+        self._playback_mixer = mixer
 
         def _finished_callback():
             # sounddevice thread -> marshal to UI thread
@@ -1207,74 +1290,12 @@ class HifiShifterGUI(QMainWindow):
             except Exception:
                 pass
 
-        def _callback(outdata, frames, _time_info, _status):
-            outdata.fill(0)
-
-            with self._playback_lock:
-                pos = int(self._playback_sample_pos)
-                total = int(self._playback_total_samples)
-
-            if total <= 0 or pos >= total:
-                raise sd.CallbackStop()
-
-            n_avail = total - pos
-            n = frames if frames <= n_avail else n_avail
-            if n <= 0:
-                raise sd.CallbackStop()
-
-            items_local = self._playback_items
-
-            # If any track is solo, only solo tracks are audible.
-            solo_any = False
-            for t, _buf, _start in items_local:
-                if getattr(t, 'solo', False):
-                    solo_any = True
-                    break
-
-            mix = np.zeros(n, dtype=np.float32)
-
-            for t, buf, start in items_local:
-                if getattr(t, 'muted', False):
-                    continue
-                if solo_any and (not getattr(t, 'solo', False)):
-                    continue
-
-                vol = float(getattr(t, 'volume', 1.0))
-                if vol == 0.0:
-                    continue
-
-                src0 = pos - int(start)
-
-                # No overlap with this output block
-                if src0 >= len(buf) or src0 + n <= 0:
-                    continue
-
-                out0 = 0
-                if src0 < 0:
-                    out0 = -src0
-                    src0 = 0
-
-                take = min(n - out0, len(buf) - src0)
-                if take <= 0:
-                    continue
-
-                mix[out0:out0 + take] += buf[src0:src0 + take] * vol
-
-            np.clip(mix, -1.0, 1.0, out=mix)
-            outdata[:n, 0] = mix
-
-            with self._playback_lock:
-                self._playback_sample_pos += int(n)
-
-            if n < frames:
-                raise sd.CallbackStop()
-
         try:
             self._playback_stream = sd.OutputStream(
                 samplerate=sr,
                 channels=1,
                 dtype='float32',
-                callback=_callback,
+                callback=mixer.callback,
                 finished_callback=_finished_callback,
             )
             self._playback_stream.start()
@@ -1287,6 +1308,56 @@ class HifiShifterGUI(QMainWindow):
         self.playback_timer.start()
         self.status_label.setText(i18n.get("status.playing"))
 
+    def _playback_position_samples(self) -> int | None:
+        mixer = getattr(self, '_playback_mixer', None)
+        if mixer is None:
+            return None
+        return int(mixer.position)
+
+    def _refresh_playback_sources(self):
+        """Swap sources of playing tracks whose audio or tension changed into the mixer.
+
+        Sources are rebuilt on the UI thread (cheap) and published in one
+        snapshot; the audio callback picks them up on its next block.
+        """
+        mixer = getattr(self, '_playback_mixer', None)
+        if mixer is None or not self.is_playing:
+            return
+        by_index = {}
+        for i, track in enumerate(self._playback_tracks):
+            key = self._playback_source_key(track)
+            if i < len(self._playback_source_keys) and self._playback_source_keys[i] == key:
+                continue
+            source = self._playback_source_for(track)
+            if source is None:
+                continue
+            by_index[i] = source
+            self._playback_source_keys[i] = key
+        if by_index:
+            mixer.replace_buffers(by_index)
+
+    def _apply_edits_to_playback(self):
+        """Make edits audible while the stream keeps playing.
+
+        Tension is applied block-wise in the mixer, so it only needs new
+        sources; pitch edits are resynthesized in the background first.
+        """
+        if not self.is_playing:
+            return
+        self._refresh_playback_sources()
+        if self._has_dirty_segments():
+            self.synthesize_audio_async()
+
+    def _sync_playback_mix_state(self):
+        """Publish current volume/mute/solo/position of the playing tracks to the mixer."""
+        mixer = getattr(self, '_playback_mixer', None)
+        if mixer is None:
+            return
+        tracks = self._playback_tracks
+        hop_size = int(self._playback_hop_size)
+        mixer.set_starts([int(t.start_frame) * hop_size for t in tracks])
+        mixer.set_gains(track_gains(tracks))
+
     def start_playback(self):
         # Ensure synthesis happens off the UI thread; playback itself is stream/callback mixed.
         if not self.tracks:
@@ -1300,7 +1371,7 @@ class HifiShifterGUI(QMainWindow):
             self.synthesize_audio_async(after=self.start_playback)
             return
 
-        self._prepare_stream_playback_async()
+        self._start_stream_playback(self._prepare_stream_playback())
 
     def pause_playback(self):
         if not self.is_playing:
@@ -1308,8 +1379,9 @@ class HifiShifterGUI(QMainWindow):
 
         try:
             sr = int(self._playback_sr) if getattr(self, '_playback_sr', None) else 44100
-            with self._playback_lock:
-                self.current_playback_time = float(self._playback_sample_pos) / float(sr)
+            pos = self._playback_position_samples()
+            if pos is not None:
+                self.current_playback_time = float(pos) / float(sr)
         except Exception:
             pass
 
@@ -1328,10 +1400,11 @@ class HifiShifterGUI(QMainWindow):
         self.status_label.setText(i18n.get("status.paused"))
 
     def stop_playback(self, reset=False):
+        sr = int(self._playback_sr) if getattr(self, '_playback_sr', None) else 44100
         try:
-            sr = int(self._playback_sr) if getattr(self, '_playback_sr', None) else 44100
-            with self._playback_lock:
-                self.current_playback_time = float(self._playback_sample_pos) / float(sr)
+            pos = self._playback_position_samples()
+            if pos is not None:
+                self.current_playback_time = float(pos) / float(sr)
         except Exception:
             pass
 
@@ -1350,21 +1423,15 @@ class HifiShifterGUI(QMainWindow):
 
         if reset:
             self.current_playback_time = 0
-            try:
-                with self._playback_lock:
-                    self._playback_sample_pos = 0
-            except Exception:
-                pass
+            if self._playback_mixer is not None:
+                self._playback_mixer.seek(0)
             self.play_cursor.setValue(0)
             self.playback_start_time = 0
         else:
             # Return to start position
             self.current_playback_time = self.playback_start_time
-            try:
-                with self._playback_lock:
-                    self._playback_sample_pos = int(self.current_playback_time * sr)
-            except Exception:
-                pass
+            if self._playback_mixer is not None:
+                self._playback_mixer.seek(int(self.current_playback_time * sr))
 
             if self.processor.config:
                 hop_size = self.processor.config['hop_size']
@@ -1401,8 +1468,10 @@ class HifiShifterGUI(QMainWindow):
         if getattr(self, '_playback_stream', None) is not None:
             try:
                 sr = int(self._playback_sr) if getattr(self, '_playback_sr', None) else 44100
-                with self._playback_lock:
-                    self.current_playback_time = float(self._playback_sample_pos) / float(sr)
+                pos = self._playback_position_samples()
+                if pos is not None:
+                    self.current_playback_time = float(pos) / float(sr)
+                self._update_dsp_load_tooltip()
             except Exception:
                 pass
         else:
@@ -1421,11 +1490,21 @@ class HifiShifterGUI(QMainWindow):
             self.timeline_panel.set_cursor_position(x)
 
 
+    def _update_dsp_load_tooltip(self):
+        mixer = getattr(self, '_playback_mixer', None)
+        if mixer is None:
+            return
+        st = mixer.stats()
+        self.status_label.setToolTip(i18n.get("status.dsp_load").format(
+            st['avg_load'] * 100.0, st['avg_cpu_ms'], st['max_cpu_ms'], st['underruns']
+        ))
+
     def update_views(self):
         self.waveform_view.setGeometry(self.plot_widget.plotItem.vb.sceneBoundingRect())
         self.waveform_view.linkedViewChanged(self.plot_widget.plotItem.vb, self.waveform_view.XAxis)
         # Sync timeline view X range if needed (already linked via setXLink)
-        pass
+        # Viewport width changed: LOD resolution depends on it
+        self._refresh_lod_curves()
 
     def load_model_dialog(self):
         folder = QFileDialog.getExistingDirectory(self, i18n.get("dialog.select_model_dir"))
@@ -1571,7 +1650,9 @@ class HifiShifterGUI(QMainWindow):
 
         This covers volume/mute/solo/position changes which are saved into the project file.
         """
-        self._set_dirty(True)
+        self._set_dirty(True, [])
+        # Applied by the audio callback on its next block
+        self._sync_playback_mix_state()
 
 
 
@@ -1635,81 +1716,24 @@ class HifiShifterGUI(QMainWindow):
         )
 
 
-    def _get_track_audio_for_mix(self, track: Track):
-        """Return audio buffer for mixing/export, applying tension post-FX for vocal tracks."""
-        if track is None or track.synthesized_audio is None:
-            return None
-
-        audio = track.synthesized_audio
-
-        if track.track_type != 'vocal':
-            return audio
-
-        tension = getattr(track, 'tension_edited', None)
-        f0 = getattr(track, 'f0_edited', None)
-        if tension is None or f0 is None:
-            return audio
-
-        # Skip if neutral
-        try:
-            if np.nanmax(np.abs(tension)) < 1e-6:
-                return audio
-        except Exception:
-            return audio
-
-        sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
-        hop_size = self.processor.config['hop_size'] if self.processor.config else 512
-
-        key = (getattr(track, 'synth_version', 0), getattr(track, 'tension_version', 0), int(len(audio)))
-        if getattr(track, '_tension_processed_key', None) == key and getattr(track, '_tension_processed_audio', None) is not None:
-            return track._tension_processed_audio
-
-        try:
-            processed = apply_tension_tilt_pd(audio, sr, f0, tension, hop_size)
-        except Exception as e:
-            # Fail-safe: don't break playback/export
-            print(f"Tension post-FX failed: {e}")
-            processed = audio
-
-        track._tension_processed_audio = processed
-        track._tension_processed_key = key
-        return processed
-
-    def mix_tracks(self):
-        max_len = 0
-        active_tracks = [t for t in self.tracks if not t.muted]
-        solo_tracks = [t for t in self.tracks if t.solo]
-        if solo_tracks:
-            active_tracks = solo_tracks
-
-        if not active_tracks:
-            return None
-
-        hop_size = self.processor.config['hop_size'] if self.processor.config else 512
-
-        for track in active_tracks:
-            audio = self._get_track_audio_for_mix(track)
-            if audio is not None:
-                start_sample = track.start_frame * hop_size
-                end_sample = start_sample + len(audio)
-                max_len = max(max_len, end_sample)
-
-        if max_len == 0:
-            return None
-
-        mixed_audio = np.zeros(max_len, dtype=np.float32)
-
-        for track in active_tracks:
-            audio = self._get_track_audio_for_mix(track)
-            if audio is None:
-                continue
-
-            start_sample = track.start_frame * hop_size
-            l = len(audio)
-            mixed_audio[start_sample:start_sample + l] += audio * track.volume
-
-        return mixed_audio
+    def _mark_tension_changed(self, track: Track, before):
+        """Mark the frames where tension differs from `before` as dirty (undo/redo)."""
+        after = track.tension_edited
+        if before is None or after is None or len(before) != len(after):
+            track.mark_tension_dirty()
+            return
+        changed = np.flatnonzero(before != after)
+        if len(changed) > 0:
+            track.mark_tension_dirty(changed[0], changed[-1] + 1)
+        else:
+            track.tension_version += 1
 
+    def _export_file_filters(self):
+        """Save-dialog filters, one per export format (in EXPORT_FORMATS order)."""
+        filters = []
+        for suffix, desc in EXPORT_FORMATS.values():
+            filters.append(f"{desc} (*{suffix})")
+        return filters
 
     def export_audio_dialog(self):
         # Ensure everything is synthesized (async) before exporting
@@ -1732,67 +1756,52 @@ class HifiShifterGUI(QMainWindow):
             return
 
         if clicked_button == btn_mixed:
-            file_path, _ = QFileDialog.getSaveFileName(self, i18n.get("dialog.export_mixed"), "output.wav", "WAV Audio (*.wav)")
+            filters = self._export_file_filters()
+            file_path, selected = QFileDialog.getSaveFileName(self, i18n.get("dialog.export_mixed"), "output.wav", ";;".join(filters))
             if file_path:
-                self.export_audio(file_path)
+                fmt = DEFAULT_EXPORT_FORMAT
+                if selected in filters:
+                    fmt = list(EXPORT_FORMATS)[filters.index(selected)]
+                self.export_audio(with_format_suffix(file_path, fmt), fmt)
 
         elif clicked_button == btn_separated:
             dir_path = QFileDialog.getExistingDirectory(self, i18n.get("dialog.select_export_dir"))
             if dir_path:
-                self.export_separated_tracks(dir_path)
-
-    def export_separated_tracks(self, dir_path):
-        """Export all active vocal tracks to separate WAV files (background thread)."""
+                formats = self._ask_export_formats()
+                if formats:
+                    self.export_separated_tracks(dir_path, formats)
+
+    def _ask_export_formats(self):
+        """Let the user tick one or more stem formats; returns [] if cancelled."""
+        dlg = QDialog(self)
+        dlg.setWindowTitle(i18n.get("dialog.export_formats"))
+        layout = QVBoxLayout(dlg)
+        layout.addWidget(QLabel(i18n.get("msg.select_export_formats")))
+        boxes = {}
+        for fmt, (_suffix, desc) in EXPORT_FORMATS.items():
+            cb = QCheckBox(desc, dlg)
+            cb.setChecked(fmt == DEFAULT_EXPORT_FORMAT)
+            layout.addWidget(cb)
+            boxes[fmt] = cb
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel, parent=dlg)
+        buttons.accepted.connect(dlg.accept)
+        buttons.rejected.connect(dlg.reject)
+        layout.addWidget(buttons)
+        if dlg.exec() != QDialog.DialogCode.Accepted:
+            return []
+        return [fmt for fmt, cb in boxes.items() if cb.isChecked()]
+
+    def export_separated_tracks(self, dir_path, formats=(DEFAULT_EXPORT_FORMAT,)):
+        """Export all active vocal tracks to separate files, several tracks at a time (background thread)."""
         if self._is_bg_busy():
             return
 
-        # Estimate total export count for progress
-        total = 0
-        for track in self.tracks:
-            if track.track_type == 'vocal' and not track.muted and track.synthesized_audio is not None:
-                total += 1
+        sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
+        hop_size = self.processor.config['hop_size'] if self.processor.config else 512
+        stems = project_io.stem_sources(self.tracks, sr, hop_size)
 
         def _work(progress):
-            count = 0
-            sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
-            hop_size = self.processor.config['hop_size'] if self.processor.config else 512
-
-            for i, track in enumerate(self.tracks):
-                if track.muted or track.track_type == 'bgm':
-                    continue
-                if track.synthesized_audio is None:
-                    continue
-
-                safe_name = "".join([c for c in track.name if c.isalnum() or c in (' ', '-', '_')]).strip()
-                if not safe_name:
-                    safe_name = f"track_{i+1}"
-
-                file_path = os.path.join(dir_path, f"{safe_name}.wav")
-
-                audio = self._get_track_audio_for_mix(track)
-                if audio is None:
-                    continue
-                if audio.dtype != np.float32:
-                    audio = audio.astype(np.float32)
-
-                start_sample = track.start_frame * hop_size
-                if start_sample > 0:
-                    pad = np.zeros(start_sample, dtype=np.float32)
-                    audio_to_save = np.concatenate((pad, audio))
-                elif start_sample < 0:
-                    start_idx = -start_sample
-                    if start_idx < len(audio):
-                        audio_to_save = audio[start_idx:]
-                    else:
-                        audio_to_save = np.array([], dtype=np.float32)
-                else:
-                    audio_to_save = audio
-
-                wavfile.write(file_path, sr, audio_to_save)
-                count += 1
-                progress(count, total)
-
-            return count
+            return export_stems(stems, dir_path, sr, formats, progress=progress)
 
         def _ok(count: int):
             QMessageBox.information(self, i18n.get("msg.success"), i18n.get("msg.export_separated_success").format(count, dir_path))
@@ -1804,27 +1813,25 @@ class HifiShifterGUI(QMainWindow):
             kind='export_separated',
             status_text=i18n.get("status.exporting") + f" {dir_path}...",
             fn=_work,
-            total=total if total > 0 else None,
+            total=len(stems) if stems else None,
             on_success=_ok,
             on_failed=_fail,
         )
 
-    def export_audio(self, file_path):
-        """Export mixed audio to a single WAV file (background thread)."""
+    def export_audio(self, file_path, fmt=DEFAULT_EXPORT_FORMAT):
+        """Export the mix to a single file, mixed and written block by block (background thread)."""
         if self._is_bg_busy():
             return
 
-        def _work(_progress):
-            mixed_audio = self.mix_tracks()
-            if mixed_audio is None:
+        def _work(progress):
+            sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
+            hop_size = self.processor.config['hop_size'] if self.processor.config else 512
+            buffers, starts, gains = project_io.mix_sources(self.tracks, sr, hop_size)
+            if not buffers:
                 return None
 
-            if mixed_audio.dtype != np.float32:
-                mixed_audio = mixed_audio.astype(np.float32)
-
-            sr = self.processor.config['audio_sample_rate'] if self.processor.config else 44100
-            wavfile.write(file_path, sr, mixed_audio)
-            return file_path
+            written = export_mix(buffers, starts, gains, file_path, sr, fmt, progress=progress)
+            return file_path if written > 0 else None
 
         def _ok(result_path):
             if result_path is None:
@@ -1861,6 +1868,7 @@ class HifiShifterGUI(QMainWindow):
             self.stop_playback(reset=True)
         except Exception:
             pass
+        self._close_journal()
 
         self.tracks = []
         self.current_track_idx = -1
@@ -1871,117 +1879,8 @@ class HifiShifterGUI(QMainWindow):
         self.clear_selection(hide_box=True)
         self.update_plot()
 
-        project_dir = os.path.dirname(os.path.abspath(file_path))
-
         def _work(progress):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Resolve & load model (heavy)
-            loaded_model_path = None
-            model_path = data.get('model_path')
-            if model_path:
-                if not os.path.exists(model_path):
-                    rel_path = os.path.join(project_dir, model_path)
-                    if os.path.exists(rel_path):
-                        model_path = rel_path
-
-                if os.path.exists(model_path):
-                    # Direct call to avoid spawning nested background tasks
-                    self.processor.load_model(model_path)
-                    loaded_model_path = model_path
-
-            params = data.get('params', {}) if isinstance(data, dict) else {}
-            engine_name = data.get('synthesis_engine', params.get('synthesis_engine', 'hifigan'))
-
-            tracks: list[Track] = []
-            missing_audio: list[str] = []
-
-            if 'tracks' in data:
-                t_list = data.get('tracks') or []
-                total = len(t_list)
-                for idx, t_data in enumerate(t_list):
-                    file_p = t_data.get('file_path')
-                    if not file_p:
-                        continue
-
-                    if not os.path.exists(file_p):
-                        rel_p = os.path.join(project_dir, file_p)
-                        if os.path.exists(rel_p):
-                            file_p = rel_p
-
-                    if not os.path.exists(file_p):
-                        missing_audio.append(str(file_p))
-                        progress(idx + 1, total)
-                        continue
-
-                    track = Track(t_data.get('name', os.path.basename(file_p)), file_p, t_data.get('type', 'vocal'))
-                    track.load(self.processor)
-
-                    track.shift_value = t_data.get('shift', 0.0)
-                    track.muted = t_data.get('muted', False)
-                    track.solo = t_data.get('solo', False)
-                    track.volume = t_data.get('volume', 1.0)
-                    track.start_frame = t_data.get('start_frame', 0)
-
-                    if 'f0' in t_data and track.f0_edited is not None:
-                        saved_f0 = np.array(t_data['f0'])
-                        min_len = min(len(saved_f0), len(track.f0_edited))
-                        track.f0_edited[:min_len] = saved_f0[:min_len]
-                        for state in track.segment_states:
-                            state['dirty'] = True
-
-                    if 'tension' in t_data and getattr(track, 'tension_edited', None) is not None:
-                        saved_tension = np.array(t_data['tension'], dtype=np.float32)
-                        min_len = min(len(saved_tension), len(track.tension_edited))
-                        track.tension_edited[:min_len] = saved_tension[:min_len]
-                        track.tension_version += 1
-                        track._tension_processed_audio = None
-                        track._tension_processed_key = None
-
-                    tracks.append(track)
-                    progress(idx + 1, total)
-
-            # Backward compatibility for v1.0
-            elif 'audio_path' in data:
-                audio_path = data['audio_path']
-                if not os.path.exists(audio_path):
-                    rel_p = os.path.join(project_dir, audio_path)
-                    if os.path.exists(rel_p):
-                        audio_path = rel_p
-
-                if os.path.exists(audio_path):
-                    track = Track(os.path.basename(audio_path), audio_path, 'vocal')
-                    track.load(self.processor)
-
-                    if 'f0' in data and track.f0_edited is not None:
-                        saved_f0 = np.array(data['f0'])
-                        min_len = min(len(saved_f0), len(track.f0_edited))
-                        track.f0_edited[:min_len] = saved_f0[:min_len]
-                        for state in track.segment_states:
-                            state['dirty'] = True
-
-                    if 'tension' in data and getattr(track, 'tension_edited', None) is not None:
-                        saved_tension = np.array(data['tension'], dtype=np.float32)
-                        min_len = min(len(saved_tension), len(track.tension_edited))
-                        track.tension_edited[:min_len] = saved_tension[:min_len]
-                        track.tension_version += 1
-                        track._tension_processed_audio = None
-                        track._tension_processed_key = None
-
-                    if 'params' in data and 'shift' in data['params']:
-                        track.shift_value = data['params']['shift']
-
-                    tracks.append(track)
-
-            return {
-                'data': data,
-                'loaded_model_path': loaded_model_path,
-                'params': params,
-                'engine': engine_name,
-                'tracks': tracks,
-                'missing_audio': missing_audio,
-            }
+            return project_io.load_project(file_path, self.processor, progress)
 
         def _ok(result: dict):
             loaded_model_path = result.get('loaded_model_path')
@@ -2019,8 +1918,15 @@ class HifiShifterGUI(QMainWindow):
                 self.on_track_selected(0)
 
             self.project_path = file_path
+            self.save_as_bundle = project_io.is_bundle(result.get('data', {}) or {})
             self._set_dirty(False)
             self.status_label.setText(i18n.get("status.project_loaded") + f": {file_path}")
+            self._open_journal()
+            recovered = int(result.get('journal_records', 0) or 0)
+            if recovered > 0:
+                # Replayed edits are not in the project file yet (but already in the journal)
+                self._set_dirty(True, [])
+                self.status_label.setText(i18n.get("status.journal_recovered").format(recovered))
 
 
 
@@ -2054,62 +1960,41 @@ class HifiShifterGUI(QMainWindow):
         file_path, _ = QFileDialog.getSaveFileName(self, i18n.get("menu.file.save_as"), "project.hsp", "HifiShifter Project (*.hsp *.json)")
         if not file_path:
             return False
+        if file_path.lower().endswith('.json'):
+            self.save_as_bundle = False  # bundles need the binary container
+        return self._save_project_file(file_path)
+
+    def save_project_bundle(self) -> bool:
+        """Save as .hsp with each track's decoded audio, features and render embedded."""
+        file_path, _ = QFileDialog.getSaveFileName(self, i18n.get("menu.file.save_bundle"), "project.hsp", "HifiShifter Project (*.hsp)")
+        if not file_path:
+            return False
+        self.save_as_bundle = True
         return self._save_project_file(file_path)
 
     def _save_project_file(self, file_path) -> bool:
         try:
             project_dir = os.path.dirname(os.path.abspath(file_path))
-
-            
-            tracks_data = []
-            for track in self.tracks:
-                # Try to make path relative
-                try:
-                    rel_path = os.path.relpath(track.file_path, project_dir)
-                except ValueError:
-                    rel_path = track.file_path # Different drive or cannot be relative
-
-                t_data = {
-                    'name': track.name,
-                    'file_path': rel_path,
-                    'type': track.track_type,
-                    'shift': track.shift_value,
-                    'muted': track.muted,
-                    'solo': track.solo,
-                    'volume': track.volume,
-                    'start_frame': track.start_frame
-                }
-                if track.track_type == 'vocal' and track.f0_edited is not None:
-                    t_data['f0'] = track.f0_edited.tolist()
-                if track.track_type == 'vocal' and getattr(track, 'tension_edited', None) is not None:
-                    t_data['tension'] = track.tension_edited.tolist()
-                tracks_data.append(t_data)
-
-
-            # Model path relative
-            model_path_save = self.model_path
-            if self.model_path:
-                try:
-                    model_path_save = os.path.relpath(self.model_path, project_dir)
-                except ValueError:
-                    model_path_save = self.model_path
-
-            data = {
-                'version': '2.2',
-                'model_path': model_path_save,
-                'synthesis_engine': getattr(self.processor, 'synthesis_engine', 'hifigan'),
-                'params': {
+            data = project_io.project_to_dict(
+                self.tracks,
+                project_dir,
+                model_path=self.model_path,
+                engine=getattr(self.processor, 'synthesis_engine', 'hifigan'),
+                params={
                     'bpm': self.bpm_spin.value(),
                     'beats': self.beats_spin.value()
                 },
-                'tracks': tracks_data
-            }
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
-            
+                bundle=self.save_as_bundle,
+                model_hash=getattr(self.processor, 'model_hash', None),
+            )
+            project_io.write_project_file(file_path, data)
+
+            # "Save as": edits now live in the new file, the old one stays as it was
+            if self._journal is not None and self._journal.project_path != str(file_path):
+                self._close_journal(discard=True)
             self.project_path = file_path
             self._set_dirty(False)
+            self._open_journal()  # the saved file now contains every journaled edit
             self.status_label.setText(i18n.get("status.project_saved") + f": {file_path}")
             return True
 
@@ -2146,11 +2031,14 @@ class HifiShifterGUI(QMainWindow):
             else:
                 # btn_discard
                 accept_close = True
+                self._close_journal(discard=True)
 
         if not accept_close:
             event.ignore()
             return
 
+        self._close_journal()
+
         # Stop playback/streams on exit
         try:
             if getattr(self, 'is_playing', False):
@@ -2359,16 +2247,6 @@ class HifiShifterGUI(QMainWindow):
 
         # Waveform
         if track.audio is not None:
-            hop_size = self.processor.config['hop_size'] if self.processor.config else 512
-            ds_factor = max(1, int(hop_size / 4))
-            audio_ds = track.audio[::ds_factor]
-            # Add start_frame offset to x
-            x_ds = (np.arange(len(audio_ds)) * ds_factor / hop_size) + track.start_frame
-            
-            # Use waveform_view (Y range -1 to 1)
-            # Scale to fit nicely in background
-            self.waveform_curve.setData(x_ds, audio_ds * 0.8) 
-            
             current_theme = theme.get_current_theme()
             pen_color = current_theme['graph'].get('waveform_pen', (255, 255, 255, 100))
             brush_color = current_theme['graph'].get('waveform_brush', (255, 255, 255, 30))
@@ -2376,13 +2254,8 @@ class HifiShifterGUI(QMainWindow):
             self.waveform_curve.setPen(pg.mkPen(color=pen_color, width=1))
             self.waveform_curve.setBrush(pg.mkBrush(color=brush_color))
             self.waveform_curve.setFillLevel(0)
-        else:
-            self.waveform_curve.clear()
 
         if track.track_type == 'vocal':
-            # Create x axis for F0
-            x_f0 = np.arange(len(track.f0_original)) + track.start_frame if track.f0_original is not None else None
-            
             current_theme = theme.get_current_theme()
             f0_orig_pen = current_theme['graph'].get('f0_orig_pen', (255, 255, 255, 80))
             f0_pen = current_theme['graph'].get('f0_pen', '#00ff00')
@@ -2390,43 +2263,93 @@ class HifiShifterGUI(QMainWindow):
             
             pitch_alpha = 90 if getattr(self, 'edit_param', 'pitch') == 'tension' else 255
 
-            if track.f0_original is not None:
-                self.f0_orig_curve_item.setData(x_f0, track.f0_original, connect="finite")
-                c_orig = pg.mkColor(f0_orig_pen)
-                c_orig.setAlpha(pitch_alpha)
-                self.f0_orig_curve_item.setPen(pg.mkPen(color=c_orig, width=2, style=Qt.PenStyle.DashLine))
-            else:
-                self.f0_orig_curve_item.clear()
+            c_orig = pg.mkColor(f0_orig_pen)
+            c_orig.setAlpha(pitch_alpha)
+            self.f0_orig_curve_item.setPen(pg.mkPen(color=c_orig, width=2, style=Qt.PenStyle.DashLine))
 
+            c = pg.mkColor(f0_pen)
+            c.setAlpha(pitch_alpha)
+            self.f0_curve_item.setPen(pg.mkPen(color=c, width=3))
 
             if track.f0_edited is not None:
-                self.f0_curve_item.setData(x_f0, track.f0_edited, connect="finite")
-                c = pg.mkColor(f0_pen)
-                c.setAlpha(pitch_alpha)
-                self.f0_curve_item.setPen(pg.mkPen(color=c, width=3))
-                
                 # Selection highlight (works for pitch/tension/...) 
                 self.update_selection_highlight()
+            else:
+                self.selected_param_curve_item.clear()
 
+        else:
+            self.selected_param_curve_item.clear()
 
+        # Data: only the visible span at ~pixel resolution (see _refresh_lod_curves)
+        self._refresh_lod_curves()
 
-            else:
-                self.f0_curve_item.clear()
-                self.selected_param_curve_item.clear()
+    def _visible_plot_window(self):
+        """Return (x_min, x_max, width_px) of the piano roll viewport, X in frames."""
+        vb = self.plot_widget.plotItem.vb
+        (x0, x1), _ = vb.viewRange()
+        width_px = max(1, int(vb.width()))
+        return float(x0), float(x1), width_px
 
+    def _on_plot_x_range_changed(self, *args):
+        self._refresh_lod_curves()
 
-            # Tension overlay: only visible while editing tension
-            if getattr(self, 'edit_param', 'pitch') == 'tension' and getattr(track, 'tension_edited', None) is not None:
-                x_t = np.arange(len(track.tension_edited)) + track.start_frame
-                y_t = self.tension_to_plot_y(track.tension_edited)
-                self.tension_curve_item.setData(x_t, y_t, connect="finite")
-            else:
-                self.tension_curve_item.clear()
+    def _refresh_lod_curves(self):
+        """Feed the visible span of the waveform/F0/tension curves to their items.
+
+        Data is min/max decimated to about two points per pixel, so the cost of
+        pan/zoom is bounded by the viewport width instead of the track length.
+        """
+        if not hasattr(self, 'tension_curve_item'):
+            return  # called during UI construction
+        track = self.current_track
+        if not track:
+            return
 
+        x0, x1, width_px = self._visible_plot_window()
+        frames_per_px = max(1e-6, (x1 - x0) / float(width_px))
+        max_points = 2 * width_px
+        start_frame = track.start_frame
+
+        # Waveform
+        peaks = track.get_waveform_peaks() if track.audio is not None else None
+        if peaks is not None:
+            hop_size = self.processor.config['hop_size'] if self.processor.config else 512
+            s0 = int(np.floor((x0 - start_frame) * hop_size)) - hop_size
+            s1 = int(np.ceil((x1 - start_frame) * hop_size)) + hop_size
+            xs, ys = peaks.envelope(s0, s1, frames_per_px * hop_size)
+            # Use waveform_view (Y range -1 to 1)
+            # Scale to fit nicely in background
+            self.waveform_curve.setData(xs / hop_size + start_frame, ys * 0.8)
         else:
+            self.waveform_curve.clear()
+
+        if track.track_type != 'vocal':
             self.f0_orig_curve_item.clear()
             self.f0_curve_item.clear()
-            self.selected_param_curve_item.clear()
+            self.tension_curve_item.clear()
+            return
+
+        # One frame of margin on each side so lines reach the viewport edges
+        i0 = int(np.floor(x0 - start_frame)) - 1
+        i1 = int(np.ceil(x1 - start_frame)) + 2
+
+        if track.f0_original is not None:
+            x, y = decimate_curve(track.f0_original, i0, i1, max_points)
+            self.f0_orig_curve_item.setData(x + start_frame, y, connect="finite")
+        else:
+            self.f0_orig_curve_item.clear()
+
+        if track.f0_edited is not None:
+            x, y = decimate_curve(track.f0_edited, i0, i1, max_points)
+            self.f0_curve_item.setData(x + start_frame, y, connect="finite")
+        else:
+            self.f0_curve_item.clear()
+
+        # Tension overlay: only visible while editing tension
+        if getattr(self, 'edit_param', 'pitch') == 'tension' and getattr(track, 'tension_edited', None) is not None:
+            x, y = decimate_curve(track.tension_edited, i0, i1, max_points)
+            self.tension_curve_item.setData(x + start_frame, self.tension_to_plot_y(y), connect="finite")
+        else:
             self.tension_curve_item.clear()
 
 
@@ -2550,21 +2473,25 @@ class HifiShifterGUI(QMainWindow):
                 if track and self.selection_mask is not None:
                     if getattr(self, 'drag_param', getattr(self, 'edit_param', 'pitch')) == 'pitch':
                         indices = np.where(self.selection_mask)[0]
+                        spans = []
                         if len(indices) > 0:
                             min_x, max_x = indices[0], indices[-1]
                             for i, (seg_start, seg_end) in enumerate(track.segments):
                                 if not (max_x < seg_start or min_x >= seg_end):
                                     track.segment_states[i]['dirty'] = True
+                            spans.append((track, 'f0', min_x, max_x + 1))
 
-                        self._set_dirty(True)
+                        self._set_dirty(True, spans)
                         self.status_label.setText(i18n.get("status.pitch_modified_unsynth"))
 
 
                     else:
-                        track.tension_version += 1
-                        track._tension_processed_audio = None
-                        track._tension_processed_key = None
-                        self._set_dirty(True)
+                        indices = np.where(self.selection_mask)[0]
+                        spans = []
+                        if len(indices) > 0:
+                            track.mark_tension_dirty(indices[0], indices[-1] + 1)
+                            spans.append((track, 'tension', indices[0], indices[-1] + 1))
+                        self._set_dirty(True, spans)
                         self.status_label.setText(i18n.get("status.tension_modified_live"))
 
 
@@ -2575,6 +2502,7 @@ class HifiShifterGUI(QMainWindow):
 
 
         self.last_mouse_pos = None
+        self._apply_edits_to_playback()
 
     def on_viewbox_mouse_move(self, ev):
         """处理来自 ViewBox 的鼠标移动事件 (拖拽/绘制)"""
@@ -2623,9 +2551,8 @@ class HifiShifterGUI(QMainWindow):
 
                     if param == 'tension':
                         if getattr(track, 'tension_edited', None) is not None:
+                            # Dirty range is recorded when the drag is committed (mouse release)
                             track.tension_edited = base
-                            track._tension_processed_audio = None
-                            track._tension_processed_key = None
                     else:
                         if track.f0_edited is not None:
                             track.f0_edited = base
@@ -2798,10 +2725,8 @@ class HifiShifterGUI(QMainWindow):
                 self.update_plot()
 
                 if changed:
-                    track.tension_version += 1
-                    track._tension_processed_audio = None
-                    track._tension_processed_key = None
-                    self._set_dirty(True)
+                    track.mark_tension_dirty(affected_range[0], affected_range[1] + 1)
+                    self._set_dirty(True, [(track, 'tension', affected_range[0], affected_range[1] + 1)])
                     self.status_label.setText(i18n.get("status.tension_modified_live"))
 
 
@@ -2864,7 +2789,7 @@ class HifiShifterGUI(QMainWindow):
             self.update_plot()
 
             if changed:
-                self._set_dirty(True)
+                self._set_dirty(True, [(track, 'f0', affected_range[0], affected_range[1] + 1)])
                 self.status_label.setText(i18n.get("status.pitch_modified_unsynth"))
 
 
@@ -2979,6 +2904,7 @@ class HifiShifterGUI(QMainWindow):
                 state['dirty'] = True
                 
             self.update_plot()
+            self._set_dirty(True, [(track, 'f0', None, None)])
             self.status_label.setText(f"Pasted pitch to track '{track.name}'")
         else:
              self.status_label.setText("Clipboard empty or invalid index")
@@ -2990,10 +2916,6 @@ class HifiShifterGUI(QMainWindow):
         """
         读取并应用 VocalShifter 剪贴板数据
         """
-        import os
-        import struct
-        import tempfile
-        
         track = self.current_track
         if not track or track.track_type != 'vocal':
             QMessageBox.warning(self, i18n.get("msg.warning"), i18n.get("msg.no_vocal_track_selected"))
@@ -3004,8 +2926,7 @@ class HifiShifterGUI(QMainWindow):
             return
         
         # 构建文件路径
-        temp_dir = os.path.join(tempfile.gettempdir(), 'vocalshifter_tmp')
-        file_path = os.path.join(temp_dir, 'vocalshifter_id.clb')
+        file_path = vocalshifter_project.clipboard_path()
         
         if not os.path.exists(file_path):
             QMessageBox.warning(self, i18n.get("msg.warning"), 
@@ -3014,61 +2935,29 @@ class HifiShifterGUI(QMainWindow):
         
         try:
             self.status_label.setText(i18n.get("status.loading_vocalshifter_clipboard_data"))
-            QApplication.processEvents()
-            
-            # 读取二进制文件
-            with open(file_path, 'rb') as f:
-                data = f.read()
             
-            if len(data) == 0:
-                QMessageBox.warning(self, i18n.get("msg.warning"), i18n.get("msg.vocalshifter_file_empty"))
-                return
-            
-            # 检查数据长度
-            if len(data) % 0x80 != 0:
+            # 解析 VocalShifter 数据（每条记录 0x80 字节：起始时间、是否禁用编辑、音分……）
+            try:
+                records = vocalshifter_project.read_clipboard(file_path)
+            except vocalshifter_project.VshpFormatError:
                 QMessageBox.warning(self, i18n.get("msg.warning"), 
                                 i18n.get("msg.vocalshifter_invalid_format"))
                 return
             
-            # 解析 VocalShifter 数据
-            num_samples = len(data) // 0x80
-            vocalshifter_clipboard_data = []
-            
-            for i in range(num_samples):
-                sample_start = i * 0x80
-                sample_data = data[sample_start:sample_start + 0x80]
-                
-                # 读取16个double值（每个8字节）
-                doubles = []
-                for j in range(16):
-                    double_start = j * 8
-                    double_bytes = sample_data[double_start:double_start + 8]
-                    if len(double_bytes) == 8:
-                        value = struct.unpack('<d', double_bytes)[0]  # 小端序
-                        doubles.append(value)
-                
-                if len(doubles) >= 4:  # 至少需要4个值才能获取第1、第2和第3个
-                    start_time = doubles[0]  # 第1个：起始时间（秒）
-                    disable_edit = doubles[1]  # 第2个：是否禁用编辑 (1.0=是, 0.0=否)
-                    pitch_cents = doubles[2]  # 第3个：音分
-                    
-                    # 只存储我们需要的数据
-                    vocalshifter_clipboard_data.append((start_time, disable_edit, pitch_cents))
-            
-            if not vocalshifter_clipboard_data:
-                QMessageBox.warning(self, i18n.get("msg.warning"), i18n.get("msg.no_valid_vocalshifter_clipboard_data"))
+            if len(records) == 0:
+                QMessageBox.warning(self, i18n.get("msg.warning"), i18n.get("msg.vocalshifter_file_empty"))
                 return
             
             # 统计禁用了编辑的采样点数量
-            disabled_count = sum(1 for _, disable_edit, _ in vocalshifter_clipboard_data if disable_edit == 1.0)
+            disabled_count = int(np.count_nonzero(records['disabled'] == 1.0))
             
             # 将VocalShifter数据应用到当前音轨
-            self.apply_vocalshifter_clipboard_to_track(track, vocalshifter_clipboard_data)
+            self.apply_vocalshifter_clipboard_to_track(track, records)
             
             self.status_label.setText(i18n.get("status.vocalshifter_clipboard_data_applied"))
             QMessageBox.information(self, i18n.get("msg.success"), 
                                 i18n.get("msg.vocalshifter_clipboard_data_loaded") + 
-                                f": {len(vocalshifter_clipboard_data)} {i18n.get('label.samples')}\n" +
+                                f": {len(records)} {i18n.get('label.samples')}\n" +
                                 i18n.get("msg.vocalshifter_disabled_samples") + f": {disabled_count}")
             
         except Exception as e:
@@ -3076,53 +2965,17 @@ class HifiShifterGUI(QMainWindow):
                                 i18n.get("msg.load_vocalshifter_failed") + f": {str(e)}")
             self.status_label.setText(i18n.get("status.vocalshifter_clipboard_data_load_failed"))
 
-    def apply_vocalshifter_clipboard_to_track(self, track, vocalshifter_clipboard_data):
+    def apply_vocalshifter_clipboard_to_track(self, track, records):
         """
-        将VocalShifter数据应用到音轨
-        现在vocalshifter_clipboard_data是一个三元组列表：(start_time, disable_edit, pitch_cents)
+        将VocalShifter剪贴板数据（CLIPBOARD_DTYPE 数组）应用到音轨，只标记改动过的段为脏
         """
         # 推入撤销栈
         self.push_undo()
         
-        # 获取音频参数
-        sr = track.sr if track.sr else self.processor.config['audio_sample_rate']
         hop_size = self.processor.config['hop_size']
-        
-        # 按时间排序
-        vocalshifter_clipboard_data.sort(key=lambda x: x[0])
-        
-        # 将VocalShifter数据映射到f0帧
-        for i in range(len(track.f0_edited)):
-            # 计算当前帧对应的时间（秒）
-            frame_time = (i * hop_size) / sr
-            
-            # 找到最接近的VocalShifter采样点
-            closest_sample = None
-            min_time_diff = float('inf')
-            
-            for sample_time, disable_edit, sample_pitch in vocalshifter_clipboard_data:
-                time_diff = abs(frame_time - sample_time)
-                if time_diff < min_time_diff:
-                    min_time_diff = time_diff
-                    closest_sample = (sample_time, disable_edit, sample_pitch)
-            
-            # 如果找到足够接近的采样点，则应用音高
-            if closest_sample and min_time_diff < (hop_size / sr):  # 在半个hop_size范围内
-                _, disable_edit, target_pitch = closest_sample
-                
-                if disable_edit == 1.0:
-                    # 禁用编辑：恢复初始音高
-                    if track.f0_original is not None and i < len(track.f0_original):
-                        track.f0_edited[i] = track.f0_original[i]
-                else:
-                    # 未禁用编辑：应用修正后的音高
-                    # 将音分转换为MIDI音高
-                    midi_pitch = target_pitch / 100.0
-                    track.f0_edited[i] = midi_pitch
-        
-        # 标记所有段为脏，需要重新合成
-        for state in track.segment_states:
-            state['dirty'] = True
+        sr = self.processor.config['audio_sample_rate']
+        vocalshifter_project.apply_clipboard(track, records, hop_size, sr)
+        self._set_dirty(True, [(track, 'f0', None, None)])
         
         # 更新绘图
         self.update_plot()
@@ -3139,483 +2992,117 @@ class HifiShifterGUI(QMainWindow):
             self.load_vocalshifter_project(file_path)
 
     def load_vocalshifter_project(self, file_path):
-        """加载并解析VocalShifter工程文件"""
-        import locale
-        import struct
+        """加载并解析VocalShifter工程文件（后台线程解析与加载音轨）"""
+        if self._is_bg_busy():
+            return
+
         try:
-            self.status_label.setText(i18n.get("status.loading_vocalshifter_project"))
-            QApplication.processEvents()
-            
-            with open(file_path, 'rb') as f:
-                # 1. 检查文件头
-                header = f.read(16)
-                if header[:4] != b'VSPD':
-                    QMessageBox.critical(self, i18n.get("msg.error"), 
-                                    i18n.get("msg.vocalshifter_invalid_header"))
-                    return
-                
-                # 读取文件大小（小端序）
-                file_size = struct.unpack('<I', header[12:16])[0]
-                
-                # 存储工程文件夹路径，用于解析相对路径
-                project_dir = os.path.dirname(os.path.abspath(file_path))
-                
-                # 解析数据块
-                project_info = {}
-                tracks = []
-                audio_blocks = []  # ITMP数据块
-                itmp_audio_blocks = []  # Itmp数据块（包含Ctrp数据）
-                
-                current_offset = 16  # 跳过文件头
-                
-                # 第一轮：收集所有ITMP数据块
-                f.seek(current_offset)
-                while current_offset < file_size:
-                    chunk_header = f.read(8)
-                    
-                    if len(chunk_header) < 8:
-                        break
-                        
-                    chunk_type = chunk_header[:4]
-                    chunk_version = struct.unpack('<I', chunk_header[4:8])[0]
-                    
-                    if chunk_type == b'PRJP':
-                        # PRJP 数据块 - 工程信息
-                        prjp_data = f.read(0x108 - 8)  # 总长度0x108，减去已读的8字节
-                        
-                        # 采样率 (偏移16字节，相对于PRJP数据开始)
-                        sample_rate = struct.unpack('<I', prjp_data[16:20])[0]
-                        
-                        # 拍号分子 (偏移20字节)
-                        beats_per_bar = struct.unpack('<I', prjp_data[20:24])[0]
-                        
-                        # 拍号分母 (偏移24字节)
-                        beat_unit = struct.unpack('<I', prjp_data[24:28])[0]
-                        
-                        # BPM (偏移32字节)
-                        bpm = struct.unpack('<d', prjp_data[32:40])[0]
-                        
-                        project_info = {
-                            'sample_rate': sample_rate,
-                            'beats_per_bar': beats_per_bar,
-                            'beat_unit': beat_unit,
-                            'bpm': bpm
-                        }
-                        
-                        current_offset += 0x108
-                        
-                    elif chunk_type == b'TRKP':
-                        # TRKP 数据块 - 轨道信息
-                        trkp_data = f.read(0x108 - 8)
-                        
-                        # 轨道名称 (64字节，系统本地编码)
-                        track_name_bytes = trkp_data[0:64]
-                        # 找到第一个null终止符
-                        null_pos = track_name_bytes.find(b'\x00')
-                        if null_pos != -1:
-                            track_name_bytes = track_name_bytes[:null_pos]
-                        
-                        # 解码为系统默认编码
-                        track_name = track_name_bytes.decode(locale.getpreferredencoding())
-                        
-                        # 音量倍率 (偏移64字节)
-                        volume = struct.unpack('<d', trkp_data[64:72])[0]
-                        
-                        # 声像 (偏移72字节) - HifiShifter不支持，忽略
-                        # pan = struct.unpack('<d', trkp_data[72:80])[0]
-                        
-                        # 静音 (偏移80字节)
-                        muted = struct.unpack('<I', trkp_data[80:84])[0] == 1
-                        
-                        # 独奏 (偏移84字节)
-                        solo = struct.unpack('<I', trkp_data[84:88])[0] == 1
-                        
-                        # 反相 (偏移96字节) - HifiShifter不支持，忽略
-                        # inverted = struct.unpack('<I', trkp_data[96:100])[0] == 1
-                        
-                        track_info = {
-                            'name': track_name,
-                            'volume': volume,
-                            'muted': muted,
-                            'solo': solo
-                        }
-                        
-                        tracks.append(track_info)
-                        current_offset += 0x108
-                        
-                    elif chunk_type == b'ITMP':
-                        # ITMP 数据块 - 音频块信息
-                        itmp_data = f.read(0x208 - 8)
-                        
-                        # 音频文件路径 (从偏移0开始，直到0x00)
-                        path_bytes = bytearray()
-                        for i in range(0, 0x108):
-                            byte = itmp_data[i:i+1]
-                            if byte == b'\x00':
-                                break
-                            path_bytes.extend(byte)
-                        
-                        # 解码为系统默认编码
-                        file_path_str = path_bytes.decode(locale.getpreferredencoding())
-                        
-                        # 解析轨道索引 (偏移0x108)
-                        track_index = struct.unpack('<I', itmp_data[0x108:0x10C])[0]
-                        
-                        # 起始位置 (偏移0x110，单位：采样点)
-                        start_position_samples = struct.unpack('<d', itmp_data[0x110:0x118])[0]
-                        
-                        # 转换为秒
-                        start_position_seconds = start_position_samples / project_info.get('sample_rate', 44100)
-                        
-                        # 转换为HifiShifter的帧单位（需要hop_size）
-                        hop_size = self.processor.config.get('hop_size', 512) if self.processor.config else 512
-                        start_frame = int(start_position_seconds * project_info.get('sample_rate', 44100) / hop_size)
-                        
-                        audio_block = {
-                            'file_path': file_path_str,
-                            'track_index': track_index,
-                            'start_position_samples': start_position_samples,
-                            'start_position_seconds': start_position_seconds,
-                            'start_frame': start_frame,
-                            'tuning_samples': []  # 将在后面填充Ctrp数据
-                        }
-                        
-                        audio_blocks.append(audio_block)
-                        current_offset += 0x208
-                        
-                    else:
-                        # 未知数据块，跳过8字节
-                        current_offset += 8
-                        f.seek(current_offset)
-                
-                # 第二轮：收集所有Itmp数据块和对应的Ctrp数据
-                current_offset = 16  # 重置偏移，重新扫描文件
-                f.seek(current_offset)
-                itmp_block_index = 0  # 用于跟踪Itmp数据块的顺序
-                
-                while current_offset < file_size:
-                    chunk_header = f.read(8)
-                    
-                    if len(chunk_header) < 8:
-                        break
-                        
-                    chunk_type = chunk_header[:4]
-                    chunk_version = struct.unpack('<I', chunk_header[4:8])[0]
-                    
-                    if chunk_type == b'Itmp':
-                        # Itmp 数据块 - 音频块调音数据头
-                        itmp_data = f.read(0x108 - 8)  # 总长度0x108，减去已读的8字节
-                        
-                        # 创建Itmp音频块记录
-                        itmp_block = {
-                            'index': itmp_block_index,
-                            'tuning_samples': []
-                        }
-                        
-                        # 检查是否有对应的ITMP音频块
-                        if itmp_block_index < len(audio_blocks):
-                            # 将Itmp块与对应的ITMP块关联
-                            audio_blocks[itmp_block_index]['itmp_block'] = itmp_block
-                        
-                        current_offset += 0x108
-                        f.seek(current_offset)
-                        
-                        # 读取紧随其后的Ctrp数据块
-                        while current_offset < file_size:
-                            # 预读下一个数据块头
-                            next_chunk_header = f.read(8)
-                            if len(next_chunk_header) < 8:
-                                break
-                            
-                            next_chunk_type = next_chunk_header[:4]
-                            
-                            if next_chunk_type == b'Ctrp':
-                                # Ctrp 数据块 - 调音采样点
-                                ctrp_data = f.read(0x68 - 8)  # 总长度0x68，减去已读的8字节
-                                
-                                # 是否禁用编辑 (偏移18字节)
-                                disabled = struct.unpack('<h', ctrp_data[18:20])[0] == 1
-                                
-                                # 修正后的音高 (偏移22字节，单位：音分)
-                                pitch_cents = struct.unpack('<h', ctrp_data[22:24])[0]
-                                
-                                # 转换为MIDI音高
-                                # VocalShifter: 0 = C-1, 6000 = C4
-                                # 转换为MIDI: C-1 = MIDI 0, C4 = MIDI 60
-                                # 音分转半音: pitch_cents / 100
-                                # C-1是MIDI 0，所以: midi_pitch = pitch_cents / 100
-                                midi_pitch = pitch_cents / 100.0
-                                
-                                tuning_sample = {
-                                    'disabled': disabled,
-                                    'pitch_cents': pitch_cents,
-                                    'midi_pitch': midi_pitch
-                                }
-                                
-                                # 添加到Itmp块的调音采样点列表
-                                itmp_block['tuning_samples'].append(tuning_sample)
-                                
-                                # 如果有关联的ITMP音频块，也添加到那里
-                                if itmp_block_index < len(audio_blocks):
-                                    audio_blocks[itmp_block_index]['tuning_samples'].append(tuning_sample)
-                                
-                                current_offset += 0x68
-                                f.seek(current_offset)
-                            else:
-                                # 不是Ctrp数据块，回退8字节并跳出循环
-                                f.seek(current_offset)  # 回到数据块开始位置
-                                break
-                        
-                        itmp_block_index += 1
-                    else:
-                        # 其他数据块，跳过8字节
-                        current_offset += 8
-                        f.seek(current_offset)
-                
-                # 现在我们已经解析了所有数据，开始创建HifiShifter工程
-                
-                # 清空当前工程
-                self.tracks = []
-                self.current_track_idx = -1
-                self.timeline_panel.refresh_tracks([])
-                
-                # 设置工程参数
-                if project_info:
-                    self.bpm_spin.setValue(project_info.get('bpm', 120))
-                    # 设置网格单位（拍号）
-                    # HifiShifter使用beats_spin表示拍号分子，分母固定为4
-                    # 所以我们需要将VocalShifter的拍号转换为HifiShifter的格式
-                    beats_per_bar = project_info.get('beats_per_bar', 4)
-                    beat_unit = project_info.get('beat_unit', 4)
-                    
-                    # 如果分母是4，直接使用分子
-                    if beat_unit == 4:
-                        self.beats_spin.setValue(beats_per_bar)
-                    else:
-                        # 否则进行转换（简化处理）
-                        self.beats_spin.setValue(beats_per_bar)
-                        QMessageBox.information(self, i18n.get("msg.info"), 
-                                            i18n.get("msg.time_signature_converted") + 
-                                            f" {beats_per_bar}/{beat_unit} -> {beats_per_bar}/4")
-                
-                # 统计无法导入的文件
-                unsupported_files = []
-                
-                # 为每个音频块创建轨道
-                for i, audio_block in enumerate(audio_blocks):
-                    # 解析文件路径
-                    raw_path = audio_block['file_path']
-                    
-                    # 检查是否是相对路径
-                    if not os.path.isabs(raw_path):
-                        # 尝试相对于工程文件路径
-                        abs_path = os.path.join(project_dir, raw_path)
-                    else:
-                        abs_path = raw_path
-                    
-                    # 检查文件是否存在
-                    if not os.path.exists(abs_path):
-                        # 尝试在工程文件夹内查找
-                        file_name = os.path.basename(raw_path)
-                        alt_path = os.path.join(project_dir, file_name)
-                        if os.path.exists(alt_path):
-                            abs_path = alt_path
-                        else:
-                            unsupported_files.append(f"{raw_path} ({i18n.get('msg.file_not_found')})")
-                            continue
-                    
-                    # 检查文件格式是否支持
-                    file_ext = os.path.splitext(abs_path)[1].lower()
-                    supported_extensions = {'.wav', '.flac', '.mp3'}
-                    
-                    if file_ext not in supported_extensions:
-                        unsupported_files.append(f"{raw_path} ({i18n.get('msg.unsupported_format')})")
-                        continue
-                    
-                    # 获取对应的轨道信息
-                    track_info = None
-                    if audio_block['track_index'] < len(tracks):
-                        track_info = tracks[audio_block['track_index']]
-                    
-                    # 创建轨道名称
-                    if track_info:
-                        # 如果轨道中有多个音频块，添加序号
-                        track_count_in_track = sum(1 for ab in audio_blocks if ab['track_index'] == audio_block['track_index'])
-                        if track_count_in_track > 1:
-                            track_name = f"{track_info['name']}_{i+1}"
-                        else:
-                            track_name = track_info['name']
-                    else:
-                        track_name = f"Track_{i+1}"
-                    
-                    # 创建并加载轨道
+            self.stop_playback(reset=True)
+        except Exception:
+            pass
+
+        hop_size = self.processor.config.get('hop_size', 512) if self.processor.config else 512
+
+        def _work(progress):
+            try:
+                parsed = vocalshifter_project.parse_vshp(file_path)
+            except vocalshifter_project.VshpFormatError:
+                return None
+            project_info = parsed['project']
+            vs_tracks = parsed['tracks']
+            items = parsed['items']
+            project_dir = os.path.dirname(os.path.abspath(file_path))
+            project_sr = project_info.get('sample_rate', 44100) or 44100
+
+            tracks = []
+            unsupported_files = []  # (path, reason key or error text, is_key)
+            for i, item in enumerate(items):
+                raw_path = item['file_path']
+                abs_path = vocalshifter_project.resolve_item_path(raw_path, project_dir)
+                if abs_path is None:
+                    unsupported_files.append((raw_path, 'msg.file_not_found', True))
+                elif os.path.splitext(abs_path)[1].lower() not in vocalshifter_project.SUPPORTED_AUDIO_EXTENSIONS:
+                    unsupported_files.append((raw_path, 'msg.unsupported_format', True))
+                else:
                     try:
-                        track = Track(track_name, abs_path, track_type='vocal')
+                        track = Track(vocalshifter_project.item_track_name(items, vs_tracks, i), abs_path, track_type='vocal')
                         track.load(self.processor)
-                        
-                        # 设置轨道参数
-                        if track_info:
+
+                        if item['track_index'] < len(vs_tracks):
+                            track_info = vs_tracks[item['track_index']]
                             track.volume = track_info.get('volume', 1.0)
                             track.muted = track_info.get('muted', False)
                             track.solo = track_info.get('solo', False)
-                        
-                        # 设置起始位置
-                        track.start_frame = audio_block['start_frame']
-                        
-                        # 应用调音采样点数据
-                        if audio_block['tuning_samples'] and track.f0_edited is not None:
-                            # 将调音采样点应用到音高曲线
-                            self.apply_vocalshifter_tuning_samples(track, audio_block['tuning_samples'])
-                        
-                        self.tracks.append(track)
-                        
+
+                        start_seconds = item['start_position_samples'] / project_sr
+                        track.start_frame = int(start_seconds * project_sr / hop_size)
+
+                        vocalshifter_project.apply_tuning_samples(
+                            track,
+                            item['tuning'],
+                            hop_size,
+                            self.processor.config['audio_sample_rate'] if self.processor.config else None,
+                        )
+                        tracks.append(track)
                     except Exception as e:
-                        unsupported_files.append(f"{raw_path} ({str(e)})")
-                
-                # 更新UI
-                if self.processor.config:
-                    self.timeline_panel.hop_size = self.processor.config['hop_size']
-                self.timeline_panel.refresh_tracks(self.tracks)
-                
-                # 如果有无法导入的文件，显示警告
-                if unsupported_files:
-                    warning_msg = i18n.get("msg.unsupported_files_found") + ":\n\n"
-                    warning_msg += "\n".join(unsupported_files[:10])  # 最多显示10个
-                    if len(unsupported_files) > 10:
-                        warning_msg += f"\n\n...{len(unsupported_files) - 10} more"
-                    
-                    QMessageBox.warning(self, i18n.get("msg.warning"), warning_msg)
-                
-                self.status_label.setText(i18n.get("status.vocalshifter_project_loaded"))
-                
-        except Exception as e:
-            QMessageBox.critical(self, i18n.get("msg.error"), 
-                            i18n.get("msg.load_vocalshifter_project_failed") + f": {str(e)}")
-            import traceback
-            traceback.print_exc()
+                        unsupported_files.append((raw_path, str(e), False))
+                progress(i + 1, len(items))
+
+            return {'project': project_info, 'tracks': tracks, 'unsupported_files': unsupported_files}
+
+        def _ok(result):
+            if result is None:
+                QMessageBox.critical(self, i18n.get("msg.error"), i18n.get("msg.vocalshifter_invalid_header"))
+                self.status_label.setText(i18n.get("status.vocalshifter_load_failed"))
+                return
+
+            self._close_journal()
+            self.current_track_idx = -1
+            self.clear_selection(hide_box=True)
+
+            # 设置工程参数
+            project_info = result['project']
+            if project_info:
+                self.bpm_spin.setValue(project_info.get('bpm', 120))
+                # HifiShifter使用beats_spin表示拍号分子，分母固定为4
+                beats_per_bar = project_info.get('beats_per_bar', 4)
+                beat_unit = project_info.get('beat_unit', 4)
+                self.beats_spin.setValue(beats_per_bar)
+                if beat_unit != 4:
+                    QMessageBox.information(self, i18n.get("msg.info"),
+                                        i18n.get("msg.time_signature_converted") +
+                                        f" {beats_per_bar}/{beat_unit} -> {beats_per_bar}/4")
+
+            self.tracks = result['tracks']
+            if self.processor.config:
+                self.timeline_panel.hop_size = self.processor.config['hop_size']
+            self.timeline_panel.refresh_tracks(self.tracks)
+            self.update_plot()
+
+            # 如果有无法导入的文件，显示警告
+            unsupported_files = [
+                f"{path} ({i18n.get(reason) if is_key else reason})"
+                for path, reason, is_key in result['unsupported_files']
+            ]
+            if unsupported_files:
+                warning_msg = i18n.get("msg.unsupported_files_found") + ":\n\n"
+                warning_msg += "\n".join(unsupported_files[:10])  # 最多显示10个
+                if len(unsupported_files) > 10:
+                    warning_msg += f"\n\n...{len(unsupported_files) - 10} more"
+                QMessageBox.warning(self, i18n.get("msg.warning"), warning_msg)
+
+            self.status_label.setText(i18n.get("status.vocalshifter_project_loaded"))
+
+        def _fail(err_text: str):
+            QMessageBox.critical(self, i18n.get("msg.error"),
+                            i18n.get("msg.load_vocalshifter_project_failed") + f": {err_text}")
             self.status_label.setText(i18n.get("status.vocalshifter_load_failed"))
 
-    def apply_vocalshifter_tuning_samples(self, track, tuning_samples):
-        """
-        将VocalShifter调音采样点应用到音轨
-        每个调音采样点时间长度为0.005秒，相邻点之间线性插值
-        """
-        if not tuning_samples or track.f0_edited is None:
-            return
-        
-        # 推入撤销栈
-        self.push_undo()
-        
-        # 获取音频参数
-        sr = track.sr if track.sr else self.processor.config['audio_sample_rate']
-        hop_size = self.processor.config['hop_size']
-        
-        # 创建调音采样点的时间-音高列表
-        # 每个调音采样点对应0.005秒
-        time_pitch_pairs = []
-        
-        for i, sample in enumerate(tuning_samples):
-            # 计算采样点时间（秒）
-            sample_time = i * 0.005
-            
-            # 如果禁用编辑，则使用原始音高
-            if sample.get('disabled', False):
-                # 需要找到对应时间的原始音高
-                # 我们将这个点标记为特殊值，稍后处理
-                time_pitch_pairs.append((sample_time, None, True))  # (时间, 音高, 是否禁用)
-            else:
-                # 使用修正后的音高
-                midi_pitch = sample.get('midi_pitch', 0)
-                time_pitch_pairs.append((sample_time, midi_pitch, False))
-        
-        if not time_pitch_pairs:
-            return
-        
-        # 计算音频总时长（秒）
-        audio_duration = len(track.audio) / sr if track.audio is not None else 0
-        
-        # 处理每个音高帧
-        for i in range(len(track.f0_edited)):
-            # 计算当前帧对应的时间（秒）
-            frame_time = (i * hop_size) / sr
-            
-            # 如果超出音频时长，跳过
-            if frame_time > audio_duration:
-                continue
-            
-            # 找到当前时间所在的两个调音采样点
-            sample_index = int(frame_time / 0.005)
-            next_sample_index = sample_index + 1
-            
-            # 处理边界情况
-            if sample_index >= len(time_pitch_pairs):
-                # 超出最后一个采样点，使用最后一个采样点的值
-                last_time, last_pitch, last_disabled = time_pitch_pairs[-1]
-                if last_disabled:
-                    # 使用原始音高
-                    if track.f0_original is not None and i < len(track.f0_original):
-                        track.f0_edited[i] = track.f0_original[i]
-                elif last_pitch is not None:
-                    track.f0_edited[i] = last_pitch
-                continue
-            
-            if sample_index < 0:
-                # 在第一个采样点之前，使用第一个采样点的值
-                first_time, first_pitch, first_disabled = time_pitch_pairs[0]
-                if first_disabled:
-                    # 使用原始音高
-                    if track.f0_original is not None and i < len(track.f0_original):
-                        track.f0_edited[i] = track.f0_original[i]
-                elif first_pitch is not None:
-                    track.f0_edited[i] = first_pitch
-                continue
-            
-            # 获取当前采样点和下一个采样点
-            current_time, current_pitch, current_disabled = time_pitch_pairs[sample_index]
-            
-            if next_sample_index >= len(time_pitch_pairs):
-                # 没有下一个采样点，使用当前采样点的值
-                if current_disabled:
-                    # 使用原始音高
-                    if track.f0_original is not None and i < len(track.f0_original):
-                        track.f0_edited[i] = track.f0_original[i]
-                elif current_pitch is not None:
-                    track.f0_edited[i] = current_pitch
-                continue
-            
-            next_time, next_pitch, next_disabled = time_pitch_pairs[next_sample_index]
-            
-            # 计算时间比例（用于线性插值）
-            time_ratio = (frame_time - current_time) / (next_time - current_time)
-            
-            # 处理两个采样点都禁用的情况
-            if current_disabled and next_disabled:
-                # 两个点都禁用，使用原始音高
-                if track.f0_original is not None and i < len(track.f0_original):
-                    track.f0_edited[i] = track.f0_original[i]
-                continue
-            
-            # 处理只有一个点禁用的情况
-            if current_disabled:
-                # 当前点禁用，使用原始音高
-                if track.f0_original is not None and i < len(track.f0_original):
-                    track.f0_edited[i] = track.f0_original[i]
-                continue
-            
-            if next_disabled:
-                # 下一个点禁用，使用当前点的音高（不插值）
-                if current_pitch is not None:
-                    track.f0_edited[i] = current_pitch
-                continue
-            
-            # 两个点都未禁用，进行线性插值
-            if current_pitch is not None and next_pitch is not None:
-                interpolated_pitch = current_pitch + (next_pitch - current_pitch) * time_ratio
-                track.f0_edited[i] = interpolated_pitch
-        
-        # 标记所有段为脏，需要重新合成
-        for state in track.segment_states:
-            state['dirty'] = True
-        
-        # 更新绘图
-        self.update_plot()
\ No newline at end of file
+        self._start_bg_task(
+            kind='vocalshifter_project',
+            status_text=i18n.get("status.loading_vocalshifter_project"),
+            fn=_work,
+            total=None,
+            on_success=_ok,
+            on_failed=_fail,
+        )
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""Binary project container (``.hsp``).
+
+A zip archive holding ``manifest.json`` (the project dict, with every numpy
+array replaced by ``{"$array": name}``) and one raw little-endian member per
+array under ``arrays/``. Members are stored uncompressed by default so they
+can be memory-mapped and viewed with `np.frombuffer` without parsing or
+copying; deflate is optional for smaller files.
+
+Legacy projects (plain JSON text, ``.hsp`` or ``.json``) are detected by the
+missing zip signature and read as before.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+CONTAINER_FORMAT = 'hifishifter-project'
+CONTAINER_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+ARRAY_REF_KEY = '$array'
+
+_LOCAL_HEADER = struct.Struct('<4s5H3I2H')  # zip local file header (30 bytes)
+
+
+def file_sha1(path, digest=None, chunk_size: int = 1 << 20):
+    """SHA-1 of a file's content (optionally continuing an existing `digest`); returns the hex string."""
+    h = digest if digest is not None else hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_container(path) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == b'PK\x03\x04'
+    except OSError:
+        return False
+
+
+def _extract_arrays(obj, arrays: dict, prefix: str):
+    """Replace ndarrays in a JSON-like tree by references; collect them in `arrays`."""
+    if isinstance(obj, np.ndarray):
+        arrays[prefix] = obj
+        return {ARRAY_REF_KEY: prefix}
+    if isinstance(obj, dict):
+        return {k: _extract_arrays(v, arrays, f"{prefix}.{k}" if prefix else str(k)) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_extract_arrays(v, arrays, f"{prefix}.{i}") for i, v in enumerate(obj)]
+    return obj
+
+
+def _resolve_arrays(obj, load):
+    if isinstance(obj, dict):
+        if len(obj) == 1 and ARRAY_REF_KEY in obj:
+            return load(obj[ARRAY_REF_KEY])
+        return {k: _resolve_arrays(v, load) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_resolve_arrays(v, load) for v in obj]
+    return obj
+
+
+def write_container(path, data: dict, compress: bool = False):
+    """Write `data` (a JSON-like dict that may contain numpy arrays) to `path`.
+
+    The file is written next to the target and renamed over it, so a failed
+    save never leaves a truncated project behind.
+    """
+    arrays = {}
+    manifest = _extract_arrays(data, arrays, '')
+    table = {}
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+
+    tmp = str(path) + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', compression=compression) as zf:
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            if arr.dtype.byteorder == '>' or (arr.dtype.byteorder == '=' and not np.little_endian):
+                arr = arr.astype(arr.dtype.newbyteorder('<'))
+            member = f"arrays/{name}.bin"
+            with zf.open(member, 'w', force_zip64=arr.nbytes >= 0x7FFFFFFF) as f:
+                if arr.size:  # empty arrays have no payload (and memoryview can't cast them)
+                    f.write(memoryview(arr).cast('B'))
+            table[name] = {'file': member, 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+
+        manifest = dict(manifest)
+        manifest['format'] = CONTAINER_FORMAT
+        manifest['container_version'] = CONTAINER_VERSION
+        manifest['arrays'] = table
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+    os.replace(tmp, path)
+
+
+class ProjectContainer:
+    """Read access to a container; arrays are views into a shared mmap of the file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._zf = zipfile.ZipFile(self.path, 'r')
+        self._file = None
+        self._mm = None
+        try:
+            self.manifest = json.loads(self._zf.read(MANIFEST_NAME).decode('utf-8'))
+        except KeyError:
+            self.close()
+            raise ValueError(f"Not a HifiShifter project container: {path}")
+        version = int(self.manifest.get('container_version', 0))
+        if version > CONTAINER_VERSION:
+            self.close()
+            raise ValueError(f"Project container version {version} is newer than supported ({CONTAINER_VERSION}).")
+
+    def array_names(self):
+        return list((self.manifest.get('arrays') or {}).keys())
+
+    def _mapped(self):
+        if self._mm is None:
+            self._file = open(self.path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        fields = _LOCAL_HEADER.unpack_from(self._mapped(), info.header_offset)
+        name_len, extra_len = fields[-2], fields[-1]
+        return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+    def array(self, name: str) -> np.ndarray:
+        """Read-only array `name`: a view into the mapped file for stored members."""
+        entry = self.manifest['arrays'][name]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        info = self._zf.getinfo(entry['file'])
+        if info.file_size == 0:
+            arr = np.frombuffer(b'', dtype=dtype)
+        elif info.compress_type == zipfile.ZIP_STORED:
+            count = info.file_size // dtype.itemsize
+            offset = self._data_offset(info)
+            arr = np.frombuffer(self._mapped(), dtype=dtype, count=count, offset=offset)
+        else:
+            arr = np.frombuffer(self._zf.read(info), dtype=dtype)
+        return arr.reshape(shape)
+
+    def read(self) -> dict:
+        """The project dict with array references replaced by arrays."""
+        data = _resolve_arrays(self.manifest, self.array)
+        data.pop('arrays', None)
+        return data
+
+    def close(self):
+        # The mmap itself stays alive for as long as arrays still view it
+        self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_container(path) -> dict:
+    with ProjectContainer(path) as c:
+        return c.read()
@@ -0,0 +1,342 @@
+"""Qt-free project loading, saving and rendering helpers.
+
+Shared by the GUI (`main_window.py`) and the headless renderer
+(`python -m hifi_shifter.render`). Nothing here may import Qt.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .track import Track
+from .audio_processing.mixer import track_gains
+from .project_container import file_sha1, is_container, read_container, write_container
+from .project_journal import apply_journal, read_journal
+
+PROJECT_VERSION = '3.0'
+BUNDLE_CACHE_VERSION = 1
+
+
+def resolve_path(path, project_dir):
+    """Return `path` as is if it exists, else relative to `project_dir` if that exists."""
+    if path and not os.path.exists(path):
+        rel_path = os.path.join(project_dir, path)
+        if os.path.exists(rel_path):
+            return rel_path
+    return path
+
+
+def read_project_file(file_path) -> dict:
+    """Read a binary container or a legacy JSON project.
+
+    Curves from a container are read-only views into the mapped file.
+    """
+    if is_container(file_path):
+        return read_container(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _restore_edits(track: Track, t_data: dict, keep_render: bool = False):
+    """Overlay saved pitch/tension curves onto a freshly loaded track.
+
+    With `keep_render` the bundled render already matches the saved pitch, so
+    segments are not marked for resynthesis.
+    """
+    if 'f0' in t_data and track.f0_edited is not None:
+        saved_f0 = np.asarray(t_data['f0'])
+        min_len = min(len(saved_f0), len(track.f0_edited))
+        track.f0_edited[:min_len] = saved_f0[:min_len]
+        if not keep_render:
+            for state in track.segment_states:
+                state['dirty'] = True
+
+    if 'tension' in t_data and getattr(track, 'tension_edited', None) is not None:
+        saved_tension = np.asarray(t_data['tension'], dtype=np.float32)
+        min_len = min(len(saved_tension), len(track.tension_edited))
+        track.tension_edited[:min_len] = saved_tension[:min_len]
+        track.mark_tension_dirty()
+
+
+def _curve_sha1(values) -> str:
+    return hashlib.sha1(np.ascontiguousarray(values, dtype='<f4').tobytes()).hexdigest()
+
+
+def _bundle_cache(track: Track, model_hash, engine) -> dict:
+    """Bundle entry for one track: features/render plus the keys that decide if they can be reused."""
+    cache = track.to_cache()
+    cache['version'] = BUNDLE_CACHE_VERSION
+    cache['audio_sha1'] = track.source_sha1()
+    cache['model_hash'] = model_hash
+    if 'render' in cache:
+        cache['render_engine'] = engine
+        cache['render_f0_sha1'] = _curve_sha1(track.f0_edited)
+    return cache
+
+
+def _usable_cache(cache, track_type, file_p, processor, engine):
+    """Return (features_ok, render_ok) for a bundled track cache."""
+    if not isinstance(cache, dict) or cache.get('version') != BUNDLE_CACHE_VERSION:
+        return False, False
+    if not processor.config or int(cache.get('sr', 0)) != int(processor.config['audio_sample_rate']):
+        return False, False
+    # Mel/F0 depend on the model config; BGM only on the sample rate
+    if track_type == 'vocal' and cache.get('model_hash') != getattr(processor, 'model_hash', None):
+        return False, False
+    # A collaborator may not have the source file: then the embedded decode is used as is
+    if os.path.exists(file_p):
+        try:
+            if file_sha1(file_p) != cache.get('audio_sha1'):
+                return False, False
+        except OSError:
+            return False, False
+    render_ok = 'render' in cache and cache.get('render_engine') == engine
+    return True, render_ok
+
+
+def load_project(file_path, processor, progress=None, load_model=True, replay_journal=True) -> dict:
+    """Load a project file: model (optional), tracks and their saved edits.
+
+    `processor.load_model` is skipped when `load_model` is False or when the
+    processor already has that model loaded (``processor.model_path``).
+    Tracks saved as a bundle are restored from their embedded caches when
+    the source audio hash and model hash still match.
+    Edits from an edit journal left next to the file (unsaved session or
+    crash) are replayed unless `replay_journal` is False or tracks are missing.
+    Returns a dict with keys ``data``, ``loaded_model_path``, ``params``,
+    ``engine``, ``tracks``, ``missing_audio`` and ``journal_records``.
+    """
+    project_dir = os.path.dirname(os.path.abspath(file_path))
+    data = read_project_file(file_path)
+
+    # Resolve & load model (heavy)
+    loaded_model_path = None
+    model_path = resolve_path(data.get('model_path'), project_dir)
+    if load_model and model_path and os.path.exists(model_path):
+        if getattr(processor, 'model_path', None) != os.path.abspath(model_path) or processor.model is None:
+            processor.load_model(model_path)
+        loaded_model_path = model_path
+
+    params = data.get('params', {}) if isinstance(data, dict) else {}
+    engine_name = data.get('synthesis_engine', params.get('synthesis_engine', 'hifigan'))
+
+    tracks: list[Track] = []
+    missing_audio: list[str] = []
+
+    if 'tracks' in data:
+        t_list = data.get('tracks') or []
+        total = len(t_list)
+        for idx, t_data in enumerate(t_list):
+            file_p = t_data.get('file_path')
+            if not file_p:
+                continue
+
+            file_p = resolve_path(file_p, project_dir)
+            track_type = t_data.get('type', 'vocal')
+            cache = t_data.get('cache')
+            features_ok, render_ok = _usable_cache(cache, track_type, file_p, processor, engine_name)
+            if not os.path.exists(file_p) and not features_ok:
+                missing_audio.append(str(file_p))
+                if progress is not None:
+                    progress(idx + 1, total)
+                continue
+
+            track = Track(t_data.get('name', os.path.basename(file_p)), file_p, track_type)
+            if features_ok:
+                # The render is only valid for the pitch curve it was made from
+                if render_ok and 'f0' in t_data:
+                    render_ok = _curve_sha1(t_data['f0']) == cache.get('render_f0_sha1')
+                track.load_from_cache(cache, use_render=render_ok)
+            else:
+                render_ok = False
+                track.load(processor)
+
+            track.shift_value = t_data.get('shift', 0.0)
+            track.muted = t_data.get('muted', False)
+            track.solo = t_data.get('solo', False)
+            track.volume = t_data.get('volume', 1.0)
+            track.start_frame = t_data.get('start_frame', 0)
+            _restore_edits(track, t_data, keep_render=render_ok)
+
+            tracks.append(track)
+            if progress is not None:
+                progress(idx + 1, total)
+
+    # Backward compatibility for v1.0
+    elif 'audio_path' in data:
+        audio_path = resolve_path(data['audio_path'], project_dir)
+        if os.path.exists(audio_path):
+            track = Track(os.path.basename(audio_path), audio_path, 'vocal')
+            track.load(processor)
+            _restore_edits(track, data)
+
+            if 'params' in data and 'shift' in data['params']:
+                track.shift_value = data['params']['shift']
+
+            tracks.append(track)
+        else:
+            missing_audio.append(str(audio_path))
+
+    # Journal track indices refer to the full track list
+    journal_records = 0
+    if replay_journal and not missing_audio:
+        journal_records = apply_journal(tracks, read_journal(file_path))
+
+    return {
+        'data': data,
+        'loaded_model_path': loaded_model_path,
+        'params': params,
+        'engine': engine_name,
+        'tracks': tracks,
+        'missing_audio': missing_audio,
+        'journal_records': journal_records,
+    }
+
+
+def project_to_dict(tracks, project_dir, model_path=None, engine='hifigan', params=None,
+                    bundle=False, model_hash=None) -> dict:
+    """Serialise tracks and settings; paths are stored relative to `project_dir` when possible.
+
+    With `bundle`, each track also carries its decoded audio, features and
+    last render (see `Track.to_cache`) so the project opens without
+    re-extraction or resynthesis; this needs the binary container format.
+    """
+    tracks_data = []
+    for track in tracks:
+        # Try to make path relative
+        try:
+            rel_path = os.path.relpath(track.file_path, project_dir)
+        except ValueError:
+            rel_path = track.file_path  # Different drive or cannot be relative
+
+        t_data = {
+            'name': track.name,
+            'file_path': rel_path,
+            'type': track.track_type,
+            'shift': track.shift_value,
+            'muted': track.muted,
+            'solo': track.solo,
+            'volume': track.volume,
+            'start_frame': track.start_frame
+        }
+        if track.track_type == 'vocal' and track.f0_edited is not None:
+            t_data['f0'] = np.asarray(track.f0_edited, dtype=np.float32)
+        if track.track_type == 'vocal' and getattr(track, 'tension_edited', None) is not None:
+            t_data['tension'] = np.asarray(track.tension_edited, dtype=np.float32)
+        if bundle and track.audio is not None:
+            t_data['cache'] = _bundle_cache(track, model_hash, engine)
+        tracks_data.append(t_data)
+
+    # Model path relative
+    model_path_save = model_path
+    if model_path:
+        try:
+            model_path_save = os.path.relpath(model_path, project_dir)
+        except ValueError:
+            model_path_save = model_path
+
+    return {
+        'version': PROJECT_VERSION,
+        'model_path': model_path_save,
+        'synthesis_engine': engine,
+        'params': dict(params or {}),
+        'tracks': tracks_data
+    }
+
+
+def _arrays_to_lists(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {k: _arrays_to_lists(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_arrays_to_lists(v) for v in obj]
+    return obj
+
+
+def is_bundle(data: dict) -> bool:
+    return any(isinstance(t, dict) and 'cache' in t for t in data.get('tracks') or [])
+
+
+def write_project_file(file_path, data: dict, compress: bool = False):
+    """Save `data`: ``.json`` keeps the legacy text format, anything else is a binary container."""
+    if str(file_path).lower().endswith('.json'):
+        if is_bundle(data):
+            raise ValueError("Project bundles must be saved as .hsp, not .json.")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(_arrays_to_lists(data), f, indent=4)
+        return
+    write_container(file_path, data, compress=compress)
+
+
+def count_dirty_segments(tracks) -> int:
+    return sum(
+        1
+        for track in tracks if track.track_type == 'vocal'
+        for state in track.segment_states if state.get('dirty')
+    )
+
+
+def synthesize_tracks(tracks, processor, progress=None) -> int:
+    """Synthesize every dirty segment and rebuild the full audio of touched tracks.
+
+    Returns the number of segments synthesized; `progress(done, total)` is
+    called after each one.
+    """
+    hop_size = processor.config['hop_size'] if processor.config else 512
+    total = count_dirty_segments(tracks)
+    processed = 0
+    for track in tracks:
+        if track.track_type != 'vocal':
+            continue
+        touched = False
+        for i, state in enumerate(track.segment_states):
+            if state.get('dirty'):
+                track.synthesize_segment(processor, i)
+                touched = True
+                processed += 1
+                if progress is not None:
+                    progress(processed, total)
+        if touched or track.synthesized_audio is None:
+            track.update_full_audio(hop_size)
+    return processed
+
+
+def safe_track_name(track: Track, index: int) -> str:
+    safe_name = "".join([c for c in track.name if c.isalnum() or c in (' ', '-', '_')]).strip()
+    return safe_name or f"track_{index + 1}"
+
+
+def mix_sources(tracks, sr: int, hop_size: int):
+    """Audible tracks as (buffers, starts, gains) for export; each track is rendered once."""
+    gains = track_gains(tracks)
+    buffers, starts, used_gains = [], [], []
+    for track, gain in zip(tracks, gains):
+        if gain == 0.0:
+            continue
+        audio = track.get_audio_for_mix(sr, hop_size)
+        if audio is None or len(audio) == 0:
+            continue
+        buffers.append(audio)
+        starts.append(track.start_frame * hop_size)
+        used_gains.append(gain)
+    return buffers, starts, used_gains
+
+
+def stem_sources(tracks, sr: int, hop_size: int):
+    """Unmuted, synthesized vocal tracks as ``(name, render, start)`` for `export_stems`.
+
+    `render` is a callable so the tension FX of each track runs inside its
+    export worker (each track owns its FX cache).
+    """
+    stems = []
+    for i, track in enumerate(tracks):
+        if track.muted or track.track_type == 'bgm':
+            continue
+        if track.synthesized_audio is None:
+            continue
+        render = (lambda t=track: t.get_audio_for_mix(sr, hop_size))
+        stems.append((safe_track_name(track, i), render, track.start_frame * hop_size))
+    return stems
@@ -0,0 +1,274 @@
+"""Append-only edit journal kept next to a saved project (``<project>.journal``).
+
+Instead of rewriting the whole project on every edit, the changed part of
+each edit is appended as a small record:
+
+- ``curve``: a contiguous range of a track's ``f0``/``tension`` curve
+  (header + raw float32 values),
+- ``mix``: a track's volume / mute / solo / start_frame.
+
+Records are written immediately but fsync'ed in batches (by count or time),
+so a crash loses at most the last unsynced batch. The first record stores
+the size and mtime of the project file the journal applies to; a journal
+left behind by another save of the project is ignored. Saving the project
+("compaction") folds everything into the main file and starts a new journal.
+
+Record framing: ``<u32 payload length><u32 crc32><payload>`` with payload =
+UTF-8 JSON header, ``\\n``, optional raw little-endian array bytes. A torn
+tail (short or bad CRC) ends replay.
+"""
+
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_VERSION = 1
+
+_FRAME = struct.Struct('<II')
+
+
+def journal_path_for(project_path) -> str:
+    return str(project_path) + JOURNAL_SUFFIX
+
+
+def project_signature(project_path) -> dict:
+    st = os.stat(project_path)
+    return {'size': int(st.st_size), 'mtime_ns': int(st.st_mtime_ns)}
+
+
+def _encode(header: dict, array=None) -> bytes:
+    payload = json.dumps(header, separators=(',', ':')).encode('utf-8') + b'\n'
+    if array is not None:
+        payload += np.ascontiguousarray(array, dtype='<f4').tobytes()
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _iter_records(buf: bytes):
+    """Yield ``(header, array, end_offset)`` for each intact record."""
+    pos = 0
+    while pos + _FRAME.size <= len(buf):
+        length, crc = _FRAME.unpack_from(buf, pos)
+        start = pos + _FRAME.size
+        payload = buf[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return  # torn tail from a crash
+        nl = payload.index(b'\n')
+        header = json.loads(payload[:nl].decode('utf-8'))
+        array = np.frombuffer(payload, dtype='<f4', offset=nl + 1) if len(payload) > nl + 1 else None
+        pos = start + length
+        yield header, array, pos
+
+
+def _read_valid(project_path):
+    """Intact records of a journal matching the project on disk, and where they end."""
+    try:
+        with open(journal_path_for(project_path), 'rb') as f:
+            buf = f.read()
+        signature = project_signature(project_path)
+    except OSError:
+        return None, 0
+    records = list(_iter_records(buf))
+    if not records:
+        return None, 0
+    base = records[0][0]
+    if base.get('op') != 'base' or base.get('project') != signature:
+        return None, 0
+    return [(h, a) for h, a, _end in records[1:]], records[-1][2]
+
+
+def read_journal(project_path) -> list:
+    """Valid ``(header, array)`` records for the project as it is on disk now."""
+    records, _end = _read_valid(project_path)
+    return records or []
+
+
+def _mix_state(track) -> dict:
+    return {
+        'volume': float(track.volume),
+        'muted': bool(track.muted),
+        'solo': bool(track.solo),
+        'start_frame': int(track.start_frame),
+    }
+
+
+def apply_journal(tracks, records) -> int:
+    """Replay journal records onto freshly loaded tracks; returns the number applied."""
+    applied = 0
+    for header, array in records:
+        op = header.get('op')
+        idx = int(header.get('track', -1))
+        if not 0 <= idx < len(tracks):
+            continue
+        track = tracks[idx]
+        if op == 'curve' and array is not None:
+            param = header.get('param')
+            curve = track.f0_edited if param == 'f0' else getattr(track, 'tension_edited', None)
+            if curve is None:
+                continue
+            start = int(header.get('start', 0))
+            end = min(len(curve), start + len(array))
+            if end <= start:
+                continue
+            curve[start:end] = array[:end - start]
+            if param == 'f0':
+                for (s, e), state in zip(track.segments, track.segment_states):
+                    if s < end and e > start:
+                        state['dirty'] = True
+            else:
+                track.mark_tension_dirty(start, end)
+            applied += 1
+        elif op == 'mix':
+            track.volume = float(header.get('volume', track.volume))
+            track.muted = bool(header.get('muted', track.muted))
+            track.solo = bool(header.get('solo', track.solo))
+            track.start_frame = int(header.get('start_frame', track.start_frame))
+            applied += 1
+    return applied
+
+
+def _changed_span(old: np.ndarray, new: np.ndarray):
+    """[start, end) covering every differing frame (NaN == NaN), or None."""
+    diff = old != new
+    diff &= ~(np.isnan(old) & np.isnan(new))
+    idx = np.flatnonzero(diff)
+    if len(idx) == 0:
+        return None
+    return int(idx[0]), int(idx[-1]) + 1
+
+
+class EditJournal:
+    """Journal writer for one saved project.
+
+    `record_changes(tracks, spans)` journals the curve ranges named in
+    `spans` plus any changed mix settings; its cost is proportional to the
+    edit, not to the project. Without `spans` every curve is diffed against
+    the last journaled state (a fallback for callers that don't know what
+    they changed). It returns False when the track list itself changed
+    (added/removed/converted tracks), which a journal cannot express: the
+    caller should save the project.
+    """
+
+    def __init__(self, project_path, tracks, fsync_interval: float = 1.0, max_batch: int = 64):
+        self.project_path = str(project_path)
+        self.path = journal_path_for(project_path)
+        self.fsync_interval = float(fsync_interval)
+        self.max_batch = int(max_batch)
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._snapshot = []
+
+        # Keep a journal that matches the project on disk (its records were
+        # replayed on load), minus any torn tail; otherwise start a new one.
+        records, end = _read_valid(self.project_path)
+        if records is not None:
+            self._f = open(self.path, 'r+b')
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            self._f = open(self.path, 'wb')
+            self._write_base()
+        self._take_snapshot(tracks)
+
+    def _write_base(self):
+        header = {'op': 'base', 'version': JOURNAL_VERSION, 'project': project_signature(self.project_path)}
+        self._f.write(_encode(header))
+        self.flush(force=True)
+
+    def _take_snapshot(self, tracks):
+        self._snapshot = []
+        for track in tracks:
+            f0 = track.f0_edited
+            tension = getattr(track, 'tension_edited', None)
+            self._snapshot.append({
+                'track': track,
+                'f0': None if f0 is None else np.array(f0, dtype=np.float32),
+                'tension': None if tension is None else np.array(tension, dtype=np.float32),
+                'mix': _mix_state(track),
+            })
+
+    @property
+    def size(self) -> int:
+        return self._f.tell() if self._f is not None else 0
+
+    def _record_curve(self, idx: int, param: str, curve, start=None, end=None) -> bool:
+        """Journal the changed part of `curve` within [start, end) (default: all of it)."""
+        old = self._snapshot[idx][param]
+        if curve is None or old is None:
+            return True
+        if len(curve) != len(old):
+            return False
+        start = 0 if start is None else max(0, int(start))
+        end = len(old) if end is None else min(len(old), int(end))
+        if end <= start:
+            return True
+        span = _changed_span(old[start:end], np.asarray(curve[start:end], dtype=np.float32))
+        if span is None:
+            return True
+        s, e = start + span[0], start + span[1]
+        old[s:e] = curve[s:e]
+        self._f.write(_encode({'op': 'curve', 'track': idx, 'param': param, 'start': s}, old[s:e]))
+        self._pending += 1
+        return True
+
+    def record_changes(self, tracks, spans=None) -> bool:
+        """Journal edits since the last record.
+
+        `spans` lists the edited ranges as ``(track, param, start, end)``
+        tuples, `param` being ``'f0'`` or ``'tension'`` and None bounds
+        meaning the whole curve; mix settings are always compared.
+        """
+        if self._f is None:
+            return True
+        if len(tracks) != len(self._snapshot) or any(s['track'] is not t for s, t in zip(self._snapshot, tracks)):
+            return False
+
+        if spans is None:
+            spans = [(track, param, None, None) for track in tracks for param in ('f0', 'tension')]
+        position = {id(track): idx for idx, track in enumerate(tracks)}
+        for track, param, start, end in spans:
+            idx = position.get(id(track))
+            if idx is None:
+                continue
+            curve = track.f0_edited if param == 'f0' else getattr(track, 'tension_edited', None)
+            if not self._record_curve(idx, param, curve, start, end):
+                return False
+
+        for idx, (snap, track) in enumerate(zip(self._snapshot, tracks)):
+            mix = _mix_state(track)
+            if mix != snap['mix']:
+                snap['mix'] = mix
+                self._f.write(_encode(dict({'op': 'mix', 'track': idx}, **mix)))
+                self._pending += 1
+
+        self.flush()
+        return True
+
+    def flush(self, force: bool = False):
+        """fsync pending records once the batch is full or old enough (always if `force`)."""
+        if self._f is None or (self._pending == 0 and not force):
+            return
+        now = time.monotonic()
+        if force or self._pending >= self.max_batch or now - self._last_sync >= self.fsync_interval:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._pending = 0
+            self._last_sync = now
+
+    def close(self):
+        if self._f is not None:
+            self.flush(force=True)
+            self._f.close()
+            self._f = None
+
+    def discard(self):
+        """Close and delete the journal (edits since the last save are dropped)."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,174 @@
+"""Headless batch renderer: load projects, synthesize and export without Qt.
+
+    python -m hifi_shifter.render song.hsp other.hsp --out renders --stems --format wav24 --workers 2
+
+Each project is written to ``<out>/<project name>.<ext>`` (mix) and
+``<out>/<project name>_stems/`` (stems). Projects run in separate worker
+processes; every worker keeps its `AudioProcessor` (and loaded model) across
+the projects it renders.
+"""
+
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import click
+
+from . import project_io
+from .audio_processing.export import (DEFAULT_EXPORT_FORMAT, EXPORT_FORMATS, export_mix, export_stems,
+                                      stem_paths)
+
+_PROCESSOR = None  # per worker process
+
+
+def _get_processor():
+    global _PROCESSOR
+    if _PROCESSOR is None:
+        from .audio_processor import AudioProcessor
+        _PROCESSOR = AudioProcessor()
+    return _PROCESSOR
+
+
+def _select_engine(processor, engine_name) -> str:
+    eng = (engine_name or 'hifigan').lower()
+    if eng not in ('hifigan', 'vslib'):
+        eng = 'hifigan'
+    if eng == 'vslib':
+        status = processor.vslib_status()
+        if not status.available:
+            print(f"| vslib unavailable ({status.error or 'unknown'}), falling back to hifigan.")
+            eng = 'hifigan'
+    processor.synthesis_engine = eng
+    return eng
+
+
+def render_project(project_path, out_dir, formats=(DEFAULT_EXPORT_FORMAT,), mix=True, stems=False,
+                   engine=None, stem_workers=None) -> dict:
+    """Render one project and return its timings and real-time factor (wall time / audio time)."""
+    project_path = pathlib.Path(project_path)
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    name = project_path.stem
+
+    t0 = time.perf_counter()
+    processor = _get_processor()
+    result = project_io.load_project(project_path, processor)
+    if result['loaded_model_path'] is None:
+        raise RuntimeError(f"Model not found: {result['data'].get('model_path')}")
+    for missing in result['missing_audio']:
+        print(f"| {name}: audio not found: {missing}")
+    tracks = result['tracks']
+    eng = _select_engine(processor, engine or result['engine'])
+    t_load = time.perf_counter()
+
+    project_io.synthesize_tracks(tracks, processor)
+    t_synth = time.perf_counter()
+
+    sr = processor.config['audio_sample_rate']
+    hop_size = processor.config['hop_size']
+    outputs = []
+    num_samples = 0
+    if mix:
+        buffers, starts, gains = project_io.mix_sources(tracks, sr, hop_size)
+        paths = stem_paths(out_dir, name, formats)
+        num_samples = export_mix(buffers, starts, gains, paths, sr)
+        if num_samples > 0:
+            outputs.extend(paths.values())
+    if stems:
+        stem_dir = out_dir / f"{name}_stems"
+        stem_dir.mkdir(exist_ok=True)
+        sources = project_io.stem_sources(tracks, sr, hop_size)
+        export_stems(sources, stem_dir, sr, formats, max_workers=stem_workers)
+        outputs.append(str(stem_dir))
+    if num_samples <= 0:
+        num_samples = max(
+            (t.start_frame * hop_size + len(t.synthesized_audio) for t in tracks if t.synthesized_audio is not None),
+            default=0,
+        )
+    t_end = time.perf_counter()
+
+    audio_seconds = num_samples / float(sr)
+    wall = t_end - t0
+    return {
+        'project': str(project_path),
+        'engine': eng,
+        'tracks': len(tracks),
+        'outputs': outputs,
+        'audio_seconds': audio_seconds,
+        'load_seconds': t_load - t0,
+        'synth_seconds': t_synth - t_load,
+        'export_seconds': t_end - t_synth,
+        'wall_seconds': wall,
+        'rtf': wall / audio_seconds if audio_seconds > 0 else float('nan'),
+    }
+
+
+def _report(stats: dict):
+    print(
+        f"| {pathlib.Path(stats['project']).name}: {stats['audio_seconds']:.1f}s audio, "
+        f"{stats['tracks']} tracks ({stats['engine']}) in {stats['wall_seconds']:.1f}s "
+        f"[load {stats['load_seconds']:.1f}s, synth {stats['synth_seconds']:.1f}s, "
+        f"export {stats['export_seconds']:.1f}s] RTF {stats['rtf']:.3f}"
+    )
+
+
+@click.command(help='Render HifiShifter projects (.hsp/.json) to audio files without the GUI.')
+@click.argument('projects', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--out', 'out_dir', required=True, type=click.Path(file_okay=False), help='Output directory')
+@click.option('--format', 'formats', multiple=True, type=click.Choice(list(EXPORT_FORMATS)),
+              default=(DEFAULT_EXPORT_FORMAT,), show_default=True, help='Output format (repeatable)')
+@click.option('--mix/--no-mix', default=True, show_default=True, help='Write the mixdown')
+@click.option('--stems', is_flag=True, help='Also write one file per vocal track')
+@click.option('--engine', type=click.Choice(['hifigan', 'vslib']), default=None,
+              help='Override the synthesis engine stored in the project')
+@click.option('--workers', type=int, default=1, show_default=True, help='Number of projects rendered concurrently')
+def main(projects, out_dir, formats, mix, stems, engine, workers):
+    if not mix and not stems:
+        raise click.UsageError('Nothing to do: use --mix and/or --stems.')
+    formats = list(dict.fromkeys(formats))
+    workers = max(1, min(int(workers), len(projects)))
+    # Split the CPU between concurrent projects for their stem writers
+    stem_workers = max(1, (os.cpu_count() or 4) // workers)
+
+    t0 = time.perf_counter()
+    failed = 0
+    total_audio = 0.0
+    kwargs = dict(out_dir=out_dir, formats=formats, mix=mix, stems=stems, engine=engine, stem_workers=stem_workers)
+    if workers == 1:
+        for project in projects:
+            try:
+                stats = render_project(project, **kwargs)
+            except Exception as e:
+                failed += 1
+                print(f"| {project}: failed: {e.__class__.__name__}: {e}")
+                continue
+            total_audio += stats['audio_seconds']
+            _report(stats)
+    else:
+        # spawn: CUDA and forked torch state do not mix
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = {pool.submit(render_project, project, **kwargs): project for project in projects}
+            for fut in as_completed(futures):
+                try:
+                    stats = fut.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"| {futures[fut]}: failed: {e.__class__.__name__}: {e}")
+                    continue
+                total_audio += stats['audio_seconds']
+                _report(stats)
+
+    wall = time.perf_counter() - t0
+    rtf = wall / total_audio if total_audio > 0 else float('nan')
+    print(f"| Rendered {len(projects) - failed}/{len(projects)} projects, "
+          f"{total_audio:.1f}s audio in {wall:.1f}s (overall RTF {rtf:.3f}, {workers} workers).")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,7 @@ class AudioBlockItem(pg.GraphicsObject):
         self.setAcceptedMouseButtons(Qt.MouseButton.LeftButton)
         
         self.waveform_path = None
+        self._waveform_path_key = None
         self._generate_waveform_path()
 
     def itemChange(self, change, value):
@@ -49,51 +50,57 @@ class AudioBlockItem(pg.GraphicsObject):
         return super().itemChange(change, value)
 
     def _generate_waveform_path(self):
-        self.waveform_path = QPainterPath()
-        
-        if self.track.audio is None or len(self.track.audio) == 0:
-            return
-            
-        audio = self.track.audio
-        num_frames = len(audio) / self.hop_size
-        width = num_frames
-        
-        # Normalize
-        mx = np.max(np.abs(audio))
-        if mx > 0:
-            audio = audio / mx
-            
-        # Downsample for visualization
-        # Reduce point count to improve performance
-        target_points = 1000 
-        step = max(1, int(len(audio) / target_points))
-        
-        # Calculate min/max envelope
-        # Reshape to (n_chunks, step)
-        n_chunks = len(audio) // step
-        if n_chunks > 0:
-            reshaped = audio[:n_chunks*step].reshape(n_chunks, step)
-            min_vals = np.min(reshaped, axis=1)
-            max_vals = np.max(reshaped, axis=1)
-            
-            x_step = width / n_chunks
-            
-            # Build path: Top edge (maxs) then Bottom edge (mins) in reverse
-            self.waveform_path.moveTo(0, 0) # Start center-ish (relative Y will be handled in paint)
-            
-            # Top points
-            for i in range(n_chunks):
-                x = i * x_step
-                y = -max_vals[i] # Negative because Y grows down, but we'll scale/translate later
-                self.waveform_path.lineTo(x, y)
-                
-            # Bottom points (reverse)
-            for i in range(n_chunks - 1, -1, -1):
-                x = i * x_step
-                y = -min_vals[i]
-                self.waveform_path.lineTo(x, y)
-                
-            self.waveform_path.closeSubpath()
+        """Drop the cached path; it is rebuilt lazily for the visible span in paint()."""
+        self.waveform_path = None
+        self._waveform_path_key = None
+
+    def _visible_waveform_path(self, scale_x):
+        """Build (or reuse) a path of the min/max peaks for the visible part of the clip.
+
+        The peaks level is picked from the current horizontal scale, so the
+        path always has about one point per pixel regardless of zoom.
+        """
+        peaks = self.track.get_waveform_peaks() if hasattr(self.track, 'get_waveform_peaks') else None
+        if peaks is None or peaks.num_samples == 0:
+            return None
+
+        width = peaks.num_samples / self.hop_size
+        x0, x1 = 0.0, width
+        vb = self.getViewBox()
+        if vb is not None:
+            try:
+                visible = self.mapRectFromView(vb.viewRect())
+                x0 = max(0.0, visible.left())
+                x1 = min(width, visible.right())
+            except Exception:
+                pass
+        if x1 <= x0:
+            return None
+
+        samples_per_px = self.hop_size / abs(scale_x) if abs(scale_x) > 0 else float(self.hop_size)
+        level = peaks.select_level(samples_per_px)
+        block = peaks.block_size(level) if level >= 0 else 1
+        # Quantise the span to blocks so small pans reuse the cached path
+        b0 = int(x0 * self.hop_size) // block - 1
+        b1 = int(np.ceil(x1 * self.hop_size / block)) + 1
+        key = (id(peaks), level, b0, b1)
+        if key == self._waveform_path_key:
+            return self.waveform_path
+
+        x, mins, maxs, level = peaks.span(b0 * block, b1 * block, samples_per_px)
+        path = QPainterPath()
+        if len(x) > 0:
+            norm = 1.0 / peaks.peak if peaks.peak > 0 else 1.0
+            xf = x / self.hop_size
+            # Y grows down: top edge is -max, bottom edge (reversed) is -min
+            xs = np.concatenate([xf, xf[::-1]])
+            ys = np.concatenate([-maxs, -mins[::-1]]).astype(np.float64) * norm
+            path = pg.arrayToQPath(xs, ys)
+            path.closeSubpath()
+
+        self.waveform_path = path
+        self._waveform_path_key = key
+        return path
 
     def paint(self, p, option, widget):
         # Calculate geometry in scene coords
@@ -162,17 +169,21 @@ class AudioBlockItem(pg.GraphicsObject):
         p.drawRoundedRect(rect, rx, ry)
         
         # Draw Waveform
-        if self.waveform_path:
+        waveform_path = self._visible_waveform_path(scale_x)
+        if waveform_path is not None:
             p.save()
             # Translate to center vertically and scale height
             p.translate(0, height / 2)
             p.scale(1, height * 0.4) # 80% height amplitude
             
-            p.setPen(Qt.PenStyle.NoPen)
+            # Cosmetic outline keeps zoomed-in (raw sample) waveforms visible
+            wave_pen = QPen(wave_color, 1)
+            wave_pen.setCosmetic(True)
+            p.setPen(wave_pen)
             p.setBrush(QBrush(wave_color))
             # Disable Antialiasing for waveform to improve performance
             p.setRenderHint(QPainter.RenderHint.Antialiasing, False)
-            p.drawPath(self.waveform_path)
+            p.drawPath(waveform_path)
             p.restore()
             
         # Draw Name Label
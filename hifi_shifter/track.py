@@ -1,9 +1,14 @@
+import os
+
 import numpy as np
-import sounddevice as sd
-import scipy.io.wavfile as wavfile
 import torch
 import torchaudio
 
+from .waveform_peaks import WaveformPeaks
+from .project_container import file_sha1
+from .audio_processing.tension_fx import apply_tension_tilt_pd, update_tension_tilt_pd
+from . import config_manager
+
 class Track:
     def __init__(self, name, file_path, track_type='vocal'):
         self.name = name
@@ -42,6 +47,15 @@ class Track:
         self.synth_version = 0
         self._tension_processed_audio = None
         self._tension_processed_key = None
+        # f0-frame ranges [start, end) changed since _tension_processed_audio
+        # was rendered; None means it must be rebuilt from scratch.
+        self._tension_dirty_ranges = None
+        self._waveform_peaks = None
+        self._source_sha1 = None  # (size, mtime_ns, sha1) of the source file
+        # Persistent VSLIB project for this track and what it was opened for
+        self._vslib_session = None
+        self._vslib_session_key = None
+
 
 
     def load(self, processor):
@@ -60,6 +74,7 @@ class Track:
                 self.synth_version = 0
                 self._tension_processed_audio = None
                 self._tension_processed_key = None
+                self._tension_dirty_ranges = None
 
                 # Initialize segment states
 
@@ -84,17 +99,154 @@ class Track:
                 self.sr = sr
                 self.synthesized_audio = self.audio
 
-            # Ensure start_frame is initialized correctly
-            self.start_frame = int(self.start_frame) if self.start_frame is not None else 0
+            self._finish_load()
+
+        except Exception as e:
+            raise ValueError(f"Failed to load track: {e}")
+
+    def _finish_load(self):
+        # A new source needs a new VSLIB project
+        self.close_vslib_session()
+
+        # Build the display LOD pyramid here (load runs off the UI thread);
+        # it is cached on disk per source file, so reopening is cheap.
+        self._waveform_peaks = WaveformPeaks.for_file(
+            self.file_path, self.audio, self.sr, cache_dir=config_manager.get_cache_dir('peaks')
+        )
+
+        # Ensure start_frame is initialized correctly
+        self.start_frame = int(self.start_frame) if self.start_frame is not None else 0
+
+        # Ensure segments are valid and not None
+        self.segments = self.segments if self.segments is not None else []
+
+        # Validate segments to ensure they are non-empty and valid
+        self.segments = [(max(0, start), max(start, end)) for start, end in self.segments if start is not None and end is not None]
+
+    def source_sha1(self):
+        """Content hash of the source audio file (memoised per size/mtime); None if unreadable."""
+        try:
+            st = os.stat(self.file_path)
+        except (OSError, TypeError):
+            return None
+        cached = self._source_sha1
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
+        digest = file_sha1(self.file_path)
+        self._source_sha1 = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def to_cache(self, include_render: bool = True) -> dict:
+        """Decoded audio, extracted features and (if fully synthesized) the dry render, for project bundles."""
+        cache = {'sr': int(self.sr), 'audio': np.asarray(self.audio, dtype=np.float32)}
+        if self.track_type == 'vocal' and self.mel is not None:
+            cache['mel'] = self.mel.detach().cpu().numpy().astype(np.float32)
+            cache['f0_original'] = np.asarray(self.f0_original)
+            cache['segments'] = np.asarray(self.segments, dtype=np.int64).reshape(-1, 2)
+            clean = all(not state.get('dirty') for state in self.segment_states)
+            if include_render and clean and self.synthesized_audio is not None:
+                cache['render'] = np.asarray(self.synthesized_audio, dtype=np.float32)
+        return cache
+
+    def load_from_cache(self, cache: dict, use_render: bool = False):
+        """Restore what `load()` would compute from a bundle cache (arrays are copied out of the file)."""
+        self.sr = int(cache['sr'])
+        self.audio = np.array(cache['audio'], dtype=np.float32)
+        if self.track_type == 'vocal':
+            self.mel = torch.from_numpy(np.array(cache['mel'], dtype=np.float32))
+            self.f0_original = np.array(cache['f0_original'])
+            self.f0_edited = self.f0_original.copy()
+            self.tension_edited = np.zeros_like(self.f0_edited, dtype=np.float32)
+            self.tension_version = 0
+            self.synth_version = 0
+            self._tension_processed_audio = None
+            self._tension_processed_key = None
+            self._tension_dirty_ranges = None
+            self.segments = [(int(s), int(e)) for s, e in np.asarray(cache['segments']).reshape(-1, 2)]
+            render = cache.get('render') if use_render else None
+            if render is not None and len(render) == len(self.audio):
+                # Segment audio stays None: update_full_audio only splices
+                # segments that are synthesized again after an edit.
+                self.synthesized_audio = np.array(render, dtype=np.float32)
+                self.segment_states = [{'dirty': False, 'audio': None} for _ in self.segments]
+            else:
+                self.synthesized_audio = None
+                self.segment_states = [{'dirty': True, 'audio': None} for _ in self.segments]
+        else:
+            self.synthesized_audio = self.audio
+        self._finish_load()
+
+    def mark_tension_dirty(self, start=None, end=None):
+        """Record a tension edit on f0 frames [start, end) (no range: everything)."""
+        self.tension_version += 1
+        self._note_fx_dirty(start, end)
+
+    def _note_fx_dirty(self, start=None, end=None):
+        """Remember which part of the cached post-FX audio is stale."""
+        if start is None or end is None:
+            self._tension_dirty_ranges = None
+            return
+        ranges = self._tension_dirty_ranges
+        if ranges is None:
+            return
+        start, end = int(start), int(end)
+        # Brush strokes arrive as many adjacent ranges: extend instead of append
+        if ranges and start <= ranges[-1][1] and end >= ranges[-1][0]:
+            ranges[-1] = (min(start, ranges[-1][0]), max(end, ranges[-1][1]))
+        else:
+            ranges.append((start, end))
+
+    def get_audio_for_mix(self, sr, hop_size):
+        """Return audio for mixing/export, with tension post-FX applied for vocal tracks.
+
+        The processed buffer is cached; after edits only the dirty frame
+        ranges are re-rendered and spliced into it.
+        """
+        audio = self.synthesized_audio
+        if audio is None or self.track_type != 'vocal':
+            return audio
 
-            # Ensure segments are valid and not None
-            self.segments = self.segments if self.segments is not None else []
+        tension = self.tension_edited
+        f0 = self.f0_edited
+        if tension is None or f0 is None:
+            return audio
 
-            # Validate segments to ensure they are non-empty and valid
-            self.segments = [(max(0, start), max(start, end)) for start, end in self.segments if start is not None and end is not None]
+        # Skip if neutral
+        try:
+            if np.nanmax(np.abs(tension)) < 1e-6:
+                return audio
+        except Exception:
+            return audio
 
+        cached = self._tension_processed_audio
+        ranges = self._tension_dirty_ranges
+        try:
+            if cached is not None and ranges is not None and len(cached) == len(audio):
+                if ranges:
+                    update_tension_tilt_pd(cached, audio, sr, f0, tension, hop_size, ranges)
+            else:
+                cached = apply_tension_tilt_pd(audio, sr, f0, tension, hop_size)
+                if np.shares_memory(cached, audio):
+                    cached = np.array(cached, dtype=np.float32, copy=True)
         except Exception as e:
-            raise ValueError(f"Failed to load track: {e}")
+            # Fail-safe: don't break playback/export
+            print(f"Tension post-FX failed: {e}")
+            return audio
+
+        self._tension_processed_audio = cached
+        self._tension_processed_key = (self.synth_version, self.tension_version)
+        self._tension_dirty_ranges = []
+        return cached
+
+    def get_waveform_peaks(self):
+        """Return the min/max LOD pyramid of the original audio (built lazily)."""
+        if self.audio is None:
+            return None
+        peaks = self._waveform_peaks
+        if peaks is None or peaks.num_samples != len(self.audio):
+            peaks = WaveformPeaks(self.audio)
+            self._waveform_peaks = peaks
+        return peaks
 
     def synthesize_segment(self, processor, segment_idx):
         if self.track_type != 'vocal':
@@ -104,24 +256,7 @@ class Track:
             return
 
         if getattr(processor, 'synthesis_engine', 'hifigan') == 'vslib':
-            # For vslib, synthesize the entire track once to avoid repeated DLL calls
-            hop_size = int(processor.config.get('hop_size', 512)) if processor.config else 512
-            full_audio = processor.synthesize_full_vslib(
-                self.audio,
-                self.sr,
-                self.f0_original,
-                self.f0_edited,
-            )
-            self.synthesized_audio = full_audio
-            for i, (s, e) in enumerate(self.segments):
-                expected_len = (e - s) * hop_size
-                start_sample = s * hop_size
-                end_sample = start_sample + expected_len
-                seg_audio = full_audio[start_sample:end_sample]
-                if len(seg_audio) < expected_len:
-                    seg_audio = np.pad(seg_audio, (0, expected_len - len(seg_audio)), constant_values=0.0)
-                self.segment_states[i]['audio'] = seg_audio.astype(np.float32)
-                self.segment_states[i]['dirty'] = False
+            self._synthesize_vslib(processor)
             return
 
         start, end = self.segments[segment_idx]
@@ -130,6 +265,62 @@ class Track:
         audio_segment = processor.synthesize_segment(self.mel, self.segments[segment_idx], f0_segment)
         self.segment_states[segment_idx]['audio'] = audio_segment
         self.segment_states[segment_idx]['dirty'] = False
+        # Post-FX cache is stale where the dry audio changes
+        hop_size = int(processor.config.get('hop_size', 512)) if processor.config else 512
+        self._note_fx_dirty(start, max(end, start + -(-len(audio_segment) // hop_size)))
+
+    def _synthesize_vslib(self, processor):
+        """Resynthesize every dirty segment with the track's VSLIB session in one pass.
+
+        When everything is dirty (first render, engine switch) the whole mix
+        is fetched, since VSLIB also fills the gaps between segments; after
+        that only the sample ranges of dirty segments are fetched.
+        """
+        hop_size = int(processor.config.get('hop_size', 512)) if processor.config else 512
+        session = self._get_vslib_session(processor)
+        dirty = [i for i, state in enumerate(self.segment_states) if state['dirty']]
+
+        if self.synthesized_audio is None or len(dirty) == len(self.segments):
+            full_audio = processor.synthesize_full_vslib(
+                self.audio,
+                self.sr,
+                self.f0_original,
+                self.f0_edited,
+                session=session,
+            )
+            self.synthesized_audio = full_audio
+            ranges = [(s * hop_size, (e - s) * hop_size) for s, e in self.segments]
+            seg_audios = [full_audio[offset:offset + length] for offset, length in ranges]
+            dirty = list(range(len(self.segments)))
+            self._note_fx_dirty()
+        else:
+            ranges = [(self.segments[i][0] * hop_size, (self.segments[i][1] - self.segments[i][0]) * hop_size)
+                      for i in dirty]
+            seg_audios = processor.synthesize_vslib_ranges(session, self.f0_original, self.f0_edited, ranges)
+
+        for i, (_offset, expected_len), seg_audio in zip(dirty, ranges, seg_audios):
+            if len(seg_audio) < expected_len:
+                seg_audio = np.pad(seg_audio, (0, expected_len - len(seg_audio)), constant_values=0.0)
+            self.segment_states[i]['audio'] = seg_audio.astype(np.float32)
+            self.segment_states[i]['dirty'] = False
+            start, end = self.segments[i]
+            self._note_fx_dirty(start, end)
+
+    def _get_vslib_session(self, processor):
+        """The track's VSLIB session, (re)opened when the processor or source audio changed."""
+        key = (id(processor), self.sr, id(self.audio))
+        session = self._vslib_session
+        if session is None or session.closed or self._vslib_session_key != key:
+            self.close_vslib_session()
+            self._vslib_session = processor.open_vslib_session(self.audio, self.sr)
+            self._vslib_session_key = key
+        return self._vslib_session
+
+    def close_vslib_session(self):
+        if self._vslib_session is not None:
+            self._vslib_session.close()
+        self._vslib_session = None
+        self._vslib_session_key = None
 
     def get_audio_for_playback(self):
         """
@@ -176,8 +367,13 @@ class Track:
         if self.track_type == 'bgm':
             return
 
+        # Copy-on-write: splice into a new buffer and publish it with a single
+        # reference assignment, so a playback mixer still holding the previous
+        # buffer never sees a half-written one.
         if self.synthesized_audio is None:
-            self.synthesized_audio = np.zeros_like(self.audio)
+            new_audio = np.zeros_like(self.audio)
+        else:
+            new_audio = self.synthesized_audio.copy()
             
         for i, (start, end) in enumerate(self.segments):
             seg_audio = self.segment_states[i]['audio']
@@ -186,17 +382,17 @@ class Track:
                 e_sample = s_sample + len(seg_audio)
                 
                 # Ensure bounds
-                if e_sample > len(self.synthesized_audio):
-                    e_sample = len(self.synthesized_audio)
+                if e_sample > len(new_audio):
+                    e_sample = len(new_audio)
                     seg_audio = seg_audio[:e_sample-s_sample]
                 
-                self.synthesized_audio[s_sample:e_sample] = seg_audio
+                new_audio[s_sample:e_sample] = seg_audio
+
+        self.synthesized_audio = new_audio
         
         # Ensure start_frame is always an integer
         self.start_frame = int(self.start_frame) if self.start_frame is not None else 0
 
-        # Invalidate post-FX cache whenever synthesis output updates
+        # Synthesis output changed; the post-FX cache is patched lazily for the
+        # resynthesized ranges (see synthesize_segment / get_audio_for_mix)
         self.synth_version += 1
-        self._tension_processed_audio = None
-        self._tension_processed_key = None
-
@@ -0,0 +1,322 @@
+"""VocalShifter project (.vshp / .vsp) parser.
+
+The file is memory-mapped and its chunks are walked once. Every chunk
+starts on an 8-byte boundary, so the chunk tags of the whole file are
+located with one vectorised scan, and unknown data is skipped by jumping to
+the next known tag instead of stepping 8 bytes at a time. The tuning points
+(Ctrp chunks) following each Itmp chunk are decoded in bulk as a numpy
+structured array.
+
+Layout (little endian; sizes include the 8-byte ``tag + version`` header):
+
+- file header, 16 bytes: ``VSPD`` ... ``u32 file_size`` at 12
+- ``PRJP`` 0x108: sample rate, time signature, BPM
+- ``TRKP`` 0x108: track name, volume, mute, solo
+- ``ITMP`` 0x208: audio item path, track index, start position (samples)
+- ``Itmp`` 0x108 followed by ``Ctrp`` 0x68 × N: tuning points of the
+  n-th audio item, one every 5 ms
+
+No Qt here: parsing runs in a background task.
+"""
+
+import locale
+import mmap
+import os
+
+import numpy as np
+
+HEADER_SIZE = 16
+PRJP_SIZE = 0x108
+TRKP_SIZE = 0x108
+ITMP_SIZE = 0x208
+ITMP_TUNING_SIZE = 0x108
+CTRP_SIZE = 0x68
+TUNING_INTERVAL_SEC = 0.005  # one Ctrp point per 5 ms
+
+SUPPORTED_AUDIO_EXTENSIONS = {'.wav', '.flac', '.mp3'}
+
+
+def _tag(name: bytes) -> int:
+    return int(np.frombuffer(name, dtype='<u4')[0])
+
+
+_TAG_PRJP = _tag(b'PRJP')
+_TAG_TRKP = _tag(b'TRKP')
+_TAG_ITMP = _tag(b'ITMP')
+_TAG_ITMP_TUNING = _tag(b'Itmp')
+_TAG_CTRP = _tag(b'Ctrp')
+_KNOWN_TAGS = np.array([_TAG_PRJP, _TAG_TRKP, _TAG_ITMP, _TAG_ITMP_TUNING], dtype=np.uint32)
+
+# One tuning point; offsets are from the start of the chunk (header included)
+CTRP_DTYPE = np.dtype({
+    'names': ['disabled', 'pitch_cents'],
+    'formats': ['<i2', '<i2'],
+    'offsets': [8 + 18, 8 + 22],
+    'itemsize': CTRP_SIZE,
+})
+
+
+class VshpFormatError(ValueError):
+    """The file is not a VocalShifter project."""
+
+
+def _cstr(buf, start: int, length: int) -> str:
+    raw = bytes(buf[start:start + length]).split(b'\x00', 1)[0]
+    return raw.decode(locale.getpreferredencoding(), errors='replace')
+
+
+def _scalar(buf, offset: int, dtype: str):
+    return np.frombuffer(buf, dtype=dtype, count=1, offset=offset)[0].item()
+
+
+def parse_vshp(file_path) -> dict:
+    """Parse a VocalShifter project.
+
+    Returns a dict with:
+
+    - ``project``: ``sample_rate``, ``beats_per_bar``, ``beat_unit``, ``bpm``
+      (empty if there is no PRJP chunk)
+    - ``tracks``: list of ``name``, ``volume``, ``muted``, ``solo``
+    - ``items``: audio items in file order: ``file_path`` (as stored),
+      ``track_index``, ``start_position_samples`` and ``tuning`` (a
+      `CTRP_DTYPE` array; empty when the item has no tuning data)
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise VshpFormatError("empty file")
+    try:
+        return _parse(mm)
+    finally:
+        mm.close()
+
+
+def _parse(mm) -> dict:
+    if len(mm) < HEADER_SIZE or mm[:4] != b'VSPD':
+        raise VshpFormatError("missing VSPD header")
+    file_size = min(_scalar(mm, 12, '<u4'), len(mm))
+
+    # Tag of every 8-byte word; chunks only ever start on such a word
+    n_words = (file_size - HEADER_SIZE) // 8
+    tags = np.frombuffer(mm, dtype='<u4', count=2 * n_words, offset=HEADER_SIZE)[0::2]
+    known = np.flatnonzero(np.isin(tags, _KNOWN_TAGS))
+
+    project = {}
+    tracks = []
+    items = []
+    tunings = []
+
+    k = 0
+    while k < len(known):
+        word = int(known[k])
+        off = HEADER_SIZE + 8 * word
+        tag = int(tags[word])
+
+        if tag == _TAG_PRJP and off + PRJP_SIZE <= file_size:
+            d = off + 8
+            project = {
+                'sample_rate': _scalar(mm, d + 16, '<u4'),
+                'beats_per_bar': _scalar(mm, d + 20, '<u4'),
+                'beat_unit': _scalar(mm, d + 24, '<u4'),
+                'bpm': _scalar(mm, d + 32, '<f8'),
+            }
+            size = PRJP_SIZE
+        elif tag == _TAG_TRKP and off + TRKP_SIZE <= file_size:
+            d = off + 8
+            tracks.append({
+                'name': _cstr(mm, d, 64),
+                'volume': _scalar(mm, d + 64, '<f8'),
+                'muted': _scalar(mm, d + 80, '<u4') == 1,
+                'solo': _scalar(mm, d + 84, '<u4') == 1,
+            })
+            size = TRKP_SIZE
+        elif tag == _TAG_ITMP and off + ITMP_SIZE <= file_size:
+            d = off + 8
+            items.append({
+                'file_path': _cstr(mm, d, 0x108),
+                'track_index': _scalar(mm, d + 0x108, '<u4'),
+                'start_position_samples': _scalar(mm, d + 0x110, '<f8'),
+            })
+            size = ITMP_SIZE
+        elif tag == _TAG_ITMP_TUNING and off + ITMP_TUNING_SIZE <= file_size:
+            # Count the run of Ctrp chunks right after it (stride 0x68 = 13 words)
+            first = word + ITMP_TUNING_SIZE // 8
+            stride = CTRP_SIZE // 8
+            run_tags = tags[first::stride]
+            not_ctrp = np.flatnonzero(run_tags != _TAG_CTRP)
+            n = int(not_ctrp[0]) if len(not_ctrp) else len(run_tags)
+            n = min(n, (file_size - (off + ITMP_TUNING_SIZE)) // CTRP_SIZE)
+            tunings.append(np.frombuffer(mm, dtype=CTRP_DTYPE, count=n, offset=off + ITMP_TUNING_SIZE).copy())
+            size = ITMP_TUNING_SIZE + n * CTRP_SIZE
+        else:
+            # Truncated chunk: treat as unknown data
+            k += 1
+            continue
+
+        # Jump to the first known tag after this chunk
+        k = int(np.searchsorted(known, word + size // 8))
+
+    # The n-th Itmp block carries the tuning of the n-th ITMP item
+    empty = np.zeros(0, dtype=CTRP_DTYPE)
+    for i, item in enumerate(items):
+        item['tuning'] = tunings[i] if i < len(tunings) else empty
+
+    return {'project': project, 'tracks': tracks, 'items': items}
+
+
+def resolve_item_path(raw_path: str, project_dir: str):
+    """Locate an item's audio file: as stored, relative to the project, or by name next to it."""
+    path = raw_path if os.path.isabs(raw_path) else os.path.join(project_dir, raw_path)
+    if os.path.exists(path):
+        return path
+    alt_path = os.path.join(project_dir, os.path.basename(raw_path))
+    if os.path.exists(alt_path):
+        return alt_path
+    return None
+
+
+def item_track_name(items, tracks, i: int) -> str:
+    """HifiShifter track name for item `i` (numbered when its track holds several items)."""
+    track_index = items[i]['track_index']
+    if track_index < len(tracks):
+        name = tracks[track_index]['name']
+        if sum(1 for it in items if it['track_index'] == track_index) > 1:
+            return f"{name}_{i + 1}"
+        return name
+    return f"Track_{i + 1}"
+
+
+def _mark_changed_segments(track, old: np.ndarray):
+    """Mark dirty only the segments whose pitch differs from `old`; returns how many."""
+    new = track.f0_edited
+    diff = old != new
+    diff &= ~(np.isnan(old) & np.isnan(new))
+    changed = np.flatnonzero(diff)
+    if len(changed) == 0 or not track.segments:
+        return 0
+    bounds = np.asarray(track.segments, dtype=np.int64).reshape(-1, 2)
+    # A segment is touched if a changed frame falls in [start, end)
+    hits = np.searchsorted(changed, bounds[:, 1]) > np.searchsorted(changed, bounds[:, 0])
+    for state, hit in zip(track.segment_states, hits):
+        if hit:
+            state['dirty'] = True
+    return int(hits.sum())
+
+
+def _restore_original(track, frames: np.ndarray):
+    """Reset `frames` of the edited pitch to the original pitch (where one exists)."""
+    if track.f0_original is None:
+        return
+    frames = frames[frames < len(track.f0_original)]
+    track.f0_edited[frames] = track.f0_original[frames]
+
+
+def apply_tuning_samples(track, tuning, hop_size: int, sr=None) -> int:
+    """Apply an item's tuning points to ``track.f0_edited``.
+
+    Points are `TUNING_INTERVAL_SEC` apart and linearly interpolated onto
+    the hop-size frames; past the last point its value is held. Frames at a
+    disabled point keep the original pitch, frames just before one hold the
+    previous point. Returns the number of segments marked for resynthesis.
+    """
+    if tuning is None or len(tuning) == 0 or track.f0_edited is None:
+        return 0
+    sr = track.sr or sr
+    n = len(tuning)
+    disabled = tuning['disabled'] == 1
+    midi = tuning['pitch_cents'] / 100.0  # 0 = C-1 = MIDI 0
+    old = np.array(track.f0_edited, copy=True)
+
+    audio_duration = len(track.audio) / sr if track.audio is not None else 0
+    frame_time = np.arange(len(track.f0_edited)) * hop_size / sr
+    frames = np.flatnonzero(frame_time <= audio_duration)
+    frame_time = frame_time[frames]
+
+    k = np.minimum((frame_time / TUNING_INTERVAL_SEC).astype(np.int64), n - 1)
+    values = np.interp(frame_time, np.arange(n) * TUNING_INTERVAL_SEC, midi)
+    next_disabled = np.zeros(len(k), dtype=bool)
+    inner = k < n - 1
+    next_disabled[inner] = disabled[k[inner] + 1]
+    values = np.where(next_disabled, midi[k], values)
+
+    use_original = disabled[k]
+    edit = ~use_original
+    track.f0_edited[frames[edit]] = values[edit]
+    _restore_original(track, frames[use_original])
+    return _mark_changed_segments(track, old)
+
+
+# Clipboard records written by VocalShifter: 16 little-endian doubles each
+CLIPBOARD_RECORD_SIZE = 0x80
+CLIPBOARD_DTYPE = np.dtype({
+    'names': ['time', 'disabled', 'pitch_cents'],
+    'formats': ['<f8', '<f8', '<f8'],
+    'offsets': [0, 8, 16],
+    'itemsize': CLIPBOARD_RECORD_SIZE,
+})
+
+
+def clipboard_path() -> str:
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), 'vocalshifter_tmp', 'vocalshifter_id.clb')
+
+
+def read_clipboard(file_path) -> np.ndarray:
+    """Decode a VocalShifter clipboard file into a `CLIPBOARD_DTYPE` array.
+
+    Raises `VshpFormatError` if the size is not a whole number of records.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if len(data) % CLIPBOARD_RECORD_SIZE != 0:
+        raise VshpFormatError("clipboard size is not a multiple of 0x80")
+    return np.frombuffer(data, dtype=CLIPBOARD_DTYPE)
+
+
+def apply_clipboard(track, records: np.ndarray, hop_size: int, sr=None) -> int:
+    """Apply clipboard points to ``track.f0_edited``.
+
+    Each frame takes the nearest point (the earlier one on ties) if it lies
+    within one hop; disabled points restore the original pitch. Returns the
+    number of segments marked for resynthesis.
+    """
+    if records is None or len(records) == 0 or track.f0_edited is None:
+        return 0
+    sr = track.sr or sr
+    order = np.argsort(records['time'], kind='stable')
+    times = records['time'][order]
+    disabled = records['disabled'][order] == 1.0
+    midi = records['pitch_cents'][order] / 100.0
+    old = np.array(track.f0_edited, copy=True)
+
+    frame_time = np.arange(len(track.f0_edited)) * hop_size / sr
+    right = np.searchsorted(times, frame_time, side='left')
+    left = np.maximum(right - 1, 0)
+    # First point of an equal-time run wins, as it comes first in sorted order
+    left = np.searchsorted(times, times[left], side='left')
+    right_c = np.minimum(right, len(times) - 1)
+    d_left = np.abs(frame_time - times[left])
+    d_right = np.abs(frame_time - times[right_c])
+    nearest = np.where(d_right < d_left, right_c, left)
+    dist = np.minimum(d_left, d_right)
+
+    frames = np.flatnonzero(dist < hop_size / sr)
+    nearest = nearest[frames]
+    use_original = disabled[nearest]
+    edit = ~use_original
+    track.f0_edited[frames[edit]] = midi[nearest[edit]]
+    _restore_original(track, frames[use_original])
+    return _mark_changed_segments(track, old)
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    for path in sys.argv[1:]:
+        t0 = time.perf_counter()
+        result = parse_vshp(path)
+        dt = (time.perf_counter() - t0) * 1000.0
+        n_points = sum(len(it['tuning']) for it in result['items'])
+        print(f"{path}: {len(result['tracks'])} tracks, {len(result['items'])} items, "
+              f"{n_points} tuning points in {dt:.2f} ms")
@@ -0,0 +1,214 @@
+"""Level-of-detail helpers for drawing waveforms and parameter curves.
+
+Everything here is plain numpy so it can be used from worker threads.
+The GUI only ever asks for the visible span at (roughly) pixel resolution,
+so the cost of a redraw depends on the viewport width, not the track length.
+"""
+
+import hashlib
+import os
+import pathlib
+
+import numpy as np
+
+PEAKS_FORMAT_VERSION = 1
+
+
+class WaveformPeaks:
+    """Min/max envelope of an audio buffer at power-of-two resolutions.
+
+    Level ``k`` stores one (min, max) pair per ``base_block * 2**k`` samples.
+    Requests finer than ``base_block`` samples per pixel are served from the
+    raw audio directly.
+    """
+
+    def __init__(self, audio: np.ndarray, base_block: int = 32, levels=None):
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        self.audio = audio
+        self.base_block = int(base_block)
+        self.num_samples = int(len(audio))
+        self.levels = []  # list of (mins, maxs), level 0 first
+        self.peak = 0.0  # max |sample|, used to normalise clip drawings
+
+        if levels is not None:
+            self.levels = [(np.asarray(lo, dtype=np.float32), np.asarray(hi, dtype=np.float32)) for lo, hi in levels]
+            self._update_peak()
+            return
+
+        n_blocks = self.num_samples // self.base_block
+        if n_blocks <= 0:
+            if self.num_samples > 0:
+                self.peak = float(np.max(np.abs(audio)))
+            return
+
+        body = audio[:n_blocks * self.base_block].reshape(n_blocks, self.base_block)
+        mins = body.min(axis=1)
+        maxs = body.max(axis=1)
+        tail = audio[n_blocks * self.base_block:]
+        if len(tail) > 0:
+            mins = np.append(mins, tail.min())
+            maxs = np.append(maxs, tail.max())
+        self.levels.append((mins, maxs))
+
+        while len(mins) > 1:
+            if len(mins) % 2:
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.levels.append((mins, maxs))
+        self._update_peak()
+
+    def _update_peak(self):
+        if self.levels:
+            lo, hi = self.levels[-1]
+            self.peak = float(max(-float(np.min(lo)), float(np.max(hi)), 0.0))
+
+    # ---- Disk cache (like DAW ".peaks" files) ----
+    @staticmethod
+    def cache_path_for(file_path, sr: int, num_samples: int, cache_dir, base_block: int = 32):
+        """Cache file for ``file_path`` decoded at ``sr``; None if the file is not on disk."""
+        try:
+            st = os.stat(file_path)
+        except (OSError, TypeError):
+            return None
+        key = "|".join([
+            str(pathlib.Path(file_path).resolve()), str(st.st_size), str(st.st_mtime_ns),
+            str(int(sr)), str(int(num_samples)), str(int(base_block)), str(PEAKS_FORMAT_VERSION),
+        ])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return pathlib.Path(cache_dir) / f"{digest}.peaks.npz"
+
+    def save(self, path):
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {'base_block': np.int64(self.base_block), 'num_samples': np.int64(self.num_samples)}
+        for i, (lo, hi) in enumerate(self.levels):
+            arrays[f'min_{i}'] = lo
+            arrays[f'max_{i}'] = hi
+        # Write then rename so a crash never leaves a truncated cache file behind
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, audio: np.ndarray):
+        with np.load(path) as data:
+            if int(data['num_samples']) != len(audio):
+                raise ValueError("peaks cache does not match audio length")
+            n_levels = sum(1 for k in data.files if k.startswith('min_'))
+            levels = [(data[f'min_{i}'], data[f'max_{i}']) for i in range(n_levels)]
+            base_block = int(data['base_block'])
+        return cls(audio, base_block=base_block, levels=levels)
+
+    @classmethod
+    def for_file(cls, file_path, audio: np.ndarray, sr: int, cache_dir=None):
+        """Load peaks for a decoded audio file from the disk cache, or compute and store them."""
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = cls.cache_path_for(file_path, sr, len(audio), cache_dir)
+        if cache_path is not None and cache_path.exists():
+            try:
+                return cls.load(cache_path, audio)
+            except Exception:
+                pass  # stale/corrupt cache: recompute below
+
+        peaks = cls(audio)
+        if cache_path is not None:
+            try:
+                peaks.save(cache_path)
+            except Exception as e:
+                print(f"Failed to write peaks cache: {e}")
+        return peaks
+
+    def block_size(self, level: int) -> int:
+        return self.base_block << int(level)
+
+    def select_level(self, samples_per_pixel: float) -> int:
+        """Return the coarsest level not coarser than one pixel, or -1 for raw samples."""
+        if not self.levels or samples_per_pixel < self.base_block:
+            return -1
+        level = int(np.floor(np.log2(samples_per_pixel / float(self.base_block))))
+        return int(min(max(level, 0), len(self.levels) - 1))
+
+    def span(self, start: int, end: int, samples_per_pixel: float):
+        """Return ``(x, mins, maxs, level)`` covering samples ``[start, end)``.
+
+        ``x`` is in samples (block centres). At level -1 (raw samples)
+        ``mins`` and ``maxs`` are the same slice of the audio.
+        """
+        start = int(max(0, start))
+        end = int(min(self.num_samples, end))
+        if end <= start:
+            empty = np.zeros(0, dtype=np.float32)
+            return np.zeros(0, dtype=np.float64), empty, empty, -1
+
+        level = self.select_level(samples_per_pixel)
+        if level < 0:
+            x = np.arange(start, end, dtype=np.float64)
+            seg = self.audio[start:end]
+            return x, seg, seg, -1
+
+        block = self.block_size(level)
+        mins, maxs = self.levels[level]
+        b0 = start // block
+        b1 = min(len(mins), -(-end // block))
+        x = (np.arange(b0, b1, dtype=np.float64) + 0.5) * block
+        return x, mins[b0:b1], maxs[b0:b1], level
+
+    def envelope(self, start: int, end: int, samples_per_pixel: float):
+        """Return ``(x, y)`` covering samples ``[start, end)``.
+
+        ``x`` is in samples. For block levels each block contributes a
+        (min, max) pair at the same x, which draws as a vertical stroke.
+        """
+        x, mins, maxs, level = self.span(start, end, samples_per_pixel)
+        if level < 0:
+            return x, mins
+
+        y = np.empty(2 * len(x), dtype=np.float32)
+        y[0::2] = mins
+        y[1::2] = maxs
+        return np.repeat(x, 2), y
+
+
+def decimate_curve(values: np.ndarray, start: int, end: int, max_points: int):
+    """Min/max-decimate ``values[start:end]`` to about ``max_points`` points.
+
+    NaN marks unvoiced/undefined regions and is preserved: a bucket is NaN
+    only when all of its values are NaN, so ``connect="finite"`` still
+    breaks the curve at gaps. Returns ``(x, y)`` with ``x`` in array indices.
+    """
+    start = int(max(0, start))
+    end = int(min(len(values), end))
+    if end <= start:
+        return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float32)
+
+    seg = np.asarray(values[start:end], dtype=np.float32)
+    n = len(seg)
+    bucket = int(np.ceil(n / max(1, int(max_points) // 2)))
+    if bucket <= 2:
+        return np.arange(start, end, dtype=np.float64), seg
+
+    n_buckets = -(-n // bucket)
+    padded = np.full(n_buckets * bucket, np.nan, dtype=np.float32)
+    padded[:n] = seg
+    padded = padded.reshape(n_buckets, bucket)
+
+    nan = np.isnan(padded)
+    all_nan = nan.all(axis=1)
+    lo = np.where(nan, np.inf, padded).min(axis=1)
+    hi = np.where(nan, -np.inf, padded).max(axis=1)
+    lo[all_nan] = np.nan
+    hi[all_nan] = np.nan
+
+    y = np.empty(2 * n_buckets, dtype=np.float32)
+    y[0::2] = lo
+    y[1::2] = hi
+    base = start + np.arange(n_buckets, dtype=np.float64) * bucket
+    x = np.empty(2 * n_buckets, dtype=np.float64)
+    x[0::2] = base
+    x[1::2] = base + (bucket - 1)
+    x = np.minimum(x, end - 1)
+    return x, y
@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from modules.loss.stft_loss import warp_stft
+from modules.loss.aux_loss import FusedAuxLoss
 from utils.wav2mel import PitchAdjustableMelSpectrogram
 
 
@@ -20,10 +20,13 @@ class HiFiloss(nn.Module):
         self.lab_aux_loss = config.get('lab_aux_loss', 45)
         self.lab_aux_mel_loss = config.get('lab_aux_melloss', self.lab_aux_loss)
         self.lab_aux_stft_loss = config.get('lab_aux_stftloss', 2.5)
-        if config.get('use_stftloss', False):
-            self.stft = warp_stft({'fft_sizes': config['loss_fft_sizes'], 'hop_sizes': config['loss_hop_sizes'],
-                                   'win_lengths': config['loss_win_lengths']})
         self.use_stftloss = config.get('use_stftloss', False)
+        # Real and generated audio share each STFT call
+        if self.use_stftloss:
+            self.aux = FusedAuxLoss(self.mel, fft_sizes=config['loss_fft_sizes'], hop_sizes=config['loss_hop_sizes'],
+                                    win_lengths=config['loss_win_lengths'])
+        else:
+            self.aux = FusedAuxLoss(self.mel)
 
     def discriminator_loss(self, disc_real_outputs, disc_generated_outputs):
         loss = 0
@@ -81,11 +84,9 @@ class HiFiloss(nn.Module):
         Gwav = Goutput['audio'].squeeze(1)    
         Rwav = sample['audio'].squeeze(1)
         b = min(Gwav.shape[0], Rwav.shape[0])
-        Gmel = self.mel.dynamic_range_compression_torch(self.mel(Gwav[: b]))
-        Rmel = self.mel.dynamic_range_compression_torch(self.mel(Rwav[: b]))
-        mel_loss = self.L1loss(Gmel, Rmel) * self.lab_aux_mel_loss
+        mel_loss, sc_loss, mag_loss = self.aux(Gwav[: b], Rwav[: b])
+        mel_loss = mel_loss * self.lab_aux_mel_loss
         if self.use_stftloss:
-            sc_loss, mag_loss = self.stft.stft(Gwav[: b], Rwav[: b])
             stft_loss = (sc_loss + mag_loss) * self.lab_aux_stft_loss
             loss = mel_loss + stft_loss
             return loss, {'aux_mel_loss': mel_loss, 'aux_stft_loss': stft_loss}
@@ -0,0 +1,103 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from utils.wav2mel import PitchAdjustableMelSpectrogram
+
+
+class FusedAuxLoss(nn.Module):
+    """Mel L1 loss plus optional multi-resolution STFT loss, computed in as few STFTs as possible.
+
+    Generated and real audio are concatenated along the batch, so every
+    spectrogram is one STFT call instead of two. Resolutions listed more
+    than once are computed once and weighted by their count. Windows are
+    cached per (window length, device, dtype) and mel bases per device (by
+    `PitchAdjustableMelSpectrogram`), so nothing is moved between devices
+    per step. Loss values equal those of separate mel calls and
+    `MultiResolutionSTFTLoss`.
+    """
+
+    def __init__(self, mel: PitchAdjustableMelSpectrogram, fft_sizes=None, hop_sizes=None, win_lengths=None):
+        super().__init__()
+        self.mel = mel
+        self.resolutions = {}
+        self.num_resolutions = 0
+        if fft_sizes is not None:
+            assert len(fft_sizes) == len(hop_sizes) == len(win_lengths)
+            for resolution in zip(fft_sizes, hop_sizes, win_lengths):
+                self.resolutions[resolution] = self.resolutions.get(resolution, 0) + 1
+            self.num_resolutions = len(fft_sizes)
+        self.windows = {}
+
+    def window(self, win_length: int, x: torch.Tensor) -> torch.Tensor:
+        key = (win_length, x.device, x.dtype)
+        window = self.windows.get(key)
+        if window is None:
+            window = torch.hann_window(win_length, device=x.device, dtype=x.dtype)
+            self.windows[key] = window
+        return window
+
+    def mel_loss(self, Gwav, Rwav):
+        mel = self.mel.dynamic_range_compression_torch(self.mel(torch.cat((Gwav, Rwav), dim=0)))
+        Gmel, Rmel = mel.split(Gwav.shape[0], dim=0)
+        return F.l1_loss(Gmel, Rmel)
+
+    def stft_loss(self, Gwav, Rwav):
+        """Mean spectral convergence and log magnitude losses over the resolutions (see `stft_loss.STFTLoss`)."""
+        x = torch.cat((Gwav, Rwav), dim=0)
+        sc_loss = 0.0
+        mag_loss = 0.0
+        for (fft_size, hop_size, win_length), count in self.resolutions.items():
+            mag = torch.stft(x, fft_size, hop_size, win_length, self.window(win_length, x), return_complex=True)
+            mag = torch.clamp(mag.abs(), min=10 ** (-3.5))
+            x_mag, y_mag = mag.split(Gwav.shape[0], dim=0)
+            sc_loss = sc_loss + count * (torch.norm(y_mag - x_mag, p="fro") / torch.norm(y_mag, p="fro"))
+            mag_loss = mag_loss + count * F.l1_loss(torch.log(y_mag), torch.log(x_mag))
+        return sc_loss / self.num_resolutions, mag_loss / self.num_resolutions
+
+    def forward(self, Gwav, Rwav):
+        """Return ``(mel_loss, sc_loss, mag_loss)``; the STFT terms are None without resolutions."""
+        mel_loss = self.mel_loss(Gwav, Rwav)
+        if not self.resolutions:
+            return mel_loss, None, None
+        sc_loss, mag_loss = self.stft_loss(Gwav, Rwav)
+        return mel_loss, sc_loss, mag_loss
+
+
+if __name__ == '__main__':
+    # Per-step auxiliary loss (forward + backward), separate calls vs fused:
+    #     python -m modules.loss.aux_loss
+    import time
+
+    from modules.loss.stft_loss import MultiResolutionSTFTLoss
+
+    fft_sizes = [2048, 2048, 4096, 1024, 512, 256, 128, 1024, 2048, 512]
+    hop_sizes = [512, 240, 480, 100, 50, 25, 12, 120, 240, 50]
+    win_lengths = [2048, 1200, 2400, 480, 240, 120, 60, 600, 1200, 240]
+    mel = PitchAdjustableMelSpectrogram(f_max=16000)
+    separate_stft = MultiResolutionSTFTLoss(fft_sizes, hop_sizes, win_lengths)
+    fused = FusedAuxLoss(mel, fft_sizes, hop_sizes, win_lengths)
+
+    def separate(Gwav, Rwav):
+        Gmel = mel.dynamic_range_compression_torch(mel(Gwav))
+        Rmel = mel.dynamic_range_compression_torch(mel(Rwav))
+        sc_loss, mag_loss = separate_stft(Gwav, Rwav)
+        return F.l1_loss(Gmel, Rmel), sc_loss, mag_loss
+
+    torch.manual_seed(0)
+    Rwav = torch.rand(4, 20 * 512) * 2 - 1
+    Gwav = (Rwav + 0.1 * torch.randn_like(Rwav)).requires_grad_()
+    for a, b in zip(separate(Gwav, Rwav), fused(Gwav, Rwav)):
+        assert torch.allclose(a, b, rtol=1e-5), (a, b)
+
+    def run(fn, steps=20):
+        sum(fn(Gwav, Rwav)).backward()  # warm-up
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            sum(fn(Gwav, Rwav)).backward()
+        return (time.perf_counter() - t0) / steps
+
+    t_separate = run(separate)
+    t_fused = run(fused)
+    print(f"| STFT calls per step: separate {2 + 2 * len(fft_sizes)}, fused {1 + len(fused.resolutions)}")
+    print(f"| separate {t_separate * 1000:.1f} ms/step, fused {t_fused * 1000:.1f} ms/step")
@@ -151,8 +151,8 @@ class MultiResolutionSTFTLoss(torch.nn.Module):
         sc_loss = 0.0
         mag_loss = 0.0
         for f in self.stft_losses:
-            # print( 'stft parameter device:', next(f.parameters()).device )
-            f = f.to(y.device)
+            if f.window.device != y.device:
+                f.to(y.device)
             sc_l, mag_l = f(x, y)
             sc_loss += sc_l
             mag_loss += mag_l
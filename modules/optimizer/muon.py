@@ -95,45 +95,97 @@ class Muon(torch.optim.Optimizer):
         momentum: The momentum used by the internal SGD.
         nesterov: Whether to use Nesterov-style momentum in the internal SGD. (recommended)
         ns_steps: The number of Newton-Schulz iteration steps to use.
+        max_pad_ratio: How much wider (zero-padded) a batch may be than a matrix it takes; 1 disables
+            padding, so only matrices of the same shape share a Newton-Schulz call.
     """
 
-    def __init__(self, params, lr=5e-4, weight_decay=0.1, momentum=0.95, nesterov=True, ns_steps=5):
+    def __init__(self, params, lr=5e-4, weight_decay=0.1, momentum=0.95, nesterov=True, ns_steps=5,
+                 max_pad_ratio=4.0):
         defaults = dict(lr=lr, weight_decay=weight_decay, momentum=momentum, nesterov=nesterov, ns_steps=ns_steps)
         super().__init__(params, defaults)
         self.bf16_support_map = get_bf16_support_map()
-    
+        # A matrix is zero-padded into a batch only if the batch's long side is at most this many times its own
+        self.max_pad_ratio = max_pad_ratio
+
+    @staticmethod
+    def matrix_shape(p: Tensor):
+        # Conv filters are orthogonalised as (out_channels, in_channels * kernel) matrices
+        return (p.size(0), p[0].numel()) if p.ndim >= 2 else tuple(p.shape)
+
+    def group_key(self, p: Tensor):
+        return min(self.matrix_shape(p)), p.device, p.dtype
+
+    def shape_groups(self, group):
+        """Parameters of `group` that have gradients, as batches for one Newton-Schulz call each.
+
+        Every matrix is orthogonalised with its short side as rows (NS(X^T) =
+        NS(X)^T), and matrices with the same `group_key` (short side, device,
+        dtype) are zero-padded along the long side to a common width. Zero
+        columns change neither the Frobenius norm nor the other columns of the
+        iteration, so each result is exact. To bound the wasted FLOPs a batch
+        only takes matrices whose long side is within `max_pad_ratio` of its
+        widest one.
+        """
+        buckets = {}
+        for p in filter(lambda p: p.grad is not None, group["params"]):
+            state = self.state[p]
+            if "momentum_buffer" not in state:
+                state["momentum_buffer"] = torch.zeros_like(p.grad)
+            buckets.setdefault(self.group_key(p), []).append(p)
+
+        shape_groups = []
+        for params in buckets.values():
+            params.sort(key=lambda p: max(self.matrix_shape(p)), reverse=True)
+            batch = None
+            for p in params:
+                width = max(self.matrix_shape(p))
+                if batch is None or width * self.max_pad_ratio < batch["width"]:
+                    batch = {"params": [], "grads": [], "buffers": [], "width": width}
+                    shape_groups.append(batch)
+                batch["params"].append(p)
+                batch["grads"].append(p.grad)
+                batch["buffers"].append(self.state[p]["momentum_buffer"])
+        return shape_groups
+
+    def stack_matrices(self, grads, width: int) -> Tensor:
+        """(batch, short side, `width`) stack of `grads` as matrices, transposed to be wide and zero-padded."""
+        mats = []
+        for x in grads:
+            mat = x.reshape(self.matrix_shape(x))
+            mats.append(mat.mT if mat.size(0) > mat.size(1) else mat)
+        if all(mat.size(1) == width for mat in mats):
+            return torch.stack(mats)
+        stacked = mats[0].new_zeros((len(mats), mats[0].size(0), width))
+        for i, mat in enumerate(mats):
+            stacked[i, :, :mat.size(1)] = mat
+        return stacked
+
     @torch.no_grad()
     def step(self, closure=None):
         for group in self.param_groups:
-            shape_groups = {}
-            for p in filter(lambda p: p.grad is not None, group["params"]):
-                g = p.grad
-                state = self.state[p]
-                if "momentum_buffer" not in state:
-                    state["momentum_buffer"] = torch.zeros_like(g)
-                key = (p.shape, p.device, p.dtype)
-                if key not in shape_groups:
-                    shape_groups[key] = {"params": [], "grads": [], "buffers": []}
-                shape_groups[key]["params"].append(p)
-                shape_groups[key]["grads"].append(g)
-                shape_groups[key]["buffers"].append(state["momentum_buffer"])
-            for key in shape_groups:
-                group_data = shape_groups[key]
+            for group_data in self.shape_groups(group):
                 p, g, buf, m = group_data["params"], group_data["grads"], group_data["buffers"], group["momentum"]
                 torch._foreach_lerp_(buf, g, 1-m)
                 if group["nesterov"]:
                     torch._foreach_lerp_(g, buf, m)
-                    g = torch.stack(g)
                 else:
-                    g = torch.stack(buf)
-                original_shape = g.shape
-                if g.ndim >= 4:  # for the case of conv filters
-                    g = g.view(g.size(0), g.size(1), -1)
+                    g = buf
+                g = self.stack_matrices(g, group_data["width"])
                 use_bf16 = self.bf16_support_map.get(g.device, False)
                 g = zeropower_via_newtonschulz5(g, steps=group["ns_steps"], use_bf16=use_bf16)
                 if group["weight_decay"] > 0:
                     torch._foreach_mul_(p, 1 - group["lr"] * group["weight_decay"])
-                torch._foreach_add_(p, g.view(original_shape).unbind(0), alpha=-group["lr"] * max(g[0].size()) ** 0.5)
+                # Undo padding and transposition; the update scale depends on each matrix's long side
+                by_scale = {}
+                for u, x in zip(g.unbind(0), p):
+                    rows, cols = self.matrix_shape(x)
+                    u = u[:, :max(rows, cols)]
+                    u = u.mT if rows > cols else u
+                    params, updates = by_scale.setdefault(max(rows, cols), ([], []))
+                    params.append(x)
+                    updates.append(u.reshape(x.shape))
+                for width, (params, updates) in by_scale.items():
+                    torch._foreach_add_(params, updates, alpha=-group["lr"] * width ** 0.5)
 
 
 def get_params_for_muon(model) -> List[Parameter]:
@@ -168,4 +220,65 @@ class Muon_AdamW(ChainedOptimizer):
             callback = lambda p, spec_idx: print(
             f"Adding param {p.shape} to optimizer{spec_idx} {str(specs[spec_idx].class_type)}"
         )
-        super().__init__(model.parameters(), specs, lr=lr, weight_decay=weight_decay, optimizer_selection_callback=callback)
\ No newline at end of file
+        super().__init__(model.parameters(), specs, lr=lr, weight_decay=weight_decay, optimizer_selection_callback=callback)
+
+
+if __name__ == '__main__':
+    # Optimizer-step benchmark on the HiFiGAN generator's and discriminators' Muon parameters:
+    #     python -m modules.optimizer.muon
+    import time
+
+    from models.nsf_HiFigan.models import AttrDict, Generator, MultiPeriodDiscriminator, MultiScaleDiscriminator
+
+    class PerParamMuon(Muon):
+        def group_key(self, p):
+            return id(p)
+
+    class ExactShapeMuon(Muon):
+        # Grouping by tensor shape, without padding
+        def group_key(self, p):
+            return tuple(p.shape), p.device, p.dtype
+
+    class MatrixShapeMuon(Muon):
+        # Grouping by flattened matrix shape, without padding
+        def group_key(self, p):
+            return self.matrix_shape(p), p.device, p.dtype
+
+    torch.manual_seed(0)
+    h = AttrDict({
+        'sampling_rate': 44100, 'num_mels': 128, 'hop_size': 512, 'mini_nsf': True, 'noise_sigma': 0.0,
+        'upsample_rates': [8, 8, 2, 2, 2], 'upsample_kernel_sizes': [16, 16, 4, 4, 4],
+        'upsample_initial_channel': 128, 'resblock_kernel_sizes': [3, 7, 11],
+        'resblock_dilation_sizes': [[1, 3, 5], [1, 3, 5], [1, 3, 5]], 'resblock': '1',
+    })
+    discriminators = nn.ModuleList([MultiPeriodDiscriminator(), MultiScaleDiscriminator()])
+    ns_steps, steps = 5, 5
+    for name, model in (('generator', Generator(h)), ('MPD + MSD', discriminators)):
+        params = get_params_for_muon(model)
+        print(f"| {name}: {len(params)} Muon parameters, {len(set(tuple(p.shape) for p in params))} tensor shapes, "
+              f"{len(set(Muon.matrix_shape(p) for p in params))} matrix shapes")
+
+        # Padding must not change the result
+        for p in params:
+            p.grad = torch.randn_like(p)
+        results = []
+        for cls in (PerParamMuon, Muon):
+            copies = [p.detach().clone().requires_grad_() for p in params]
+            for c, p in zip(copies, params):
+                c.grad = p.grad.clone()
+            cls(copies, lr=1e-4, ns_steps=ns_steps).step()
+            results.append(copies)
+        for a, b in zip(*results):
+            assert torch.allclose(a, b, atol=1e-6), (a.shape, (a - b).abs().max())
+
+        for cls in (PerParamMuon, ExactShapeMuon, MatrixShapeMuon, Muon):
+            optimizer = cls(params, lr=1e-4, ns_steps=ns_steps)
+            optimizer.step()  # warm-up, creates momentum buffers
+            batches = len(optimizer.shape_groups(optimizer.param_groups[0]))
+            t0 = time.perf_counter()
+            for _ in range(steps):
+                optimizer.step()
+            elapsed = (time.perf_counter() - t0) / steps
+            # 1 normalize + 3 batched matmuls per Newton-Schulz step
+            print(f"|   {cls.__name__}: {batches} Newton-Schulz batches, "
+                  f"~{batches * (1 + 3 * ns_steps)} NS kernel launches, {elapsed * 1000:.1f} ms/step")
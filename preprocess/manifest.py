@@ -0,0 +1,155 @@
+"""Preprocessing manifest for incremental binarisation.
+
+``<DataIndexPath>/manifest.json`` records, for every source clip, the
+``.npz`` it produced together with the source size, mtime, content hash and
+a digest of the preprocessing config. On the next run:
+
+- files whose size and mtime are unchanged are skipped without being read,
+- files whose stat changed but whose content hash did not are skipped too,
+- changed files, new files and files whose item is missing are reprocessed,
+- everything is reprocessed when the preprocessing config changes,
+- files that disappeared have their items deleted (unless another entry
+  still produces the same item) and are dropped.
+
+Sources are keyed by their resolved path, so switching ``--strx`` between
+relative and absolute paths does not make every clip look new.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+PREPROCESS_VERSION = 1  # bump when wav2spec's output changes
+
+# Config keys that change what wav2spec writes
+DIGEST_KEYS = (
+    'audio_sample_rate', 'fft_size', 'win_size', 'hop_size', 'fmin', 'fmax', 'audio_num_mel_bins',
+    'pe', 'f0_min', 'f0_max',
+)
+# Only when offline speed variants are rendered
+AUG_DIGEST_KEYS = ('key_aug', 'key_aug_variants', 'aug_min', 'aug_max')
+
+
+def config_digest(config: dict) -> str:
+    relevant = {k: config.get(k) for k in DIGEST_KEYS}
+    if config.get('key_aug', False) and config.get('key_aug_variants', 0) > 0:
+        relevant.update({k: config.get(k) for k in AUG_DIGEST_KEYS})
+    relevant['preprocess_version'] = PREPROCESS_VERSION
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode('utf8')).hexdigest()
+
+
+def file_sha1(path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def split_train_valid(filenames, val_num: int):
+    """Deterministic split: the `val_num` items with the smallest path hash are the valid set.
+
+    The ranking is per item, so adding clips only changes the valid set if
+    a new item ranks among the first `val_num`.
+    """
+    ranked = sorted(set(filenames), key=lambda p: (hashlib.sha1(p.encode('utf8')).hexdigest(), p))
+    valid = set(ranked[:max(0, min(int(val_num), len(ranked)))])
+    train = set(ranked) - valid
+    return sorted(train), sorted(valid)
+
+
+def _resolved(path) -> str:
+    return pathlib.Path(path).resolve().as_posix()
+
+
+class PreprocessManifest:
+    def __init__(self, path, config: dict):
+        self.path = pathlib.Path(path)
+        self.digest = config_digest(config)
+        self.files = {}
+        self._seen = set()
+        try:
+            with open(self.path, 'r', encoding='utf8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = {_resolved(k): v for k, v in data.get('files', {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def check(self, source: pathlib.Path, output: pathlib.Path):
+        """Return ``(up_to_date, sha1)``; `sha1` is the source hash if it had to be computed, else None."""
+        key = _resolved(source)
+        self._seen.add(key)
+        entry = self.files.get(key)
+        if (
+            entry is None or entry.get('config') != self.digest
+            or _resolved(entry.get('output', '')) != _resolved(output) or not output.exists()
+        ):
+            return False, None
+        entry['output'] = output.as_posix()  # as listed in this run
+        st = source.stat()
+        if entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+            return True, None
+        sha1 = file_sha1(source)
+        if sha1 != entry.get('sha1'):
+            return False, sha1
+        # Touched but identical content
+        entry['size'] = st.st_size
+        entry['mtime_ns'] = st.st_mtime_ns
+        return True, sha1
+
+    def record(self, source: pathlib.Path, output: pathlib.Path, sha1: str, size: int, mtime_ns: int,
+               meta: dict = None):
+        """Remember a processed source; `size`/`mtime_ns` are its stat from before it was read."""
+        self.files[_resolved(source)] = {
+            'output': output.as_posix(),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha1': sha1,
+            'config': self.digest,
+            'meta': meta,
+        }
+
+    def metadata(self, compute=None) -> dict:
+        """Item metadata by output path; entries without it get ``compute(output)`` if given."""
+        result = {}
+        for entry in self.files.values():
+            if entry.get('meta') is None and compute is not None:
+                entry['meta'] = compute(entry['output'])
+            if entry.get('meta') is not None:
+                result[entry['output']] = entry['meta']
+        return result
+
+    def forget(self, source: pathlib.Path):
+        self.files.pop(_resolved(source), None)
+
+    def prune(self):
+        """Drop sources not seen by `check` in this run and delete their items; returns the removed items.
+
+        Items still produced by a remaining entry are kept.
+        """
+        stale = [self.files.pop(k) for k in list(self.files) if k not in self._seen]
+        live = {_resolved(entry['output']) for entry in self.files.values() if entry.get('output')}
+        removed = []
+        for entry in stale:
+            output = entry.get('output')
+            if output and _resolved(output) not in live:
+                try:
+                    os.remove(output)
+                    removed.append(output)
+                except OSError:
+                    pass
+        return removed
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, f, indent=1)
+        os.replace(tmp, self.path)
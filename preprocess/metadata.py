@@ -0,0 +1,74 @@
+"""Per-item metadata index.
+
+``process.py`` writes ``<DataIndexPath>/<set_name>.meta.json`` next to each
+item list with, for every item, its number of mel frames, its maximum f0 and
+its voiced ratio. Datasets use it to drop unusable items once at start-up
+(instead of loading them and retrying a random index) and to know item
+lengths without loading them, which is what length-bucketed batch samplers
+need.
+"""
+
+import json
+import os
+import pathlib
+
+import numpy as np
+
+METADATA_VERSION = 1
+METADATA_SUFFIX = '.meta.json'
+
+
+def metadata_path(list_path) -> pathlib.Path:
+    list_path = pathlib.Path(list_path)
+    return list_path.with_name(list_path.name + METADATA_SUFFIX)
+
+
+def item_metadata(npz_path) -> dict:
+    """Metadata of one binarised item; reads only its f0 and uv arrays."""
+    with np.load(npz_path) as data:
+        return metadata_from_pitch(data['f0'], data['uv'])
+
+
+def metadata_from_pitch(f0: np.ndarray, uv: np.ndarray) -> dict:
+    return {
+        'frames': int(len(f0)),
+        'f0_max': float(f0.max()) if len(f0) else 0.0,
+        'voiced': float(1.0 - np.mean(uv)) if len(uv) else 0.0,
+    }
+
+
+def write_metadata(list_path, items, metadata: dict):
+    """Write the index of `items` (in list order); `metadata` maps item path to `item_metadata`."""
+    index = {
+        'version': METADATA_VERSION,
+        'items': list(items),
+        'frames': [metadata[p]['frames'] for p in items],
+        'f0_max': [metadata[p]['f0_max'] for p in items],
+        'voiced': [metadata[p]['voiced'] for p in items],
+    }
+    path = metadata_path(list_path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def read_metadata(list_path, items):
+    """Arrays ``frames``, ``f0_max`` and ``voiced`` aligned with `items`, or None if the index is missing or stale."""
+    try:
+        with open(metadata_path(list_path), 'r', encoding='utf8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != METADATA_VERSION:
+        return None
+    position = {p: i for i, p in enumerate(index['items'])}
+    try:
+        order = np.array([position[p] for p in items], dtype=np.int64)
+    except KeyError:
+        return None
+    return {
+        'frames': np.asarray(index['frames'], dtype=np.int64)[order],
+        'f0_max': np.asarray(index['f0_max'], dtype=np.float64)[order],
+        'voiced': np.asarray(index['voiced'], dtype=np.float64)[order],
+    }
@@ -0,0 +1,304 @@
+"""Sharded, memory-mapped training data.
+
+A shard set is a directory with ``index.json`` and a few large payload files
+(``00000.bin``, ``00001.bin``, ...). Each item's audio, mel and f0 are
+stored back to back as raw little-endian arrays, and the index keeps their
+byte offsets, so a reader maps the payloads with `np.memmap` and copies out
+only the frames it needs: per-sample I/O is proportional to the training
+crop, not to the clip.
+
+Items may carry speed-augmented variants (rendered by ``process.py`` with
+``key_aug_variants``); they are stored like items and listed per item.
+
+Audio can be stored as float32 or int16 and mel as float32 or float16; f0 is
+always float32. Readers always return float32.
+
+A (re)pack is written to a sibling ``<dir>.tmp`` directory and swapped in
+when complete, so an interrupted pack leaves the previous set intact and
+readers that still map the old payloads keep reading consistent data.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+
+import numpy as np
+
+SHARD_VERSION = 1
+INDEX_NAME = 'index.json'
+_ALIGN = 64
+
+AUDIO_DTYPES = {'float32': '<f4', 'int16': '<i2'}
+MEL_DTYPES = {'float32': '<f4', 'float16': '<f2'}
+
+# Per-item index columns
+_SHARD, _AUDIO_OFF, _AUDIO_LEN, _MEL_OFF, _F0_OFF, _FRAMES, _PE = range(7)
+
+
+def items_digest(paths) -> str:
+    """Identity of a list of .npz items (path, size, mtime); a shard set built from them is current if it matches."""
+    h = hashlib.sha1()
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{p}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf8'))
+    return h.hexdigest()
+
+
+class ShardWriter:
+    def __init__(self, out_dir, audio_dtype: str = 'float32', mel_dtype: str = 'float32',
+                 shard_size_mb: int = 1024):
+        self.out_dir = pathlib.Path(out_dir)
+        self.tmp_dir = self.out_dir.with_name(self.out_dir.name + '.tmp')
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)  # left over from an interrupted pack
+        self.tmp_dir.mkdir(parents=True)
+        self.audio_dtype = np.dtype(AUDIO_DTYPES[audio_dtype])
+        self.mel_dtype = np.dtype(MEL_DTYPES[mel_dtype])
+        self.shard_bytes = int(shard_size_mb) << 20
+        self.keys = []
+        self.items = []
+        self.variants = []
+        self.aug_items = []
+        self.aug_speeds = []
+        self.shards = []
+        self.n_mels = None
+        self._f = None
+        self._pos = 0
+
+    def _write(self, arr: np.ndarray) -> int:
+        pad = -self._pos % _ALIGN
+        if pad:
+            self._f.write(b'\0' * pad)
+            self._pos += pad
+        offset = self._pos
+        data = np.ascontiguousarray(arr).tobytes()
+        self._f.write(data)
+        self._pos += len(data)
+        return offset
+
+    def _add_row(self, audio: np.ndarray, mel: np.ndarray, f0: np.ndarray, pe: int) -> list:
+        if self._f is None or self._pos >= self.shard_bytes:
+            self._next_shard()
+        if self.n_mels is None:
+            self.n_mels = int(mel.shape[1])
+        if self.audio_dtype.kind == 'i':
+            audio = np.clip(np.round(np.asarray(audio, dtype=np.float32) * 32767.0), -32768, 32767)
+        audio_off = self._write(np.asarray(audio).astype(self.audio_dtype))
+        mel_off = self._write(np.asarray(mel).astype(self.mel_dtype))
+        f0_off = self._write(np.asarray(f0).astype('<f4'))
+        return [len(self.shards) - 1, audio_off, int(len(audio)), mel_off, f0_off, int(mel.shape[0]), int(pe)]
+
+    def add(self, key: str, audio: np.ndarray, mel: np.ndarray, f0: np.ndarray, pe: int = 0) -> int:
+        """Append one item; `mel` is (frames, n_mels) and `f0` has one value per frame."""
+        self.keys.append(key)
+        self.items.append(self._add_row(audio, mel, f0, pe))
+        self.variants.append([])
+        return len(self.items) - 1
+
+    def add_variant(self, item: int, speed: float, audio: np.ndarray, mel: np.ndarray, f0: np.ndarray):
+        """Append a speed-augmented variant of `item`."""
+        self.variants[item].append(len(self.aug_items))
+        self.aug_items.append(self._add_row(audio, mel, f0, self.items[item][_PE]))
+        self.aug_speeds.append(float(speed))
+
+    def _next_shard(self):
+        if self._f is not None:
+            self._f.close()
+        name = f"{len(self.shards):05d}.bin"
+        self.shards.append(name)
+        self._f = open(self.tmp_dir / name, 'wb')
+        self._pos = 0
+
+    def close(self, digest: str = None):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        index = {
+            'version': SHARD_VERSION,
+            'digest': digest,
+            'audio_dtype': self.audio_dtype.str,
+            'mel_dtype': self.mel_dtype.str,
+            'n_mels': self.n_mels,
+            'shards': self.shards,
+            'keys': self.keys,
+            'items': self.items,
+            'variants': self.variants,
+            'aug_items': self.aug_items,
+            'aug_speeds': self.aug_speeds,
+        }
+        with open(self.tmp_dir / INDEX_NAME, 'w', encoding='utf8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        self._swap()
+
+    def _swap(self):
+        # A directory can't be replaced while it has files: move the old set aside first. Its
+        # payloads stay readable through existing maps until they are closed.
+        old_dir = self.out_dir.with_name(self.out_dir.name + '.old')
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if self.out_dir.exists():
+            os.replace(self.out_dir, old_dir)
+        os.replace(self.tmp_dir, self.out_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_index(shard_dir):
+    try:
+        with open(pathlib.Path(shard_dir) / INDEX_NAME, 'r', encoding='utf8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == SHARD_VERSION else None
+
+
+def pack_shards(npz_paths, out_dir, audio_dtype: str = 'float32', mel_dtype: str = 'float32',
+                shard_size_mb: int = 1024, progress=None) -> bool:
+    """Pack .npz items (as written by ``process.py``) into a shard set; returns False if it was already current."""
+    npz_paths = list(npz_paths)
+    digest = items_digest(npz_paths)
+    index = read_index(out_dir)
+    if (index is not None and index.get('digest') == digest
+            and index.get('audio_dtype') == np.dtype(AUDIO_DTYPES[audio_dtype]).str
+            and index.get('mel_dtype') == np.dtype(MEL_DTYPES[mel_dtype]).str):
+        return False
+    writer = ShardWriter(out_dir, audio_dtype=audio_dtype, mel_dtype=mel_dtype, shard_size_mb=shard_size_mb)
+    for p in npz_paths:
+        with np.load(p) as data:
+            item = writer.add(p, data['audio'], data['mel'], data['f0'], int(data['pe']))
+            if 'aug_speed' in data.files:
+                for k, speed in enumerate(data['aug_speed']):
+                    writer.add_variant(item, speed, data[f'aug_audio_{k}'], data[f'aug_mel_{k}'], data[f'aug_f0_{k}'])
+        if progress is not None:
+            progress(p)
+    writer.close(digest)
+    return True
+
+
+class ShardReader:
+    """Random access to a shard set; payloads are mapped lazily (and again in each worker process)."""
+
+    def __init__(self, shard_dir):
+        self.shard_dir = pathlib.Path(shard_dir)
+        index = read_index(self.shard_dir)
+        if index is None:
+            raise FileNotFoundError(f"No shard index in '{self.shard_dir}'")
+        self.keys = index['keys']
+        self.items = np.asarray(index['items'], dtype=np.int64).reshape(-1, 7)
+        self.variants = index.get('variants') or [[] for _ in self.keys]
+        self.aug_items = np.asarray(index.get('aug_items', []), dtype=np.int64).reshape(-1, 7)
+        self.aug_speeds = np.asarray(index.get('aug_speeds', []), dtype=np.float64)
+        self.shards = index['shards']
+        self.audio_dtype = np.dtype(index['audio_dtype'])
+        self.mel_dtype = np.dtype(index['mel_dtype'])
+        self.n_mels = int(index['n_mels'] or 0)
+        self._maps = {}
+
+    def __getstate__(self):
+        # Memory maps are not sent to DataLoader workers; each maps on first use
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.items)
+
+    def _row(self, i: int, variant: int = None) -> np.ndarray:
+        return self.items[i] if variant is None else self.aug_items[self.variants[i][variant]]
+
+    def num_variants(self, i: int) -> int:
+        return len(self.variants[i])
+
+    def variant_speed(self, i: int, variant: int) -> float:
+        return float(self.aug_speeds[self.variants[i][variant]])
+
+    def num_frames(self, i: int, variant: int = None) -> int:
+        return int(self._row(i, variant)[_FRAMES])
+
+    def num_samples(self, i: int, variant: int = None) -> int:
+        return int(self._row(i, variant)[_AUDIO_LEN])
+
+    def pe(self, i: int) -> int:
+        return int(self.items[i, _PE])
+
+    def _map(self, shard: int) -> np.memmap:
+        mm = self._maps.get(shard)
+        if mm is None:
+            mm = np.memmap(self.shard_dir / self.shards[shard], dtype=np.uint8, mode='r')
+            self._maps[shard] = mm
+        return mm
+
+    def _view(self, row: np.ndarray, col_off: int, dtype, count: int, start: int, stop: int, n: int = 1):
+        offset = int(row[col_off]) + start * n * dtype.itemsize
+        length = max(0, min(stop, count) - start) * n
+        return np.frombuffer(self._map(int(row[_SHARD])), dtype=dtype, count=length, offset=offset)
+
+    def read_f0(self, i: int, variant: int = None) -> np.ndarray:
+        row = self._row(i, variant)
+        frames = int(row[_FRAMES])
+        return self._view(row, _F0_OFF, np.dtype('<f4'), frames, 0, frames)
+
+    def read_audio(self, i: int, start: int = 0, stop: int = None, variant: int = None) -> np.ndarray:
+        """Samples [start, stop) of item `i` (or of one of its variants) as float32."""
+        row = self._row(i, variant)
+        n = int(row[_AUDIO_LEN])
+        stop = n if stop is None else stop
+        audio = self._view(row, _AUDIO_OFF, self.audio_dtype, n, start, stop).astype(np.float32)
+        if self.audio_dtype.kind == 'i':
+            audio /= 32767.0
+        return audio
+
+    def read(self, i: int, frame_start: int = 0, n_frames: int = None, hop_size: int = None,
+             variant: int = None) -> dict:
+        """Mel/f0 frames [frame_start, frame_start + n_frames) and, with `hop_size`, the matching audio.
+
+        Without `n_frames` the whole item is read.
+        """
+        row = self._row(i, variant)
+        frames = int(row[_FRAMES])
+        stop = frames if n_frames is None else frame_start + n_frames
+        mel = self._view(row, _MEL_OFF, self.mel_dtype, frames, frame_start, stop, n=self.n_mels)
+        mel = mel.reshape(-1, self.n_mels).astype(np.float32)
+        f0 = self._view(row, _F0_OFF, np.dtype('<f4'), frames, frame_start, stop).copy()
+        if n_frames is None or hop_size is None:
+            audio = self.read_audio(i, variant=variant)
+        else:
+            audio = self.read_audio(i, frame_start * hop_size, stop * hop_size, variant=variant)
+        return {'f0': f0, 'spectrogram': mel, 'audio': audio}
+
+
+if __name__ == '__main__':
+    import random
+    import shutil
+    import tempfile
+    import time
+
+    hop, n_mels, crop = 512, 128, 20
+    rng = np.random.default_rng(0)
+    tmp = pathlib.Path(tempfile.mkdtemp())
+    try:
+        paths = []
+        for i in range(64):
+            frames = int(rng.integers(400, 1200))  # 5-14 s clips
+            path = tmp / f"{i}.npz"
+            np.savez(path, audio=rng.uniform(-1, 1, frames * hop).astype(np.float32),
+                     mel=rng.standard_normal((frames, n_mels)).astype(np.float32),
+                     f0=rng.uniform(100, 400, frames), uv=np.zeros(frames, bool), pe=0)
+            paths.append(str(path))
+        pack_shards(paths, tmp / 'shards', audio_dtype='int16', mel_dtype='float16')
+        reader = ShardReader(tmp / 'shards')
+        order = [random.randrange(len(paths)) for _ in range(2000)]
+
+        t0 = time.perf_counter()
+        for i in order:
+            data = np.load(paths[i])
+            audio, mel, f0 = data['audio'], data['mel'], data['f0']
+        t_npz = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for i in order:
+            start = random.randint(0, reader.num_frames(i) - 1 - crop)
+            reader.read(i, start, crop, hop_size=hop)
+        t_shard = time.perf_counter() - t0
+        print(f"| {len(order)} samples: npz {t_npz / len(order) * 1e6:.0f} us/sample, "
+              f"shard crop {t_shard / len(order) * 1e6:.0f} us/sample")
+    finally:
+        shutil.rmtree(tmp)
@@ -1,7 +1,6 @@
 import itertools
 import multiprocessing
 import pathlib
-import random
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Tuple, Union
 
@@ -11,7 +10,11 @@ import torch
 import torchaudio
 from tqdm import tqdm
 
+from preprocess.manifest import MANIFEST_NAME, PreprocessManifest, file_sha1, split_train_valid
+from preprocess.metadata import item_metadata, metadata_from_pitch, write_metadata
+from preprocess.shards import pack_shards
 from utils.config_utils import read_full_config
+from utils.speed_aug import get_resampler, speed_aug, variant_speeds
 from utils.wav2F0 import PITCH_EXTRACTORS_NAME_TO_ID, get_pitch
 from utils.wav2mel import PitchAdjustableMelSpectrogram
 
@@ -20,8 +23,12 @@ def dynamic_range_compression_torch(x, C=1, clip_val=1e-9):
     return torch.log(torch.clamp(x, min=clip_val) * C)
 
 
-def wav2spec(config: dict, source: pathlib.Path, save_path: pathlib.Path) -> Tuple[bool, Union[pathlib.Path, str]]:
-    mel_spec_transform = PitchAdjustableMelSpectrogram(
+class PreprocessError(Exception):
+    pass
+
+
+def build_mel_transform(config: dict) -> PitchAdjustableMelSpectrogram:
+    return PitchAdjustableMelSpectrogram(
         sample_rate=config['audio_sample_rate'],
         n_fft=config['fft_size'],
         win_length=config['win_size'],
@@ -30,29 +37,182 @@ def wav2spec(config: dict, source: pathlib.Path, save_path: pathlib.Path) -> Tup
         f_max=config['fmax'],
         n_mels=config['audio_num_mel_bins'],
     )
+
+
+def load_audio(config: dict, source: pathlib.Path) -> torch.Tensor:
+    audio, sr = torchaudio.load(source)
+    if sr > config['audio_sample_rate']:
+        audio = get_resampler(sr, config['audio_sample_rate'])(audio)
+    elif sr < config['audio_sample_rate']:
+        raise PreprocessError(
+            f"Error: sample rate mismatching in \'{source}\' ({sr} != {config['audio_sample_rate']})."
+        )
+    return audio
+
+
+def save_item(config: dict, source: pathlib.Path, save_path: pathlib.Path, audio, mel, mel_spec_transform) -> dict:
+    """Pitch, speed variants and the .npz of one clip whose (n_mels, frames) log-mel is known; returns its metadata."""
+    pe_name = config['pe']
+    pe_id = PITCH_EXTRACTORS_NAME_TO_ID[pe_name]
+    f0, uv = get_pitch(pe_name, audio.numpy()[0], length=len(mel.T), hparams=config, interp_uv=True)
+    if f0 is None:
+        raise PreprocessError(f"Error: failed to get pitch from \'{source}\'.")
+    variants = render_speed_variants(config, source, audio[0], pe_name, mel_spec_transform)
+    np.savez(save_path, audio=audio[0].numpy(), mel=mel.T, f0=f0, uv=uv, pe=pe_id, **variants)
+    return metadata_from_pitch(f0, uv)
+
+
+def _error_message(e: Exception) -> str:
+    return str(e) if isinstance(e, PreprocessError) else f"Error: {e.__class__.__name__}: {e}"
+
+
+def wav2spec(config: dict, source: pathlib.Path, save_path: pathlib.Path,
+             mel_spec_transform: PitchAdjustableMelSpectrogram = None) -> Tuple[bool, Union[pathlib.Path, str]]:
+    if mel_spec_transform is None:
+        mel_spec_transform = build_mel_transform(config)
     try:
-        audio, sr = torchaudio.load(source)
-        pe_name = config['pe']
-        pe_id = PITCH_EXTRACTORS_NAME_TO_ID[pe_name]
-        if sr > config['audio_sample_rate']:
-            audio = torchaudio.transforms.Resample(
-                orig_freq=sr,
-                new_freq=config['audio_sample_rate'],
-                lowpass_filter_width=128)(audio)
-        elif sr < config['audio_sample_rate']:
-            return False, f"Error: sample rate mismatching in \'{source}\' ({sr} != {config['audio_sample_rate']})."
+        audio = load_audio(config, source)
         mel = dynamic_range_compression_torch(mel_spec_transform(audio))
-        f0, uv = get_pitch(pe_name, audio.numpy()[0], length=len(mel[0].T), hparams=config, interp_uv=True)
-        if f0 is None:
-            return False, f"Error: failed to get pitch from \'{source}\'."
-        np.savez(save_path, audio=audio[0].numpy(), mel=mel[0].T, f0=f0, uv=uv, pe=pe_id)
+        save_item(config, source, save_path, audio, mel[0], mel_spec_transform)
     except KeyboardInterrupt:
         raise
     except Exception as e:
-        return False, f"Error: {e.__class__.__name__}: {e}"
+        return False, _error_message(e)
     return True, save_path
 
 
+def render_speed_variants(config: dict, source: pathlib.Path, audio, pe_name: str, mel_spec_transform) -> dict:
+    """Speed-augmented copies of a clip for key_aug, as extra .npz members.
+
+    Variant k is ``aug_audio_k``/``aug_mel_k``/``aug_f0_k`` at speed
+    ``aug_speed[k]``, computed the same way as the on-the-fly augmentation
+    in the training datasets but over the whole clip.
+    """
+    num = config.get('key_aug_variants', 0) if config.get('key_aug', False) else 0
+    if num <= 0:
+        return {}
+    hop_size = config['hop_size']
+    speeds = variant_speeds(source.as_posix(), num, config['aug_min'], config['aug_max'])
+    variants = {}
+    rendered = []
+    for speed in speeds:
+        audio_aug = speed_aug(audio, hop_size, speed=speed)
+        mel_aug = dynamic_range_compression_torch(mel_spec_transform(audio_aug[None, :]))
+        f0, _ = get_pitch(pe_name, audio.numpy(), length=mel_aug.shape[-1], hparams=config, speed=speed,
+                          interp_uv=True)
+        if f0 is None:
+            continue
+        k = len(rendered)
+        variants[f'aug_audio_{k}'] = audio_aug.numpy()
+        variants[f'aug_mel_{k}'] = mel_aug[0].T.numpy()
+        variants[f'aug_f0_{k}'] = (f0 * speed).astype(np.float32)
+        rendered.append(speed)
+    variants['aug_speed'] = np.array(rendered, dtype=np.float32)
+    return variants
+
+
+# Per-process state of the preprocessing pool, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(config: dict):
+    torch.set_num_threads(1)
+    _worker['config'] = config
+    _worker['mel'] = build_mel_transform(config)
+
+
+def _batched_mels(mel_spec_transform, clips, max_batch_samples: int):
+    """Log-mels of 1-D clips, sending consecutive clips through the STFT together up to `max_batch_samples`.
+
+    A batch that fails (e.g. a clip too short to pad) yields None for its
+    clips, which are then transformed one by one.
+    """
+    batches = []
+    longest = 0
+    for clip in clips:
+        longest = max(longest, len(clip))
+        if not batches or (len(batches[-1]) + 1) * longest > max_batch_samples:
+            batches.append([clip])
+            longest = len(clip)
+        else:
+            batches[-1].append(clip)
+    mels = []
+    for batch in batches:
+        try:
+            mels.extend(dynamic_range_compression_torch(spec) for spec in mel_spec_transform.batch(batch))
+        except RuntimeError:
+            mels.extend([None] * len(batch))
+    return mels
+
+
+def preprocess_chunk(items, short_clip_samples: int = None, max_batch_samples: int = 1 << 22):
+    """Binarise several clips in a pool worker.
+
+    `items` are ``(source, save_path, sha1)``; returns, per item, what the
+    manifest needs: (succeeded, result, sha1, size, mtime_ns, meta). Clips
+    shorter than `short_clip_samples` (10 s by default) share STFT batches.
+    """
+    config = _worker['config']
+    mel_spec_transform = _worker['mel']
+    if short_clip_samples is None:
+        short_clip_samples = 10 * config['audio_sample_rate']
+    results = []
+    loaded = []
+    for source, save_path, sha1 in items:
+        st = source.stat()
+        if sha1 is None:
+            sha1 = file_sha1(source)
+        results.append([False, None, sha1, st.st_size, st.st_mtime_ns, None])
+        try:
+            loaded.append((len(results) - 1, load_audio(config, source)))
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            results[-1][1] = _error_message(e)
+
+    short = [(i, audio) for i, audio in loaded if audio.shape[-1] < short_clip_samples]
+    mels = dict(zip([i for i, _ in short], _batched_mels(mel_spec_transform, [a[0] for _, a in short],
+                                                         max_batch_samples)))
+    for i, audio in loaded:
+        source, save_path, _ = items[i]
+        try:
+            mel = mels.get(i)
+            if mel is None:
+                mel = dynamic_range_compression_torch(mel_spec_transform(audio))[0]
+            results[i][5] = save_item(config, source, save_path, audio, mel, mel_spec_transform)
+            results[i][0] = True
+            results[i][1] = save_path
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            results[i][1] = _error_message(e)
+    return [tuple(r) for r in results]
+
+
+def balanced_chunks(args, num_workers: int, chunks_per_worker: int = 4, max_chunk_bytes: int = 64 << 20,
+                    max_chunk_files: int = 64):
+    """Group `args` (whose first element is the source path) into chunks of similar total file size.
+
+    Files are sorted by size, so a chunk holds clips of similar length
+    (dense STFT batches) and the largest chunks are submitted first.
+    """
+    sizes = [a[0].stat().st_size for a in args]
+    target = min(max_chunk_bytes, max(1, sum(sizes) // max(1, num_workers * chunks_per_worker)))
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for i in sorted(range(len(args)), key=lambda i: sizes[i], reverse=True):
+        chunk.append(args[i])
+        chunk_size += sizes[i]
+        if chunk_size >= target or len(chunk) >= max_chunk_files:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
 @click.command(help='')
 @click.option('--config', required=True, metavar='FILE', help='Path to the configuration file')
 @click.option('--num_cpu', required=False, metavar='DIR2', help='Number of CPU cores to use')
@@ -77,26 +237,52 @@ def runx(config, num_cpu, strx):
     in_path_list = config['data_input_path']
     out_path_list = config['data_out_path']
     assert len(in_path_list) == len(out_path_list), 'path list can not match'
-    data_filename_set = set()
-    for inpath, outpath in tqdm(zip(in_path_list, out_path_list)):
-        outlist = preprocess(config=config, input_path=inpath, output_path=outpath, num_cpu=num_cpu, st_path=strx)
-        data_filename_set.update(outlist)
     outp = pathlib.Path(config['DataIndexPath'])
     assert not outp.exists() or outp.is_dir(), f'Path \'{outp}\' is not a directory.'
     outp.mkdir(parents=True, exist_ok=True)
+    manifest = PreprocessManifest(outp / MANIFEST_NAME, config)
+    data_filename_set = set()
+    for inpath, outpath in tqdm(zip(in_path_list, out_path_list)):
+        outlist = preprocess(config=config, input_path=inpath, output_path=outpath, num_cpu=num_cpu, st_path=strx,
+                             manifest=manifest)
+        data_filename_set.update(outlist)
+    removed = manifest.prune()
+    if removed:
+        print(f'Removed {len(removed)} items whose source files are gone.')
+    metadata = manifest.metadata(compute=item_metadata)
+    manifest.save()
     train_name = config['train_set_name']
     val_name = config['valid_set_name']
     val_num = config['val_num']
 
-    val_set = random.sample(tuple(data_filename_set), val_num)
-    train_set = data_filename_set - set(val_set)
+    train_set, val_set = split_train_valid(data_filename_set, val_num)
     with open(outp / train_name, 'w', encoding='utf8') as f:
-        [print(p, file=f) for p in sorted(train_set)]
+        [print(p, file=f) for p in train_set]
     with open(outp / val_name, 'w', encoding='utf8') as f:
-        [print(p, file=f) for p in sorted(val_set)]
+        [print(p, file=f) for p in val_set]
+    write_metadata(outp / train_name, train_set, metadata)
+    write_metadata(outp / val_name, val_set, metadata)
 
+    if config.get('binary_format', 'npz') == 'shards':
+        for set_name, items in ((train_name, train_set), (val_name, val_set)):
+            with tqdm(total=len(items), desc=f"Packing shards ({set_name})") as progress:
+                packed = pack_shards(
+                    items, outp / 'shards' / set_name,
+                    audio_dtype=config.get('shard_audio_dtype', 'float32'),
+                    mel_dtype=config.get('shard_mel_dtype', 'float32'),
+                    shard_size_mb=config.get('shard_size_mb', 1024),
+                    progress=lambda _: progress.update(),
+                )
+                if not packed:
+                    progress.write(f"Shards of '{set_name}' are up to date.")
 
-def preprocess(config, input_path, output_path, num_cpu, st_path):
+
+def preprocess(config, input_path, output_path, num_cpu, st_path, manifest: PreprocessManifest = None):
+    """Binarise every .wav/.flac under `input_path`; returns the items (existing and new).
+
+    With a `manifest`, sources it reports as up to date are skipped and
+    every processed source is recorded in it.
+    """
     if st_path:
         input_path = pathlib.Path(input_path).resolve()
         output_path = pathlib.Path(output_path).resolve()
@@ -112,43 +298,60 @@ def preprocess(config, input_path, output_path, num_cpu, st_path):
     else:
         num_cpu = int(num_cpu)
 
+    filenames = []
     args = []
     for wav_file in tqdm(
             itertools.chain(input_path.rglob('*.wav'), input_path.rglob('*.flac')),
             desc="Enumerating files", leave=False
     ):
         save_path = output_path / wav_file.relative_to(input_path).with_suffix('.npz')
+        sha1 = None
+        if manifest is not None:
+            up_to_date, sha1 = manifest.check(wav_file, save_path)
+            if up_to_date:
+                filenames.append(save_path.as_posix())
+                continue
         save_path.parent.mkdir(parents=True, exist_ok=True)
         args.append((
-            config,
             wav_file,
             save_path,
+            sha1,
         ))
+    skipped = len(filenames)
 
-    filenames = []
     completed = 0
     failed = 0
     try:
-        with ProcessPoolExecutor(max_workers=num_cpu) as executor:
-            tasks = [
-                executor.submit(wav2spec, *a)
-                for a in tqdm(args, desc="Submitting tasks", leave=False)
-            ]
-            with tqdm(as_completed(tasks), desc="Preprocessing", total=len(tasks)) as progress:
-                for task in progress:
-                    succeeded, result = task.result()
-                    if succeeded:
-                        result: pathlib.Path
-                        filenames.append(result.as_posix())
-                        completed += 1
-                    else:
-                        result: str
-                        progress.write(result)
-                        failed += 1
+        # The config is sent once per worker; files go out in size-balanced chunks
+        with ProcessPoolExecutor(max_workers=num_cpu, initializer=_init_worker, initargs=(config,)) as executor:
+            tasks = {
+                executor.submit(preprocess_chunk, chunk): chunk
+                for chunk in tqdm(balanced_chunks(args, num_cpu), desc="Submitting tasks", leave=False)
+            }
+            with tqdm(desc="Preprocessing", total=len(args)) as progress:
+                for task in as_completed(tasks):
+                    for (source, _, _), (succeeded, result, sha1, size, mtime_ns, meta) in zip(tasks[task],
+                                                                                               task.result()):
+                        if succeeded:
+                            result: pathlib.Path
+                            filenames.append(result.as_posix())
+                            if manifest is not None:
+                                manifest.record(source, result, sha1, size, mtime_ns, meta=meta)
+                            completed += 1
+                        else:
+                            result: str
+                            progress.write(result)
+                            if manifest is not None:
+                                manifest.forget(source)
+                            failed += 1
+                        progress.update()
                     progress.set_description(
-                        "Preprocessing ({} completed, {} failed)".format(completed, failed)
+                        "Preprocessing ({} completed, {} failed, {} up to date)".format(completed, failed, skipped)
                     )
     except KeyboardInterrupt:
+        # Keep what has been processed so far
+        if manifest is not None:
+            manifest.save()
         exit(-1)
 
     return filenames
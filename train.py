@@ -97,7 +97,9 @@ def train(config, exp_name, work_dir):
         check_val_every_n_epoch=None,
         log_every_n_steps=1,
         max_steps=config['max_updates'],
-        use_distributed_sampler=True,
+        # DsBatchSampler shards batches across ranks itself (datasets without item lengths get a
+        # DistributedSampler from GanBaseTask.fallback_sampler)
+        use_distributed_sampler=not config.get('batch_sampler', False),
         num_sanity_val_steps=config['num_sanity_val_steps'],
         # accumulate_grad_batches=config['accumulate_grad_batches']
     )
@@ -11,7 +11,7 @@ import torch.utils.data
 from lightning.pytorch.utilities.rank_zero import rank_zero_debug, rank_zero_info, rank_zero_only
 from torch import nn
 # torch.nn.utils.weight_norm
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, DistributedSampler
 from torchmetrics import Metric, MeanMetric
 
 import utils
@@ -479,41 +479,71 @@ class GanBaseTask(pl.LightningModule):
         #     }
         # }
 
+    def use_batch_sampler(self, dataset) -> bool:
+        # Length-bucketed batches need item lengths, which datasets expose as _sizes
+        return self.config.get('batch_sampler', False) and getattr(dataset, '_sizes', None) is not None
+
+    def fallback_sampler(self, dataset):
+        # `batch_sampler: true` turns off Lightning's DistributedSampler (see train.py), so datasets
+        # without _sizes must be sharded across ranks here instead
+        kwargs = self.trainer.distributed_sampler_kwargs
+        if not self.config.get('batch_sampler', False) or not kwargs:
+            return None
+        rank_zero_info(f"| {type(dataset).__name__} has no item lengths; using a DistributedSampler instead "
+                       f"of the batch sampler.")
+        return DistributedSampler(dataset, shuffle=False, **kwargs)
+
     def train_dataloader(self):
-        # self.training_sampler = DsBatchSampler(
-        #     self.train_dataset,
-        #     max_batch_frames=self.max_batch_frames,
-        #     max_batch_size=self.max_batch_size,
-        #     num_replicas=(self.trainer.distributed_sampler_kwargs or {}).get('num_replicas', 1),
-        #     rank=(self.trainer.distributed_sampler_kwargs or {}).get('rank', 0),
-        #     sort_by_similar_size=self.config['sort_by_len'],
-        #     required_batch_count_multiple=self.config['accumulate_grad_batches'],
-        #     frame_count_grid=self.config['sampler_frame_count_grid'],
-        #     shuffle_sample=True,
-        #     shuffle_batch=False,
-        #     seed=self.config['seed']
-        # )
+        if not self.use_batch_sampler(self.train_dataset):
+            return torch.utils.data.DataLoader(self.train_dataset,
+                                               collate_fn=self.train_dataset.collater,
+                                               batch_size=self.config['batch_size'],
+                                               sampler=self.fallback_sampler(self.train_dataset),
+                                               num_workers=self.config['ds_workers'],
+                                               prefetch_factor=self.config['dataloader_prefetch_factor'],
+                                               pin_memory=True,
+                                               persistent_workers=True)
+        max_batch_frames = self.config.get('max_batch_frames') or (
+                self.config['batch_size'] * int(np.max(self.train_dataset._sizes)))
+        self.training_sampler = DsBatchSampler(
+            self.train_dataset,
+            max_batch_frames=max_batch_frames,
+            max_batch_size=self.config['batch_size'],
+            num_replicas=(self.trainer.distributed_sampler_kwargs or {}).get('num_replicas', 1),
+            rank=(self.trainer.distributed_sampler_kwargs or {}).get('rank', 0),
+            sort_by_similar_size=self.config.get('sort_by_len', True),
+            required_batch_count_multiple=self.config.get('accumulate_grad_batches', 1),
+            frame_count_grid=self.config.get('sampler_frame_count_grid', 6),
+            shuffle_sample=True,
+            shuffle_batch=False,
+            seed=self.config['seed']
+        )
         return torch.utils.data.DataLoader(self.train_dataset,
                                            collate_fn=self.train_dataset.collater,
-                                           batch_size=self.config['batch_size'],
-                                           # batch_sampler=self.training_sampler,
+                                           batch_sampler=self.training_sampler,
                                            num_workers=self.config['ds_workers'],
                                            prefetch_factor=self.config['dataloader_prefetch_factor'],
                                            pin_memory=True,
                                            persistent_workers=True)
 
     def val_dataloader(self):
-        # sampler = DsEvalBatchSampler(
-        #     self.valid_dataset,
-        #     max_batch_frames=self.max_val_batch_frames,
-        #     max_batch_size=self.max_val_batch_size,
-        #     rank=(self.trainer.distributed_sampler_kwargs or {}).get('rank', 0),
-        #     batch_by_size=False
-        # )
+        sampler = None
+        batch_sampler = None
+        if self.use_batch_sampler(self.valid_dataset):
+            batch_sampler = DsEvalBatchSampler(
+                self.valid_dataset,
+                max_batch_frames=int(np.max(self.valid_dataset._sizes)),
+                max_batch_size=1,
+                rank=(self.trainer.distributed_sampler_kwargs or {}).get('rank', 0),
+                batch_by_size=False
+            )
+        else:
+            sampler = self.fallback_sampler(self.valid_dataset)
         return torch.utils.data.DataLoader(self.valid_dataset,
                                            collate_fn=self.valid_dataset.collater,
                                            batch_size=1,
-                                           # batch_sampler=sampler,
+                                           sampler=sampler,
+                                           batch_sampler=batch_sampler,
                                            num_workers=self.config['ds_workers'],
                                            prefetch_factor=self.config['dataloader_prefetch_factor'],
                                            shuffle=False)
@@ -4,14 +4,16 @@ import random
 import numpy as np
 import torch.nn.functional as F
 import torch.utils.data
-import torchaudio
 from matplotlib import pyplot as plt
 from torch import nn
 from torch.utils.data import Dataset
 
 from models.nsf_HiFigan.models import Generator, AttrDict, MultiScaleDiscriminator, MultiPeriodDiscriminator
 from modules.loss.HiFiloss import HiFiloss
+from preprocess.metadata import read_metadata
+from preprocess.shards import ShardReader
 from training.base_task_gan import GanBaseTask
+from utils.speed_aug import speed_aug
 from utils.wav2F0 import PITCH_EXTRACTORS_ID_TO_NAME, get_pitch
 from utils.wav2mel import PitchAdjustableMelSpectrogram
 
@@ -30,16 +32,8 @@ def dynamic_range_compression_torch(x, C=1, clip_val=1e-9):
 
 
 def wav_aug(wav, hop_size, speed=1):
-    orig_freq = int(np.round(hop_size * speed))
-    new_freq = hop_size
-    resample = torchaudio.transforms.Resample(
-        orig_freq=orig_freq,
-        new_freq=new_freq,
-        lowpass_filter_width=128
-    )
-    wav_resampled = resample(wav)
-    del resample
-    return wav_resampled
+    # Resample kernels are cached per speed bucket (round(hop_size * speed))
+    return speed_aug(wav, hop_size, speed=speed)
 
 
 def get_max_f0_from_config(config: dict):
@@ -63,10 +57,17 @@ class nsf_HiFigan_dataset(Dataset):
             fills = f.read().strip().split('\n')
         self.data_index = fills
         self.infer = infer
+        self.shards = None
+        if self.config.get('binary_format', 'npz') == 'shards':
+            # Packed by process.py next to the item list; reads only the cropped frames
+            self.shards = ShardReader(self.data_dir.parent / 'shards' / self.data_dir.name)
+            self.data_index = self.shards.keys
         self.volume_aug = self.config['volume_aug']
         self.volume_aug_prob = self.config['volume_aug_prob'] if not infer else 0
         self.key_aug = self.config.get('key_aug', False)
         self.key_aug_prob = self.config.get('key_aug_prob', 0.5)
+        # Without precomputed variants (key_aug_variants), augment crops on the fly
+        self.key_aug_online = self.config.get('key_aug_online', True)
         if self.key_aug:
             self.mel_spec_transform = PitchAdjustableMelSpectrogram(
                 sample_rate=config['audio_sample_rate'],
@@ -78,22 +79,96 @@ class nsf_HiFigan_dataset(Dataset):
                 n_mels=config['audio_num_mel_bins'],
             )
         self.max_f0 = get_max_f0_from_config(config)
+        self.item_ids = np.arange(len(self.data_index))
+        self._sizes = None
+        self.metadata = read_metadata(self.data_dir, self.data_index)
+        if self.metadata is not None:
+            self._filter_items()
+
+    def _filter_items(self):
+        # Drop items __getitem__ would reject and, in training, items the collater would drop
+        frames = self.metadata['frames']
+        keep = self.metadata['f0_max'] < self.max_f0
+        keep &= self.metadata['voiced'] >= self.config.get('min_voiced_ratio', 0)
+        if not self.infer:
+            keep &= frames >= self.config['crop_mel_frames']
+        if not keep.any():
+            raise ValueError(f"No usable items in '{self.data_dir}'")
+        self.item_ids = np.flatnonzero(keep)
+        self._sizes = frames[keep] if self.infer else np.full(len(self.item_ids), self.config['crop_mel_frames'])
+
+    def num_frames(self, index):
+        return int(self._sizes[index])
 
     def __getitem__(self, index):
+        index = int(self.item_ids[index])
+        if self.metadata is None and self.shards is not None and self.shards.read_f0(index).max() >= self.max_f0:
+            # Shard samples arrive already cropped, so check the whole item here
+            return self.__getitem__(random.randint(0, len(self) - 1))
         sample = self.get_data(index)
         if sample['f0'].max() >= self.max_f0:
             return self.__getitem__(random.randint(0, len(self) - 1))
         return sample
 
     def __len__(self):
-        return len(self.data_index)
+        return len(self.item_ids)
+
+    def _crop_shard(self, index, variant=None):
+        # Same crop distribution as the collater, which passes exact-length records through unchanged
+        frames = self.shards.num_frames(index, variant)
+        crop_mel_frames = self.config['crop_mel_frames']
+        if self.infer or frames <= crop_mel_frames:
+            return self.shards.read(index, variant=variant)
+        start = random.randint(0, frames - 1 - crop_mel_frames)
+        return self.shards.read(index, start, crop_mel_frames, hop_size=self.config['hop_size'], variant=variant)
+
+    def get_shard_data(self, index):
+        if self.infer or not self.key_aug or random.random() > self.key_aug_prob:
+            return self._crop_shard(index)
+        if self.shards.num_variants(index) > 0:
+            variant = random.randrange(self.shards.num_variants(index))
+            if self.shards.num_frames(index, variant) >= self.config['crop_mel_frames']:
+                return self._crop_shard(index, variant)
+        if not self.key_aug_online:
+            return self._crop_shard(index)
+        speed = random.uniform(self.config['aug_min'], self.config['aug_max'])
+        crop_mel_frames = int(np.ceil((self.config['crop_mel_frames'] + 4) * speed))
+        samples_per_frame = self.config['hop_size']
+        crop_wav_samples = crop_mel_frames * samples_per_frame
+        n_samples = self.shards.num_samples(index)
+        if crop_wav_samples >= n_samples:
+            return self._crop_shard(index)
+        start = random.randint(0, n_samples - 1 - crop_wav_samples)
+        audio = self.shards.read_audio(index, start, start + crop_wav_samples)
+        audio_aug = wav_aug(torch.from_numpy(audio), self.config["hop_size"], speed=speed)
+        mel_aug = dynamic_range_compression_torch(self.mel_spec_transform(audio_aug[None, :]))
+        pe_name = PITCH_EXTRACTORS_ID_TO_NAME[self.shards.pe(index)]
+        f0, uv = get_pitch(
+            pe_name, audio, length=mel_aug.shape[-1], hparams=self.config,
+            speed=speed, interp_uv=True
+        )
+        if f0 is None:
+            return self._crop_shard(index)
+        audio_aug = audio_aug[2 * samples_per_frame: -2 * samples_per_frame].numpy()
+        mel_aug = mel_aug[0, :, 2:-2].T.numpy()
+        f0_aug = f0[2:-2] * speed
+        return {'f0': f0_aug, 'spectrogram': mel_aug, 'audio': audio_aug}
 
     def get_data(self, index):
+        if self.shards is not None:
+            return self.get_shard_data(index)
         data_path = pathlib.Path(self.data_index[index])
         data = np.load(data_path)
         pe_name = PITCH_EXTRACTORS_ID_TO_NAME[int(data['pe'])]
         if self.infer or not self.key_aug or random.random() > self.key_aug_prob:
             return {'f0': data['f0'], 'spectrogram': data['mel'], 'audio': data['audio']}
+        variants = len(data['aug_speed']) if 'aug_speed' in data.files else 0
+        if variants > 0:
+            k = random.randrange(variants)
+            if data[f'aug_mel_{k}'].shape[0] >= self.config['crop_mel_frames']:
+                return {'f0': data[f'aug_f0_{k}'], 'spectrogram': data[f'aug_mel_{k}'], 'audio': data[f'aug_audio_{k}']}
+        if not self.key_aug_online:
+            return {'f0': data['f0'], 'spectrogram': data['mel'], 'audio': data['audio']}
         else:
             speed = random.uniform(self.config['aug_min'], self.config['aug_max'])
             crop_mel_frames = int(np.ceil((self.config['crop_mel_frames'] + 4) * speed))
@@ -297,22 +372,25 @@ class nsf_HiFigan(GanBaseTask):
         if pc_aug_num <= 0:
             raise ValueError('pc_aug_num should be greater than 0')
         f0 = sample['f0']
-        key_c = (2 * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) - 1) * self.pc_aug_key
-        # (1) c + (-c) = 0
-        f0_shift_c = torch.clip(f0[:pc_aug_num] * 2 ** (key_c / 12), max=self.max_f0)
-        wav_mixed = self.generator(x=sample['mel'], f0=torch.cat((f0_shift_c, f0[pc_aug_num:]), dim=0))
-        wav_shift_c, wav_shift_0 = wav_mixed[:pc_aug_num], wav_mixed[pc_aug_num:]
-        mel_shift_c = self.TF.dynamic_range_compression_torch(self.TF(wav_shift_c.squeeze(1)))
-        wav_shift_back = self.generator(x=mel_shift_c, f0=f0[:pc_aug_num])
-        wav_ret = torch.cat((wav_shift_back, wav_shift_0), dim=0)
-        # (2) a + b = c
+        mel = sample['mel']
+        n = pc_aug_num
+        key_c = (2 * torch.rand(n, device=f0.device).unsqueeze(-1) - 1) * self.pc_aug_key
         key_a_max = self.pc_aug_key + key_c.clamp(max=0)
         key_a_min = -self.pc_aug_key + key_c.clamp(min=0)
-        key_a = (key_a_max - key_a_min) * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) + key_a_min
-        f0_shift_a = torch.clip(f0[:pc_aug_num] * 2 ** (key_a / 12), max=self.max_f0)
-        wav_shift_a = self.generator(x=sample['mel'][:pc_aug_num], f0=f0_shift_a)
-        mel_shift_a = self.TF.dynamic_range_compression_torch(self.TF(wav_shift_a.squeeze(1)))
-        wav_shift_ab = self.generator(x=mel_shift_a, f0=f0_shift_c)
+        key_a = (key_a_max - key_a_min) * torch.rand(n, device=f0.device).unsqueeze(-1) + key_a_min
+        f0_shift_c = torch.clip(f0[:n] * 2 ** (key_c / 12), max=self.max_f0)
+        f0_shift_a = torch.clip(f0[:n] * 2 ** (key_a / 12), max=self.max_f0)
+        # Independent generator and mel calls share one batch:
+        # stage 1 renders the mixed batch (first n shifted by c) and the first n shifted by a,
+        wav_1 = self.generator(x=torch.cat((mel, mel[:n]), dim=0),
+                               f0=torch.cat((f0_shift_c, f0[n:], f0_shift_a), dim=0))
+        wav_shift_c, wav_shift_0, wav_shift_a = wav_1[:n], wav_1[n:len(mel)], wav_1[len(mel):]
+        wav_shift = torch.cat((wav_shift_c, wav_shift_a), dim=0)
+        mel_shift = self.TF.dynamic_range_compression_torch(self.TF(wav_shift.squeeze(1)))
+        # stage 2 shifts (1) c back by -c and (2) a on by b = c - a
+        wav_2 = self.generator(x=mel_shift, f0=torch.cat((f0[:n], f0_shift_c), dim=0))
+        wav_shift_back, wav_shift_ab = wav_2[:n], wav_2[n:]
+        wav_ret = torch.cat((wav_shift_back, wav_shift_0), dim=0)
 
         return {
             'audio': wav_ret,
@@ -430,3 +508,72 @@ class nsf_HiFigan(GanBaseTask):
         vmax = self.config['mel_vmax']
         spec_cat = torch.cat([(spec_out - spec).abs() + vmin, spec, spec_out], -1)
         self.logger.experiment.add_figure(name, spec_to_figure(spec_cat[0], vmin, vmax), self.global_step)
+
+
+if __name__ == '__main__':
+    # Micro-benchmark of the PC augmentation generator pass (forward + backward) on a small CPU config:
+    #     python -m training.nsf_HiFigan_task
+    import time
+
+    def unfused_G2forward(task, sample, pc_aug_num):
+        # Four generator and two mel calls, as before they were batched
+        f0 = sample['f0']
+        key_c = (2 * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) - 1) * task.pc_aug_key
+        f0_shift_c = torch.clip(f0[:pc_aug_num] * 2 ** (key_c / 12), max=task.max_f0)
+        wav_mixed = task.generator(x=sample['mel'], f0=torch.cat((f0_shift_c, f0[pc_aug_num:]), dim=0))
+        wav_shift_c, wav_shift_0 = wav_mixed[:pc_aug_num], wav_mixed[pc_aug_num:]
+        mel_shift_c = task.TF.dynamic_range_compression_torch(task.TF(wav_shift_c.squeeze(1)))
+        wav_shift_back = task.generator(x=mel_shift_c, f0=f0[:pc_aug_num])
+        key_a_max = task.pc_aug_key + key_c.clamp(max=0)
+        key_a_min = -task.pc_aug_key + key_c.clamp(min=0)
+        key_a = (key_a_max - key_a_min) * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) + key_a_min
+        f0_shift_a = torch.clip(f0[:pc_aug_num] * 2 ** (key_a / 12), max=task.max_f0)
+        wav_shift_a = task.generator(x=sample['mel'][:pc_aug_num], f0=f0_shift_a)
+        mel_shift_a = task.TF.dynamic_range_compression_torch(task.TF(wav_shift_a.squeeze(1)))
+        wav_shift_ab = task.generator(x=mel_shift_a, f0=f0_shift_c)
+        return {
+            'audio': torch.cat((wav_shift_back, wav_shift_0), dim=0),
+            'audio_shift_c': wav_shift_c,
+            'audio_shift_a': wav_shift_a,
+            'audio_shift_ab': wav_shift_ab
+        }
+
+    config = {
+        'audio_sample_rate': 44100, 'audio_num_mel_bins': 128, 'hop_size': 512, 'fft_size': 2048, 'win_size': 2048,
+        'fmin': 40, 'fmax': 16000, 'clip_grad_norm': None, 'pc_aug': True, 'pc_aug_rate': 0.5, 'pc_aug_key': 5,
+        'model_args': {
+            'mini_nsf': True, 'noise_sigma': 0.0, 'upsample_rates': [8, 8, 2, 2, 2],
+            'upsample_kernel_sizes': [16, 16, 4, 4, 4], 'upsample_initial_channel': 64,
+            'resblock_kernel_sizes': [3, 7], 'resblock_dilation_sizes': [[1, 3, 5], [1, 3, 5]],
+            'discriminator_periods': [3, 5], 'resblock': '1',
+        },
+    }
+    torch.set_num_threads(4)
+    task = nsf_HiFigan(config)
+    task.build_model()
+    batch, frames = 4, 32
+    sample = {
+        'mel': torch.randn(batch, config['audio_num_mel_bins'], frames) - 5,
+        'f0': 200 + 100 * torch.rand(batch, frames),
+    }
+    pc_aug_num = int(np.ceil(batch * task.pc_aug_rate))
+    keys = ('audio', 'audio_shift_c', 'audio_shift_a', 'audio_shift_ab')
+
+    def run(fn, steps=10):
+        fn(task, sample, pc_aug_num)  # warm-up
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            out = fn(task, sample, pc_aug_num)
+            sum(out[k].abs().mean() for k in keys).backward()
+        return (time.perf_counter() - t0) / steps
+
+    torch.manual_seed(0)
+    ref = unfused_G2forward(task, sample, pc_aug_num)
+    torch.manual_seed(0)
+    out = nsf_HiFigan.G2forward(task, sample, pc_aug_num)
+    for k in keys:
+        assert torch.allclose(ref[k], out[k], atol=1e-5), k
+    t_unfused = run(unfused_G2forward)
+    t_fused = run(nsf_HiFigan.G2forward)
+    print(f"| batch {batch} x {frames} frames, pc_aug_num {pc_aug_num}: "
+          f"unfused {t_unfused * 1000:.0f} ms/step, fused {t_fused * 1000:.0f} ms/step")
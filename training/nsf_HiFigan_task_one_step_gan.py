@@ -297,22 +297,25 @@ class nsf_HiFigan(GanBaseTask):
         if pc_aug_num <= 0:
             raise ValueError('pc_aug_num should be greater than 0')
         f0 = sample['f0']
-        key_c = (2 * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) - 1) * self.pc_aug_key
-        # (1) c + (-c) = 0
-        f0_shift_c = torch.clip(f0[:pc_aug_num] * 2 ** (key_c / 12), max=self.max_f0)
-        wav_mixed = self.generator(x=sample['mel'], f0=torch.cat((f0_shift_c, f0[pc_aug_num:]), dim=0))
-        wav_shift_c, wav_shift_0 = wav_mixed[:pc_aug_num], wav_mixed[pc_aug_num:]
-        mel_shift_c = self.TF.dynamic_range_compression_torch(self.TF(wav_shift_c.squeeze(1)))
-        wav_shift_back = self.generator(x=mel_shift_c, f0=f0[:pc_aug_num])
-        wav_ret = torch.cat((wav_shift_back, wav_shift_0), dim=0)
-        # (2) a + b = c
+        mel = sample['mel']
+        n = pc_aug_num
+        key_c = (2 * torch.rand(n, device=f0.device).unsqueeze(-1) - 1) * self.pc_aug_key
         key_a_max = self.pc_aug_key + key_c.clamp(max=0)
         key_a_min = -self.pc_aug_key + key_c.clamp(min=0)
-        key_a = (key_a_max - key_a_min) * torch.rand(pc_aug_num, device=f0.device).unsqueeze(-1) + key_a_min
-        f0_shift_a = torch.clip(f0[:pc_aug_num] * 2 ** (key_a / 12), max=self.max_f0)
-        wav_shift_a = self.generator(x=sample['mel'][:pc_aug_num], f0=f0_shift_a)
-        mel_shift_a = self.TF.dynamic_range_compression_torch(self.TF(wav_shift_a.squeeze(1)))
-        wav_shift_ab = self.generator(x=mel_shift_a, f0=f0_shift_c)
+        key_a = (key_a_max - key_a_min) * torch.rand(n, device=f0.device).unsqueeze(-1) + key_a_min
+        f0_shift_c = torch.clip(f0[:n] * 2 ** (key_c / 12), max=self.max_f0)
+        f0_shift_a = torch.clip(f0[:n] * 2 ** (key_a / 12), max=self.max_f0)
+        # Independent generator and mel calls share one batch:
+        # stage 1 renders the mixed batch (first n shifted by c) and the first n shifted by a,
+        wav_1 = self.generator(x=torch.cat((mel, mel[:n]), dim=0),
+                               f0=torch.cat((f0_shift_c, f0[n:], f0_shift_a), dim=0))
+        wav_shift_c, wav_shift_0, wav_shift_a = wav_1[:n], wav_1[n:len(mel)], wav_1[len(mel):]
+        wav_shift = torch.cat((wav_shift_c, wav_shift_a), dim=0)
+        mel_shift = self.TF.dynamic_range_compression_torch(self.TF(wav_shift.squeeze(1)))
+        # stage 2 shifts (1) c back by -c and (2) a on by b = c - a
+        wav_2 = self.generator(x=mel_shift, f0=torch.cat((f0[:n], f0_shift_c), dim=0))
+        wav_shift_back, wav_shift_ab = wav_2[:n], wav_2[n:]
+        wav_ret = torch.cat((wav_shift_back, wav_shift_0), dim=0)
 
         return {
             'audio': wav_ret,
@@ -0,0 +1,27 @@
+import functools
+import hashlib
+
+import numpy as np
+import torchaudio
+
+
+@functools.lru_cache(maxsize=512)
+def get_resampler(orig_freq: int, new_freq: int, lowpass_filter_width: int = 128):
+    # The windowed-sinc kernel only depends on the (integer) frequencies, so each pair builds it once
+    return torchaudio.transforms.Resample(
+        orig_freq=orig_freq,
+        new_freq=new_freq,
+        lowpass_filter_width=lowpass_filter_width
+    )
+
+
+def speed_aug(wav, hop_size, speed=1):
+    """Play `wav` `speed` times faster; the speed is quantised to ``round(hop_size * speed) / hop_size``."""
+    return get_resampler(int(np.round(hop_size * speed)), hop_size)(wav)
+
+
+def variant_speeds(key: str, num: int, aug_min: float, aug_max: float) -> np.ndarray:
+    """`num` speeds in [aug_min, aug_max), one per equal-width stratum, reproducible for a given `key`."""
+    seed = int(hashlib.sha1(key.encode('utf8')).hexdigest()[:8], 16)
+    jitter = np.random.default_rng(seed).random(num)
+    return aug_min + (np.arange(num) + jitter) / num * (aug_max - aug_min)
@@ -96,6 +96,21 @@ class PitchAdjustableMelSpectrogram:
 
         return spec
 
+    def batch(self, ys):
+        """Spectrograms of several 1-D clips through one STFT; the i-th equals ``self(ys[i][None])[0]``.
+
+        Each clip is extended by the reflection padding it would get on its
+        own before the clips are zero-padded to a common length, so the frames
+        kept for a clip never see another clip's padding.
+        """
+        left = (self.win_size - self.hop_length) // 2
+        right = (self.win_size - self.hop_length + 1) // 2
+        ext = [F.pad(y.view(1, 1, -1), (0, right), mode="reflect").view(-1) for y in ys]
+        length = max(len(e) for e in ext)
+        spec = self(torch.stack([F.pad(e, (0, length - len(e))) for e in ext]))
+        frames = [1 + (len(y) + left + right - self.n_fft) // self.hop_length for y in ys]
+        return [spec[i, :, :n] for i, n in enumerate(frames)]
+
     def dynamic_range_compression_torch(self,x, C=1, clip_val=1e-5):
         return torch.log(torch.clamp(x, min=clip_val) * C)
 